@@ -2,9 +2,10 @@
 """Main module of the Flask app."""
 
 
-from flask import Flask, jsonify
+from flask import Flask, jsonify, request
 from flask_cors import CORS
 from os import getenv
+from api.v1.compression import Compressor
 from api.v1.views import app_views
 
 
@@ -12,6 +13,8 @@ app = Flask(__name__)
 CORS(app, resources={r"/api/*": {"origins": "0.0.0.0"}})
 host = getenv('HBNB_API_HOST', '0.0.0.0')
 port = getenv('HBNB_API_PORT', '5000')
+compressor = Compressor(level=int(getenv('HBNB_API_GZIP_LEVEL', 6)),
+                        min_size=int(getenv('HBNB_API_GZIP_MIN_SIZE', 1024)))
 
 
 @app.teardown_appcontext
@@ -21,6 +24,12 @@ def close_storage(exception):
     storage.close()
 
 
+@app.after_request
+def compress_response(response):
+    """Compress the response for clients that accept it."""
+    return compressor.compress(response, request.accept_encodings)
+
+
 @app.errorhandler(404)
 def not_found(error):
     """Handler for 404 errors."""
@@ -0,0 +1,132 @@
+#!/usr/bin/python3
+"""
+Contains the ResponseCache class, keeping rendered GET responses of the
+API until the storage reports a change to the class they list
+"""
+from collections import OrderedDict
+import threading
+import time
+
+
+class ResponseCache:
+    """Least recently used cache of response bodies by request URL, each
+    entry dropped after ttl seconds or as soon as invalidate() is called
+    with the class of the objects it lists
+
+    Bodies are kept while they are streamed to the client, and only if
+    they stay within max_bytes. A response rendered while its class was
+    invalidated is not kept, as it may predate the change. Each entry
+    also keeps the compressed bodies the Compressor makes of it, by
+    encoding."""
+
+    def __init__(self, size=128, ttl=60, max_bytes=1 << 20):
+        """Instantiate a cache of at most size entries"""
+        self.size = size
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.__entries = OrderedDict()
+        self.__keys = {}
+        self.__generations = {}
+        self.__lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """Returns the (status, headers, body) kept for key, or None"""
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None and entry[1] <= time.monotonic():
+                self.__drop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.__entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def compressed(self, key):
+        """Returns the dictionary of the compressed bodies, by encoding,
+        kept along with the entry of key, or None"""
+        with self.__lock:
+            entry = self.__entries.get(key)
+            return entry[3] if entry is not None else None
+
+    def generation(self, name):
+        """Returns the number of times the class name, and the whole
+        cache, were invalidated"""
+        return (self.__generations.get(name, 0),
+                self.__generations.get(None, 0))
+
+    def put(self, key, name, generation, response):
+        """Keeps the (status, headers, body) response for key, listing
+        objects of class name, unless name was invalidated since it was
+        at generation"""
+        if self.size <= 0:
+            return
+        with self.__lock:
+            if self.generation(name) != generation:
+                return
+            self.__drop(key)
+            self.__entries[key] = (name, time.monotonic() + self.ttl,
+                                   response, {})
+            self.__keys.setdefault(name, set()).add(key)
+            while len(self.__entries) > self.size:
+                self.__drop(next(iter(self.__entries)))
+                self.evictions += 1
+
+    def tee(self, key, name, response):
+        """Makes response keep its body in the cache for key once it has
+        been sent whole, listing objects of class name"""
+        generation = self.generation(name)
+        status = response.status_code
+        headers = [(header, value) for header, value in response.headers
+                   if header.lower() != "content-length"]
+        body = response.iter_encoded()
+
+        def chunks():
+            """Yields the body, keeping it while it stays small enough"""
+            kept = []
+            size = 0
+            for chunk in body:
+                yield chunk
+                if kept is not None:
+                    size += len(chunk)
+                    kept.append(chunk)
+                    if size > self.max_bytes:
+                        kept = None
+            if kept is not None:
+                self.put(key, name, generation,
+                         (status, headers, b"".join(kept)))
+        response.response = chunks()
+        return response
+
+    def invalidate(self, name=None):
+        """Drops the entries listing objects of class name, or every
+        entry when name is None"""
+        with self.__lock:
+            self.__generations[name] = self.__generations.get(name, 0) + 1
+            self.invalidations += 1
+            if name is None:
+                self.__entries.clear()
+                self.__keys.clear()
+            else:
+                for key in self.__keys.pop(name, ()):
+                    self.__entries.pop(key, None)
+
+    def __drop(self, key):
+        """Removes the entry of key, if any"""
+        entry = self.__entries.pop(key, None)
+        if entry is not None:
+            self.__keys[entry[0]].discard(key)
+
+    def stats(self):
+        """Returns the counters and size of the cache"""
+        with self.__lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions,
+                    "invalidations": self.invalidations,
+                    "entries": len(self.__entries), "size": self.size,
+                    "ttl": self.ttl}
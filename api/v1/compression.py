@@ -0,0 +1,96 @@
+#!/usr/bin/python3
+"""
+Contains the Compressor class, encoding API responses in gzip or
+deflate for the clients that accept it
+"""
+from itertools import chain
+import zlib
+
+encodings = {
+    "gzip": 31,
+    "deflate": 15
+}
+
+
+class Compressor:
+    """Compresses response bodies of at least min_size bytes at level,
+    in the encoding of encodings the client prefers
+
+    Streamed bodies are compressed as they stream, once their first
+    min_size bytes have been read. A response with a compressed
+    attribute, the dictionary of its compressed bodies by encoding that
+    the response cache keeps along with its entry, is compressed once
+    per encoding and then served from it."""
+
+    def __init__(self, level=6, min_size=1024):
+        """Instantiate a compressor; level 0 turns compression off"""
+        self.level = level
+        self.min_size = min_size
+
+    def compress(self, response, accept_encodings):
+        """Returns response compressed in the encoding accept_encodings,
+        the Accept-Encoding of the request, prefers, if any"""
+        if self.level <= 0 or response.status_code != 200 or \
+                response.direct_passthrough or \
+                "Content-Encoding" in response.headers:
+            return response
+        response.vary.add("Accept-Encoding")
+        encoding = accept_encodings.best_match(list(encodings))
+        if encoding is None:
+            return response
+        if response.is_streamed:
+            return self.__compress_stream(response, encoding)
+        body = response.get_data()
+        if len(body) < self.min_size:
+            return response
+        compressed = getattr(response, "compressed", None)
+        data = compressed.get(encoding) if compressed is not None else None
+        if data is None:
+            compressor = self.__compressor(encoding)
+            data = compressor.compress(body) + compressor.flush()
+            if compressed is not None:
+                compressed[encoding] = data
+        response.set_data(data)
+        self.__label(response, encoding)
+        return response
+
+    def __compress_stream(self, response, encoding):
+        """Compresses a streamed response on the fly, unless it ends
+        before min_size bytes"""
+        chunks = response.iter_encoded()
+        head = []
+        size = 0
+        for chunk in chunks:
+            head.append(chunk)
+            size += len(chunk)
+            if size >= self.min_size:
+                break
+        else:
+            response.set_data(b"".join(head))
+            return response
+        compressor = self.__compressor(encoding)
+
+        def generate():
+            """Yields the compressed body as the chunks come"""
+            for chunk in chain(head, chunks):
+                data = compressor.compress(chunk)
+                if data:
+                    yield data
+            yield compressor.flush()
+        response.response = generate()
+        response.headers.pop("Content-Length", None)
+        self.__label(response, encoding)
+        return response
+
+    def __compressor(self, encoding):
+        """Returns a new zlib compressor writing encoding at level"""
+        return zlib.compressobj(self.level, zlib.DEFLATED,
+                                encodings[encoding])
+
+    @staticmethod
+    def __label(response, encoding):
+        """Marks response as encoded, with an ETag of its own"""
+        response.headers["Content-Encoding"] = encoding
+        etag, weak = response.get_etag()
+        if etag:
+            response.set_etag("{}-{}".format(etag, encoding), weak)
@@ -1,7 +1,162 @@
 """Initialize Flask Blueprint object."""
-from flask import Blueprint
+from api.v1.cache import ResponseCache
+from api.v1.compression import encodings
+from datetime import timezone
+from flask import Blueprint, Response, abort, g, json, jsonify, request
+from flask import stream_with_context
+import hashlib
+from os import getenv
 
 app_views = Blueprint('app_views', __name__, url_prefix='/api/v1')
+max_page = 1000
+response_cache = ResponseCache(
+    size=int(getenv("HBNB_API_CACHE_SIZE", 128)),
+    ttl=float(getenv("HBNB_API_CACHE_TTL", 60)),
+    max_bytes=int(getenv("HBNB_API_CACHE_MAX_BYTES", 1 << 20)))
+
+
+def paginate(cls, where=None):
+    """Returns the response listing one page of the objects of cls whose
+    attributes have the values in where, when the request asks for one
+    with ?limit= or ?after=, and None otherwise
+
+    The cursor of the next page, if any, is sent in X-Next-Cursor."""
+    if "limit" not in request.args and "after" not in request.args:
+        return None
+    from models import storage
+    try:
+        limit = int(request.args.get("limit", max_page))
+    except ValueError:
+        abort(400, description="Invalid limit")
+    if limit < 1:
+        abort(400, description="Invalid limit")
+    fields = requested_fields()
+    try:
+        objs, cursor = storage.page(cls, after=request.args.get("after"),
+                                    limit=min(limit, max_page), where=where,
+                                    fields=fields)
+    except ValueError:
+        abort(400, description="Invalid cursor")
+    response = jsonify([obj.to_dict(fields) for obj in objs])
+    if cursor is not None:
+        response.headers["X-Next-Cursor"] = cursor
+    return response
+
+
+def requested_fields():
+    """Returns the list of attribute names given in ?fields=, separated
+    by commas, or None to return every attribute"""
+    fields = request.args.get("fields", "")
+    return [field.strip() for field in fields.split(",")
+            if field.strip()] or None
+
+
+def stream_list(objs, batch=100, fields=None):
+    """Returns a response with the JSON list of the to_dict(fields) of
+    objs, written out batch objects at a time while objs is iterated"""
+    def generate():
+        chunk = []
+        sep = "["
+        for obj in objs:
+            chunk.append(sep + json.dumps(obj.to_dict(fields)))
+            sep = ", "
+            if len(chunk) == batch:
+                yield "".join(chunk)
+                chunk = []
+        yield "".join(chunk) + ("]" if sep == ", " else "[]")
+    return Response(stream_with_context(generate()),
+                    mimetype="application/json")
+
+
+def object_not_modified(obj):
+    """Returns an empty 304 response when the request's If-None-Match or
+    If-Modified-Since shows the client already has obj as it is now,
+    and None otherwise
+
+    The ETag hashes the class, id and updated_at of obj and the
+    requested fields, which are the same in every process and are known
+    without serializing obj."""
+    version = "{}.{} {} {}".format(type(obj).__name__, obj.id,
+                                   obj.updated_at.isoformat(),
+                                   requested_fields())
+    return not_modified(version, obj.updated_at)
+
+
+def list_not_modified(*classes, where=None):
+    """Returns an empty 304 response when the request's If-None-Match
+    shows the client already has the list of the objects of classes
+    whose attributes have the values in where, as their storage
+    version() has not changed, and None otherwise
+
+    The ETag is weak, as the version stands for the objects rather than
+    the bytes of the list."""
+    from models import storage
+    return not_modified("|".join(storage.version(cls, where)
+                                 for cls in classes), weak=True)
+
+
+def not_modified(version, last_modified=None, weak=False):
+    """Returns an empty 304 response when the client already has version
+    of the requested URL, and None otherwise
+
+    The ETag of the URL at version, weak or strong, and last_modified if
+    given, are sent with either response. A 304 repeats the ETag the
+    client sent, which is suffixed with the encoding of a compressed
+    body. If-Modified-Since only matches when last_modified, to the
+    second as Last-Modified is sent, is no later than it."""
+    etag = hashlib.sha1("{} {}".format(request.full_path, version)
+                        .encode("utf-8")).hexdigest()
+    g.etag = (etag, weak)
+    g.last_modified = last_modified
+    if request.if_none_match:
+        tags = [etag] + ["{}-{}".format(etag, encoding)
+                         for encoding in encodings]
+        matched = [tag for tag in tags
+                   if request.if_none_match.contains_weak(tag)]
+        unchanged = bool(matched)
+        if matched:
+            g.etag = (matched[0], weak)
+    elif last_modified is not None and request.if_modified_since:
+        since = request.if_modified_since
+        unchanged = last_modified.replace(tzinfo=timezone.utc,
+                                          microsecond=0) <= since
+    else:
+        unchanged = False
+    return Response(status=304) if unchanged else None
+
+
+@app_views.after_request
+def send_validators(response):
+    """Adds the ETag and Last-Modified not_modified() computed to the
+    response of the view"""
+    etag = g.pop("etag", None)
+    last_modified = g.pop("last_modified", None)
+    if etag is not None and response.status_code in (200, 304):
+        response.set_etag(*etag)
+        if last_modified is not None:
+            response.last_modified = last_modified
+    return response
+
+
+def cached(cls, render):
+    """Returns the response render() makes for the requested URL, kept
+    in response_cache until an object of cls is stored, changed or
+    deleted"""
+    if response_cache.size <= 0:
+        return render()
+    key = request.full_path
+    hit = response_cache.get(key)
+    if hit is not None:
+        status, headers, body = hit
+        response = Response(body, status=status, headers=headers)
+        response.compressed = response_cache.compressed(key)
+        return response
+    return response_cache.tee(key, cls.__name__, render())
+
+
+from models import storage
+storage.listen(response_cache.invalidate)
+
 from api.v1.views.index import *
 from api.v1.views.states import *
 from api.v1.views.amenities import *
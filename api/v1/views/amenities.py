@@ -2,7 +2,8 @@
 """ objects that handles all default RestFul API actions for Amenities"""
 from models.amenity import Amenity
 from models import storage
-from api.v1.views import app_views
+from api.v1.views import app_views, list_not_modified, object_not_modified
+from api.v1.views import cached, paginate, requested_fields, stream_list
 from flask import abort, jsonify, make_response, request
 from flasgger.utils import swag_from
 
@@ -13,11 +14,11 @@ def get_amenities():
     """
     Retrieves a list of all amenities
     """
-    all_amenities = storage.all(Amenity).values()
-    list_amenities = []
-    for amenity in all_amenities:
-        list_amenities.append(amenity.to_dict())
-    return jsonify(list_amenities)
+    fields = requested_fields()
+    return list_not_modified(Amenity) or \
+        cached(Amenity, lambda: paginate(Amenity) or
+               stream_list(storage.iter(Amenity, fields=fields),
+                           fields=fields))
 
 
 @app_views.route(
@@ -25,11 +26,12 @@ def get_amenities():
 @swag_from('documentation/amenity/get_amenity.yml', methods=['GET'])
 def get_amenity(amenity_id):
     """ Retrieves an amenity """
-    amenity = storage.get(Amenity, amenity_id)
+    fields = requested_fields()
+    amenity = storage.get(Amenity, amenity_id, fields=fields)
     if not amenity:
         abort(404)
 
-    return jsonify(amenity.to_dict())
+    return object_not_modified(amenity) or jsonify(amenity.to_dict(fields))
 
 
 @app_views.route(
@@ -98,5 +100,5 @@ def put_amenity(amenity_id):
     for key, value in data.items():
         if key not in ignore:
             setattr(amenity, key, value)
-    storage.save()
+    amenity.save()
     return make_response(jsonify(amenity.to_dict()), 200)
@@ -6,7 +6,8 @@ from models.city import City
 from models.state import State
 from models import storage
 from flask import jsonify, abort, make_response, request
-from api.v1.views import app_views
+from api.v1.views import app_views, list_not_modified, object_not_modified
+from api.v1.views import requested_fields, stream_list
 
 
 @app_views.route(
@@ -18,9 +19,13 @@ def get_cities_by_state(state_id):
     state = storage.get(State, state_id)
     if not state:
         abort(404)
+    unchanged = list_not_modified(City, where={"state_id": state_id})
+    if unchanged:
+        return unchanged
 
-    cities = [city.to_dict() for city in state.cities]
-    return jsonify(cities)
+    fields = requested_fields()
+    return stream_list(storage.iter(City, where={"state_id": state_id},
+                                    fields=fields), fields=fields)
 
 
 @app_views.route('/cities/<city_id>', methods=['GET'], strict_slashes=False)
@@ -28,10 +33,11 @@ def get_city(city_id):
     """
     Retrieves a City object
     """
-    city = storage.get(City, city_id)
+    fields = requested_fields()
+    city = storage.get(City, city_id, fields=fields)
     if not city:
         abort(404)
-    return jsonify(city.to_dict())
+    return object_not_modified(city) or jsonify(city.to_dict(fields))
 
 
 @app_views.route('/cities/<city_id>', methods=['DELETE'], strict_slashes=False)
@@ -88,5 +94,5 @@ def update_city(city_id):
     for key, value in data.items():
         if key not in ignore:
             setattr(city, key, value)
-    storage.save()
+    city.save()
     return jsonify(city.to_dict()), 200
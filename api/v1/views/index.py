@@ -2,8 +2,9 @@
 """Index module for Flask app."""
 
 
-from api.v1.views import app_views
-from flask import jsonify
+from api.v1.views import app_views, response_cache
+from flask import abort, jsonify
+import models
 from models import storage
 from models.amenity import Amenity
 from models.city import City
@@ -22,13 +23,28 @@ def api_status():
 @app_views.route('/stats', methods=['GET'], strict_slashes=False)
 def get_stats():
     """Endpoint to retrieve stats of objects by type."""
+    counts = storage.counts()
     stats = {
-        "amenities": storage.count("Amenity"),
-        "cities": storage.count("City"),
-        "places": storage.count("Place"),
-        "reviews": storage.count("Review"),
-        "states": storage.count("State"),
-        "users": storage.count("User")
+        "amenities": counts["Amenity"],
+        "cities": counts["City"],
+        "places": counts["Place"],
+        "reviews": counts["Review"],
+        "states": counts["State"],
+        "users": counts["User"]
     }
     print("Stats:", stats)
     return jsonify(stats)
+
+
+@app_views.route('/stats/pool', methods=['GET'], strict_slashes=False)
+def get_pool_stats():
+    """Endpoint to retrieve the database connection pool statistics."""
+    if models.storage_t != "db":
+        abort(404)
+    return jsonify(storage.pool_stats())
+
+
+@app_views.route('/stats/cache', methods=['GET'], strict_slashes=False)
+def get_cache_stats():
+    """Endpoint to retrieve the counters of the response cache."""
+    return jsonify(response_cache.stats())
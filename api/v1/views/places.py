@@ -7,7 +7,8 @@ from models.city import City
 from models.user import User
 from models import storage
 from flask import jsonify, abort, make_response, request
-from api.v1.views import app_views
+from api.v1.views import app_views, list_not_modified, object_not_modified
+from api.v1.views import paginate, requested_fields, stream_list
 
 
 @app_views.route(
@@ -17,18 +18,52 @@ def get_places_by_city(city_id):
     city = storage.get(City, city_id)
     if not city:
         abort(404)
-
-    places = [place.to_dict() for place in city.places]
-    return jsonify(places)
+    page = list_not_modified(Place, where={"city_id": city_id}) or \
+        paginate(Place, where={"city_id": city_id})
+    if page:
+        return page
+
+    fields = requested_fields()
+    return stream_list(storage.iter(Place, where={"city_id": city_id},
+                                    fields=fields), fields=fields)
+
+
+@app_views.route('/places/stats', methods=['GET'], strict_slashes=False)
+def get_places_stats():
+    """Retrieves the number, prices and capacity of the places of each
+    city, state or user given in ?by=, optionally only those of the
+    city_id or user_id given"""
+    groups = {"city": "city_id", "state": "city.state_id", "user": "user_id"}
+    by = request.args.get("by", "city").split(",")
+    if not set(by) <= set(groups):
+        abort(400, description="Invalid by")
+    unchanged = list_not_modified(Place, City)
+    if unchanged:
+        return unchanged
+    where = {field: request.args[field] for field in ("city_id", "user_id")
+             if field in request.args}
+    stats = storage.aggregate(Place, group_by=[groups[b] for b in by],
+                              where=where, metrics={
+                                  "places": ("count", None),
+                                  "avg_price": ("avg", "price_by_night"),
+                                  "min_price": ("min", "price_by_night"),
+                                  "max_price": ("max", "price_by_night"),
+                                  "guests": ("sum", "max_guest"),
+                                  "rooms": ("sum", "number_rooms")})
+    for group in stats:
+        for b in by:
+            group[groups[b].rpartition(".")[2]] = group.pop(groups[b])
+    return jsonify(stats)
 
 
 @app_views.route('/places/<place_id>', methods=['GET'], strict_slashes=False)
 def get_place(place_id):
     """Retrieves a Place object"""
-    place = storage.get(Place, place_id)
+    fields = requested_fields()
+    place = storage.get(Place, place_id, fields=fields)
     if not place:
         abort(404)
-    return jsonify(place.to_dict())
+    return object_not_modified(place) or jsonify(place.to_dict(fields))
 
 
 @app_views.route(
@@ -86,5 +121,28 @@ def update_place(place_id):
     for key, value in data.items():
         if key not in ignore:
             setattr(place, key, value)
-    storage.save()
+    place.save()
     return jsonify(place.to_dict()), 200
+
+
+@app_views.route('/places_search', methods=['POST'], strict_slashes=False)
+def places_search():
+    """Retrieves the places of the states and cities listed in the JSON
+    body, or all places when none is listed, that have every amenity
+    listed"""
+    if not request.is_json:
+        abort(400, description="Not a JSON")
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        abort(400, description="Not a JSON")
+    lists = {}
+    for field in ("states", "cities", "amenities"):
+        ids = data.get(field) or []
+        if not isinstance(ids, list) or \
+                not all(isinstance(id, str) for id in ids):
+            abort(400, description="Invalid " + field)
+        lists[field] = ids
+    fields = requested_fields()
+    if not any(lists.values()):
+        return stream_list(storage.iter(Place, fields=fields), fields=fields)
+    return stream_list(storage.search_places(**lists), fields=fields)
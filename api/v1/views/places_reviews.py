@@ -7,7 +7,8 @@ from models.place import Place
 from models.user import User
 from models import storage
 from flask import jsonify, abort, make_response, request
-from api.v1.views import app_views
+from api.v1.views import app_views, list_not_modified, object_not_modified
+from api.v1.views import paginate, requested_fields, stream_list
 
 
 @app_views.route(
@@ -17,19 +18,25 @@ def get_reviews_by_place(place_id):
     place = storage.get(Place, place_id)
     if not place:
         abort(404)
+    page = list_not_modified(Review, where={"place_id": place_id}) or \
+        paginate(Review, where={"place_id": place_id})
+    if page:
+        return page
 
-    reviews = [review.to_dict() for review in place.reviews]
-    return jsonify(reviews)
+    fields = requested_fields()
+    return stream_list(storage.iter(Review, where={"place_id": place_id},
+                                    fields=fields), fields=fields)
 
 
 @app_views.route(
         '/reviews/<review_id>', methods=['GET'], strict_slashes=False)
 def get_review(review_id):
     """Retrieves a Review object"""
-    review = storage.get(Review, review_id)
+    fields = requested_fields()
+    review = storage.get(Review, review_id, fields=fields)
     if not review:
         abort(404)
-    return jsonify(review.to_dict())
+    return object_not_modified(review) or jsonify(review.to_dict(fields))
 
 
 @app_views.route(
@@ -88,5 +95,5 @@ def update_review(review_id):
     for key, value in data.items():
         if key not in ignore:
             setattr(review, key, value)
-    storage.save()
+    review.save()
     return jsonify(review.to_dict()), 200
@@ -4,7 +4,8 @@
 
 from models.state import State
 from models import storage
-from api.v1.views import app_views
+from api.v1.views import app_views, list_not_modified, object_not_modified
+from api.v1.views import cached, paginate, requested_fields, stream_list
 from flask import jsonify, abort, make_response, request
 from flasgger.utils import swag_from
 
@@ -14,11 +15,10 @@ from flasgger.utils import swag_from
 def get_states():
     """"Get all objects from State"""
 
-    obj_states = storage.all(State).values()
-    list_states = []
-    for state in obj_states:
-        list_states.append(state.to_dict())
-    return jsonify(list_states)
+    fields = requested_fields()
+    return list_not_modified(State) or \
+        cached(State, lambda: paginate(State) or
+               stream_list(storage.iter(State, fields=fields), fields=fields))
 
 
 @app_views.route('/states/<state_id>', methods=['GET'], strict_slashes=False)
@@ -26,11 +26,12 @@ def get_states():
 def get_state(state_id):
     """ Raises error if not linked to any State """
 
-    state = storage.get(State, state_id)
+    fields = requested_fields()
+    state = storage.get(State, state_id, fields=fields)
     if not state:
         abort(404)
 
-    return jsonify(state.to_dict())
+    return object_not_modified(state) or jsonify(state.to_dict(fields))
 
 
 @app_views.route(
@@ -92,5 +93,5 @@ def put_state(state_id):
     for key, value in data.items():
         if key not in ignore:
             setattr(state, key, value)
-    storage.save()
+    state.save()
     return jsonify(state.to_dict()), 200
@@ -5,23 +5,27 @@
 from models.user import User
 from models import storage
 from flask import jsonify, abort, make_response, request
-from api.v1.views import app_views
+from api.v1.views import app_views, list_not_modified, object_not_modified
+from api.v1.views import cached, paginate, requested_fields, stream_list
 
 
 @app_views.route('/users', methods=['GET'], strict_slashes=False)
 def get_users():
     """Retrieves the list of all User objects"""
-    users = [user.to_dict() for user in storage.all(User).values()]
-    return jsonify(users)
+    fields = requested_fields()
+    return list_not_modified(User) or \
+        cached(User, lambda: paginate(User) or
+               stream_list(storage.iter(User, fields=fields), fields=fields))
 
 
 @app_views.route('/users/<user_id>', methods=['GET'], strict_slashes=False)
 def get_user(user_id):
     """Retrieves a User object"""
-    user = storage.get(User, user_id)
+    fields = requested_fields()
+    user = storage.get(User, user_id, fields=fields)
     if not user:
         abort(404)
-    return jsonify(user.to_dict())
+    return object_not_modified(user) or jsonify(user.to_dict(fields))
 
 
 @app_views.route('/users/<user_id>', methods=['DELETE'], strict_slashes=False)
@@ -67,5 +71,5 @@ def update_user(user_id):
     for key, value in data.items():
         if key not in ignore:
             setattr(user, key, value)
-    storage.save()
+    user.save()
     return jsonify(user.to_dict()), 200
@@ -0,0 +1,84 @@
+#!/usr/bin/python3
+"""
+Compares loading places one BaseModel.save() at a time with
+storage.bulk_new(), and times storage.bulk_update() on all of them.
+Saving one at a time is only timed on the first 1000 places, as each
+save rewrites the whole file.
+
+Runs against FileStorage, and also against DBStorage when
+HBNB_TYPE_STORAGE=db and the HBNB_MYSQL_* variables are set.
+
+Usage: python3 -m benchmarks.bulk_load [places, default 1000000]
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sample = 1000
+
+
+def child(total):
+    """Measures the storage chosen by HBNB_TYPE_STORAGE"""
+    from models import storage
+    from models.city import City
+    from models.place import Place
+    from models.state import State
+    from models.user import User
+    state = State(name="California")
+    city = City(name="San Francisco", state_id=state.id)
+    user = User(email="bench@hbnb.io", password="pwd")
+    storage.bulk_new([state, city, user])
+    ids = []
+
+    def places(count):
+        """Yields count new places, remembering their ids"""
+        for i in range(count):
+            place = Place(name="place {:d}".format(i), city_id=city.id,
+                          user_id=user.id)
+            ids.append(place.id)
+            yield place
+
+    start = time.perf_counter()
+    for place in places(min(sample, total)):
+        place.save()
+    single = time.perf_counter() - start
+    del ids[:]
+    start = time.perf_counter()
+    storage.bulk_new(places(total))
+    bulk = time.perf_counter() - start
+    start = time.perf_counter()
+    storage.bulk_update(Place, ({"id": id, "max_guest": 4} for id in ids))
+    updated = time.perf_counter() - start
+    print(json.dumps([min(sample, total) / single, total / bulk,
+                      total / updated]))
+
+
+def main(total):
+    """Prints the comparison for the given number of places"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    engines = ["file"]
+    if os.getenv("HBNB_TYPE_STORAGE") == "db":
+        engines.append("db")
+    print("{:d} places".format(total))
+    print("{:<6} {:>14} {:>14} {:>16}".format(
+        "engine", "save() /s", "bulk_new /s", "bulk_update /s"))
+    for engine in engines:
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, PYTHONPATH=root)
+            if engine == "file":
+                env.pop("HBNB_TYPE_STORAGE", None)
+            out = subprocess.check_output(
+                [sys.executable, "-m", "benchmarks.bulk_load", "--child",
+                 str(total)], cwd=tmp, env=env)
+        print("{:<6} {:>14.0f} {:>14.0f} {:>16.0f}".format(
+            engine, *json.loads(out)))
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--child"]:
+        child(int(sys.argv[2]))
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
@@ -0,0 +1,56 @@
+#!/usr/bin/python3
+"""
+Times FileStorage.all(cls), count(cls) and get(cls, id) against the
+former full-scan implementation on a large mixed store.
+
+Usage: python3 -m benchmarks.class_index [objects, default 1000000]
+"""
+import sys
+import timeit
+from models.engine.file_storage import FileStorage, classes
+from models.state import State
+
+kinds = ["Amenity", "City", "Place", "Review", "User", "User", "Place",
+         "Review", "City", "State"]
+
+
+def fill(storage, total):
+    """Fills storage with total objects, one in ten of them a State"""
+    for i in range(total):
+        obj = classes[kinds[i % len(kinds)]]()
+        storage.new(obj)
+    return obj.id
+
+
+def scan_all(objects, cls):
+    """The substring scan all(cls) used before the class buckets"""
+    return {k: v for k, v in objects.items() if cls.__name__ in k}
+
+
+def scan_count(objects, cls):
+    """The substring scan count(cls) used before the class buckets"""
+    return sum(1 for k in objects if cls.__name__ in k)
+
+
+def main(total):
+    """Prints the timings for a store of the given size"""
+    storage = FileStorage()
+    state_id = fill(storage, total)
+    objects = storage.all()
+    runs = 5
+    timings = [
+        ("all(State) scan", lambda: scan_all(objects, State)),
+        ("all(State) bucket", lambda: storage.all(State)),
+        ("count(State) scan", lambda: scan_count(objects, State)),
+        ("count(State) bucket", lambda: storage.count(State)),
+        ("get(State, id)", lambda: storage.get(State, state_id)),
+    ]
+    print("{:d} objects, {:d} States".format(len(objects),
+                                             storage.count(State)))
+    for label, func in timings:
+        best = min(timeit.repeat(func, number=1, repeat=runs))
+        print("{:<22} {:>12.3f} ms".format(label, best * 1000))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
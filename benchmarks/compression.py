@@ -0,0 +1,79 @@
+#!/usr/bin/python3
+"""
+Measures what compressing API responses costs and saves: fetches the
+places of a city through the API uncompressed, then times gzip and
+deflate at several levels on that body, and the whole request with the
+default compression.
+
+Usage: python3 -m benchmarks.compression [places, default 10000]
+"""
+import os
+import sys
+import tempfile
+import time
+import zlib
+from api.v1.compression import encodings
+
+levels = (1, 6, 9)
+runs = 5
+
+
+def best(func):
+    """Returns the shortest of runs timings of func, in seconds"""
+    timings = []
+    for _ in range(runs):
+        start = time.process_time()
+        func()
+        timings.append(time.process_time() - start)
+    return min(timings)
+
+
+def main(total):
+    """Prints the comparison for a city of the given number of places"""
+    from models import storage
+    from models.city import City
+    from models.place import Place
+    from models.state import State
+    from models.user import User
+    from api.v1.app import app
+    from api.v1.views import app_views
+    app.register_blueprint(app_views)
+    state = State(name="California")
+    city = City(name="San Francisco", state_id=state.id)
+    user = User(email="bench@hbnb.io", password="pwd")
+    storage.bulk_new([state, city, user] + [
+        Place(name="place {:d}".format(i), city_id=city.id, user_id=user.id,
+              description="A quiet place to stay " * 8, max_guest=4,
+              price_by_night=100 + i % 50) for i in range(total)])
+    client = app.test_client()
+    url = "/api/v1/cities/{}/places".format(city.id)
+
+    def fetch(encoding):
+        """Returns the body of the list in encoding"""
+        return client.get(url, headers={"Accept-Encoding": encoding}).data
+
+    body = fetch("identity")
+    print("{:d} places, {:d} bytes uncompressed".format(total, len(body)))
+    print("{:<8} {:>5} {:>12} {:>8} {:>12}".format(
+        "encoding", "level", "bytes", "ratio", "CPU ms"))
+    for encoding, wbits in encodings.items():
+        for level in levels:
+            def compress():
+                """Compresses the body once"""
+                compressor = zlib.compressobj(level, zlib.DEFLATED, wbits)
+                return compressor.compress(body) + compressor.flush()
+            size = len(compress())
+            print("{:<8} {:>5d} {:>12d} {:>8.3f} {:>12.2f}".format(
+                encoding, level, size, size / len(body),
+                best(compress) * 1000))
+    for encoding in ("identity", "gzip"):
+        print("request {:<9} {:>12.2f} ms CPU, {:d} bytes".format(
+            encoding, best(lambda: fetch(encoding)) * 1000,
+            len(fetch(encoding))))
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        os.environ.pop("HBNB_TYPE_STORAGE", None)
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,75 @@
+#!/usr/bin/python3
+"""
+Compares FileStorage.reload() with lazy and eager hydration: time to
+reload, time to build every object afterwards, and the memory held
+after each step.
+
+Usage: python3 -m benchmarks.lazy_reload [objects, default 200000]
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+kinds = ["Amenity", "City", "Place", "Review", "State", "User"]
+
+
+def generate(path, total):
+    """Writes a file.json with total objects of mixed classes"""
+    from models.engine.file_storage import classes
+    records = {}
+    for i in range(total):
+        obj = classes[kinds[i % len(kinds)]](name="object {:d}".format(i))
+        records["{}.{}".format(type(obj).__name__, obj.id)] = obj.to_dict()
+    with open(path, "w") as f:
+        json.dump(records, f)
+
+
+def child(path):
+    """Measures one hydration mode, chosen by HBNB_FILE_HYDRATE"""
+    from models.engine.file_storage import FileStorage
+    storage = FileStorage()
+    FileStorage._FileStorage__file_path = path
+    start = time.perf_counter()
+    storage.reload()
+    loaded = time.perf_counter()
+    storage.all()
+    built = time.perf_counter()
+    tracemalloc.start()
+    storage.reload()
+    after_reload = tracemalloc.get_traced_memory()[0]
+    storage.all()
+    after_all = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(json.dumps([loaded - start, built - loaded,
+                      after_reload / 2 ** 20, after_all / 2 ** 20]))
+
+
+def main(total):
+    """Prints the comparison for a file of the given size"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "data.json")
+        generate(path, total)
+        print("{:d} objects, {:.1f} MB file".format(
+            total, os.path.getsize(path) / 2 ** 20))
+        print("{:<6} {:>10} {:>10} {:>14} {:>14}".format(
+            "mode", "reload s", "all() s", "MB reloaded", "MB all built"))
+        for mode in ("eager", "lazy"):
+            env = dict(os.environ, HBNB_FILE_HYDRATE=mode, PYTHONPATH=root)
+            env.pop("HBNB_TYPE_STORAGE", None)
+            out = subprocess.check_output(
+                [sys.executable, "-m", "benchmarks.lazy_reload", "--child",
+                 path], cwd=tmp, env=env)
+            print("{:<6} {:>10.3f} {:>10.3f} {:>14.1f} {:>14.1f}".format(
+                mode, *json.loads(out)))
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--child"]:
+        child(sys.argv[2])
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
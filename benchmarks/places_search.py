@@ -0,0 +1,74 @@
+#!/usr/bin/python3
+"""
+Times FileStorage.search_places() against walking the relationships
+(the cities of a state, the places of a city, the amenities of a
+place) one at a time as clients did through the API, on a store of
+places spread over states, cities and amenities.
+
+Usage: python3 -m benchmarks.places_search [places, default 1000000]
+"""
+import sys
+import timeit
+from models.amenity import Amenity
+from models.city import City
+from models.engine.file_storage import FileStorage
+from models.place import Place
+from models.state import State
+
+states = 50
+cities = 20
+
+
+def fill(storage, total):
+    """Fills storage with total places, one in a hundred with an
+    amenity, returning the states and the amenities"""
+    all_states = [State(name="state") for _ in range(states)]
+    all_cities = [City(name="city", state_id=all_states[i % states].id)
+                  for i in range(states * cities)]
+    amenities = []
+    objs = all_states + all_cities
+    for i in range(total):
+        place = Place(name="place", city_id=all_cities[i % len(all_cities)].id)
+        objs.append(place)
+        if i % 100 == 0:
+            amenities.append(Amenity(name="wifi", place_id=place.id))
+    for obj in objs + amenities:
+        storage.new(obj)
+    return all_states, amenities
+
+
+def walk(storage, state_ids, amenity_ids):
+    """Finds the places the way the relationships reach them"""
+    wanted = set(amenity_ids)
+    found = []
+    for state in state_ids:
+        for city in storage.get(State, state).cities:
+            for place in storage.related(Place, "city_id", city.id):
+                if wanted <= {a.id for a in place.amenities}:
+                    found.append(place)
+    return found
+
+
+def main(total):
+    """Prints the timings for a store of the given size"""
+    storage = FileStorage()
+    all_states, amenities = fill(storage, total)
+    state_ids = [state.id for state in all_states[:5]]
+    amenity_ids = [amenities[0].id]
+    runs = 5
+    timings = [
+        ("5 states, walk", lambda: walk(storage, state_ids, [])),
+        ("5 states, index", lambda: storage.search_places(state_ids)),
+        ("5 states + amenity, walk",
+         lambda: walk(storage, state_ids, amenity_ids)),
+        ("5 states + amenity, index",
+         lambda: storage.search_places(state_ids, amenities=amenity_ids)),
+    ]
+    print("{:d} places in {:d} cities".format(total, states * cities))
+    for label, func in timings:
+        best = min(timeit.repeat(func, number=1, repeat=runs))
+        print("{:<28} {:>12.3f} ms".format(label, best * 1000))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
@@ -0,0 +1,59 @@
+#!/usr/bin/python3
+"""
+Times FileStorage.save() and an eager reload() with the JSON and the
+binary formats, and compares the size of the files they write.
+
+Usage: python3 -m benchmarks.serializers [objects ...]
+       (default 10000 100000 1000000)
+"""
+import os
+import sys
+import tempfile
+import time
+from models.engine.file_storage import FileStorage, classes
+
+kinds = ["Amenity", "City", "Place", "Review", "State", "User"]
+
+
+def fill(storage, total):
+    """Replaces the objects of storage with total new ones"""
+    storage.all().clear()
+    FileStorage._FileStorage__classes.clear()
+    FileStorage._FileStorage__refs.clear()
+    FileStorage._FileStorage__pending.clear()
+    for i in range(total):
+        obj = classes[kinds[i % len(kinds)]](name="object {:d}".format(i),
+                                             state_id="s", place_id="p")
+        storage.new(obj)
+
+
+def measure(storage, path, format):
+    """Saves and reloads storage in format and returns the timings"""
+    FileStorage._FileStorage__format = format
+    start = time.perf_counter()
+    storage.save()
+    saved = time.perf_counter()
+    storage.reload()
+    loaded = time.perf_counter()
+    return saved - start, loaded - saved, os.path.getsize(path)
+
+
+def main(sizes):
+    """Prints the comparison for each store size"""
+    storage = FileStorage()
+    FileStorage._FileStorage__lazy = False
+    print("{:>9} {:<7} {:>9} {:>10} {:>10}".format(
+        "objects", "format", "save s", "reload s", "size MB"))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "file.json")
+        FileStorage._FileStorage__file_path = path
+        for total in sizes:
+            for format in ("json", "binary"):
+                fill(storage, total)
+                save, load, size = measure(storage, path, format)
+                print("{:>9d} {:<7} {:>9.3f} {:>10.3f} {:>10.1f}".format(
+                    total, format, save, load, size / 2 ** 20))
+
+
+if __name__ == "__main__":
+    main([int(n) for n in sys.argv[1:]] or [10000, 100000, 1000000])
@@ -0,0 +1,86 @@
+#!/usr/bin/python3
+"""
+Runs DBStorage on a SQLite file in each journal mode: times loading
+the states with bulk_new(), then how many get() requests per second
+reader threads serve while one thread keeps saving new states, each
+request closing the storage as the API teardown does.
+
+Usage: python3 -m benchmarks.sqlite_backend [states, default 100000]
+                                            [readers, default 4]
+"""
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+duration = 3
+
+
+def child(total, readers):
+    """Measures the journal mode chosen by HBNB_SQLITE_JOURNAL_MODE"""
+    from models import storage
+    from models.state import State
+    states = [State(name="state {:d}".format(i)) for i in range(total)]
+    ids = [state.id for state in states]
+    start = time.perf_counter()
+    storage.bulk_new(states)
+    loaded = time.perf_counter() - start
+    del states
+    counts = [0] * (readers + 1)
+    stop = time.perf_counter() + duration
+
+    def read(slot):
+        """Gets random states until the time is up"""
+        while time.perf_counter() < stop:
+            storage.get(State, random.choice(ids))
+            storage.close()
+            counts[slot] += 1
+
+    def write(slot):
+        """Saves new states until the time is up"""
+        while time.perf_counter() < stop:
+            State(name="written").save()
+            storage.close()
+            counts[slot] += 1
+
+    threads = [threading.Thread(target=read, args=(i,))
+               for i in range(readers)]
+    threads.append(threading.Thread(target=write, args=(readers,)))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    print(json.dumps([total / loaded, sum(counts[:readers]) / duration,
+                      counts[readers] / duration]))
+
+
+def main(total, readers):
+    """Prints the comparison for the given number of states and readers"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    print("{:d} states, {:d} reader threads and 1 writer".format(
+        total, readers))
+    print("{:<8} {:>14} {:>12} {:>12}".format(
+        "journal", "bulk_new /s", "reads /s", "writes /s"))
+    for mode in ("DELETE", "WAL"):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, PYTHONPATH=root, HBNB_TYPE_STORAGE="db",
+                       HBNB_DB_URL="sqlite:///" + os.path.join(tmp, "hbnb.db"),
+                       HBNB_SQLITE_JOURNAL_MODE=mode)
+            env.pop("HBNB_MYSQL_REPLICAS", None)
+            out = subprocess.check_output(
+                [sys.executable, "-m", "benchmarks.sqlite_backend", "--child",
+                 str(total), str(readers)], cwd=tmp, env=env)
+        print("{:<8} {:>14.0f} {:>12.0f} {:>12.0f}".format(
+            mode, *json.loads(out)))
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--child"]:
+        child(int(sys.argv[2]), int(sys.argv[3]))
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000,
+             int(sys.argv[2]) if len(sys.argv) > 2 else 4)
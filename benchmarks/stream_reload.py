@@ -0,0 +1,63 @@
+#!/usr/bin/python3
+"""
+Compares the peak resident memory of loading a file.json with
+json.load, as reload() used to, against the streaming reload() with
+eager and lazy hydration.
+
+Usage: python3 -m benchmarks.stream_reload [objects, default 200000]
+"""
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from benchmarks.lazy_reload import generate
+
+
+def child(path, mode):
+    """Loads path one way and prints the peak RSS growth and time"""
+    from models.engine.file_storage import FileStorage, classes
+    base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    if mode == "json.load":
+        with open(path) as f:
+            objects = {k: classes[v["__class__"]](**v)
+                       for k, v in json.load(f).items()}
+    else:
+        FileStorage._FileStorage__file_path = path
+        FileStorage().reload()
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps([elapsed, (peak - base) / 1024]))
+
+
+def main(total):
+    """Prints the comparison for a file of the given size"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "data.json")
+        generate(path, total)
+        print("{:d} objects, {:.1f} MB file".format(
+            total, os.path.getsize(path) / 2 ** 20))
+        print("{:<18} {:>10} {:>16}".format("loader", "time s",
+                                            "peak RSS +MB"))
+        for mode, hydrate in (("json.load", "eager"),
+                              ("stream eager", "eager"),
+                              ("stream lazy", "lazy")):
+            env = dict(os.environ, HBNB_FILE_HYDRATE=hydrate,
+                       PYTHONPATH=root)
+            env.pop("HBNB_TYPE_STORAGE", None)
+            out = subprocess.check_output(
+                [sys.executable, "-m", "benchmarks.stream_reload",
+                 "--child", path, mode], cwd=tmp, env=env)
+            elapsed, peak = json.loads(out)
+            print("{:<18} {:>10.3f} {:>16.1f}".format(mode, elapsed, peak))
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--child"]:
+        child(sys.argv[2], sys.argv[3])
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
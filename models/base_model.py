@@ -8,10 +8,12 @@ import models
 from os import getenv
 import sqlalchemy
 from sqlalchemy import Column, String, DateTime
+from sqlalchemy.dialects import mysql
 from sqlalchemy.ext.declarative import declarative_base
 import uuid
 
 time = "%Y-%m-%dT%H:%M:%S.%f"
+timestamp = DateTime().with_variant(mysql.DATETIME(fsp=6), "mysql")
 
 if models.storage_t == "db":
     Base = declarative_base()
@@ -23,8 +25,10 @@ class BaseModel:
     """The BaseModel class from which future classes will be derived"""
     if models.storage_t == "db":
         id = Column(String(60), primary_key=True)
-        created_at = Column(DateTime, default=datetime.utcnow)
-        updated_at = Column(DateTime, default=datetime.utcnow)
+        created_at = Column(timestamp, default=datetime.utcnow)
+        updated_at = Column(timestamp, default=datetime.utcnow, index=True)
+    else:
+        __slots__ = ("__status", "__changed", "__dict__", "__weakref__")
 
     def __init__(self, *args, **kwargs):
         """Initialization of the base model"""
@@ -46,6 +50,56 @@ class BaseModel:
             self.id = str(uuid.uuid4())
             self.created_at = datetime.utcnow()
             self.updated_at = self.created_at
+        if models.storage_t != "db":
+            self.__status = "new"
+            self.__changed = set()
+
+    if models.storage_t != "db":
+        def __setattr__(self, name, value):
+            """sets an attribute, recording the change for the storage"""
+            old = getattr(self, name, None)
+            super().__setattr__(name, value)
+            if name[0] != "_" and old != value:
+                changed = getattr(self, "_BaseModel__changed", None)
+                if changed is None:
+                    self.__changed = changed = set()
+                changed.add(name)
+                models.storage.track(self, name, old)
+
+        def mark_saved(self):
+            """forgets the changes once the storage has written them"""
+            if getattr(self, "_BaseModel__status", None) != "deleted":
+                self.__status = None
+            self.__changed = set()
+
+        def mark_deleted(self):
+            """records that the instance was deleted from the storage"""
+            self.__status = "deleted"
+
+        def mark_stored(self):
+            """records that the instance was stored again after it was
+            deleted, so that it is saved in full"""
+            if getattr(self, "_BaseModel__status", None) == "deleted":
+                self.__status = "new"
+
+    def changes(self):
+        """returns the status of the instance since it was last saved,
+        "new", "modified", "deleted" or None, and the names of the
+        attributes changed since then"""
+        if models.storage_t == "db":
+            state = sqlalchemy.inspect(self)
+            changed = {attr.key for attr in state.attrs
+                       if attr.history.has_changes()}
+            if state.deleted or state.was_deleted:
+                return "deleted", changed
+            if state.transient or state.pending:
+                return "new", changed
+            return ("modified" if changed else None), changed
+        status = getattr(self, "_BaseModel__status", None)
+        changed = set(getattr(self, "_BaseModel__changed", None) or ())
+        if status is None and changed:
+            status = "modified"
+        return status, changed
 
     def __str__(self):
         """String representation of the BaseModel class"""
@@ -58,16 +112,25 @@ class BaseModel:
         models.storage.new(self)
         models.storage.save()
 
-    def to_dict(self):
-        """returns a dictionary containing all keys/values of the instance"""
-        new_dict = self.__dict__.copy()
+    def to_dict(self, fields=None):
+        """returns a dictionary containing all keys/values of the instance,
+        or only those of the names in fields"""
+        attrs = self.__dict__
+        if fields is None:
+            new_dict = attrs.copy()
+        else:
+            new_dict = {name: attrs[name] for name in fields
+                        if name in attrs and not name.startswith("_")}
         if "created_at" in new_dict:
             new_dict["created_at"] = new_dict["created_at"].strftime(time)
         if "updated_at" in new_dict:
             new_dict["updated_at"] = new_dict["updated_at"].strftime(time)
-        new_dict["__class__"] = self.__class__.__name__
-        if "_sa_instance_state" in new_dict:
-            del new_dict["_sa_instance_state"]
+        if fields is None or "__class__" in fields:
+            new_dict["__class__"] = self.__class__.__name__
+        if "_sa_instance_state" in attrs:
+            new_dict.pop("_sa_instance_state", None)
+            for name in sqlalchemy.inspect(type(self)).relationships.keys():
+                new_dict.pop(name, None)
         return new_dict
 
     def delete(self):
@@ -0,0 +1,38 @@
+#!/usr/bin/python3
+"""
+Contains the opaque cursors storage.page() returns to continue a listing
+after the last object of a page
+"""
+
+import base64
+from datetime import datetime
+import json
+from models.base_model import time
+
+
+def sort_value(value):
+    """Returns value as it is ordered and kept in a cursor, datetimes as
+    the text they are stored as"""
+    if isinstance(value, datetime):
+        return value.strftime(time)
+    return value
+
+
+def encode(order_by, value, id):
+    """Returns the cursor following the object with id whose order_by
+    attribute is value"""
+    data = json.dumps([order_by, sort_value(value), id])
+    return base64.urlsafe_b64encode(data.encode("utf-8")).decode("ascii")
+
+
+def decode(cursor, order_by):
+    """Returns the (value, id) a cursor made for order_by follows,
+    raising ValueError for anything else"""
+    try:
+        data = base64.urlsafe_b64decode(cursor.encode("ascii"))
+        field, value, id = json.loads(data)
+    except (TypeError, ValueError, UnicodeError):
+        raise ValueError("Invalid cursor")
+    if field != order_by or not isinstance(id, str):
+        raise ValueError("Invalid cursor")
+    return value, id
@@ -1,19 +1,36 @@
 #!/usr/bin/python3
+"""
+Contains the class DBStorage
+for interacting with the MySQL database, or any database
+SQLAlchemy can reach through HBNB_DB_URL, SQLite included
+"""
 
-# This module contains the class DBStorage
-# for interacting with the MySQL database
-
+from datetime import datetime
+from decimal import Decimal
+from itertools import chain
 import models
 from models.amenity import Amenity
-from models.base_model import Base
+from models.base_model import Base, time as time_format
 from models.city import City
+from models.engine import cursors
 from models.place import Place
 from models.review import Review
 from models.state import State
 from models.user import User
 from os import getenv
-from sqlalchemy import create_engine
-from sqlalchemy.orm import scoped_session, sessionmaker
+import random
+from sqlalchemy import and_, create_engine, event, func, insert, inspect
+from sqlalchemy import or_, select, text, update, DateTime
+from sqlalchemy.orm import aliased, joinedload, load_only, scoped_session
+from sqlalchemy.orm import selectinload, ColumnProperty
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import make_transient, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool, StaticPool
+import threading
+import time
+import weakref
 
 classes = {
     "Amenity": Amenity,
@@ -24,45 +41,523 @@ classes = {
     "User": User
 }
 
+loaders = {
+    "joined": joinedload,
+    "selectin": selectinload
+}
+
+aggregates = {
+    "count": func.count,
+    "sum": func.sum,
+    "avg": func.avg,
+    "min": func.min,
+    "max": func.max
+}
+
+
+pragmas = (
+    ("journal_mode", "HBNB_SQLITE_JOURNAL_MODE", "WAL"),
+    ("synchronous", "HBNB_SQLITE_SYNCHRONOUS", "NORMAL"),
+    ("mmap_size", "HBNB_SQLITE_MMAP_SIZE", "268435456"),
+    ("busy_timeout", "HBNB_SQLITE_BUSY_TIMEOUT", "5000"),
+    ("foreign_keys", "HBNB_SQLITE_FOREIGN_KEYS", "ON")
+)
+
+
+class PoolStats:
+    """Counters of what a connection pool did, carried over to the pool
+    that replaces it when the engine is disposed
+
+    Checkouts and connections are counted by the pool events of the
+    engine, the waits by MeteredQueuePool.connect()."""
+
+    def __init__(self):
+        """Starts every counter at zero"""
+        self.lock = threading.Lock()
+        self.waiting = 0
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.created = 0
+        self.closed = 0
+
+    def listen(self, engine):
+        """Counts the checkouts and connections of the pool of engine"""
+        event.listen(engine, "checkout", self.checked_out)
+        event.listen(engine, "connect", self.connected)
+        event.listen(engine, "close", self.disconnected)
+
+    def checked_out(self, *args):
+        """Counts a connection handed out by the pool"""
+        with self.lock:
+            self.checkouts += 1
+
+    def connected(self, *args):
+        """Counts a new database connection"""
+        with self.lock:
+            self.created += 1
+
+    def disconnected(self, *args):
+        """Counts a closed database connection"""
+        with self.lock:
+            self.closed += 1
+
+    def waited(self, seconds):
+        """Records a checkout that took seconds"""
+        with self.lock:
+            self.waiting -= 1
+            self.waits += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+
+
+class MeteredQueuePool(QueuePool):
+    """QueuePool that times how long each checkout waits"""
+    stats = None
+
+    def connect(self):
+        """Returns a connection from the pool, counting the waiters"""
+        stats = self.stats
+        if stats is None:
+            return super().connect()
+        with stats.lock:
+            stats.waiting += 1
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            stats.waited(time.perf_counter() - start)
+
+    def recreate(self):
+        """Returns the pool that replaces this one, with the same stats"""
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+class RoutingSession(Session):
+    """Session that sends reads to a random replica, and writes to the
+    primary it is bound to
+
+    Once the session has written, or is about to flush, every statement
+    goes to the primary so that the writes are read back. That lasts
+    until the session is closed, at the end of the request."""
+
+    def __init__(self, replicas=(), **kwargs):
+        """Creates a session reading from the replicas engines"""
+        super().__init__(**kwargs)
+        self.replicas = list(replicas)
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        """Returns the engine a statement runs on"""
+        if self.replicas and not self._flushing and \
+                not self.info.get("primary") and \
+                getattr(clause, "is_select", False):
+            return random.choice(self.replicas)
+        self.info["primary"] = True
+        return super().get_bind(mapper, clause=clause, **kwargs)
+
 
 class DBStorage:
     """Interacts with the MySQL database"""
     __engine = None
     __session = None
 
-    def __init__(self):
-        """Instantiate a DBStorage object"""
+    def __init__(self, url=None, replicas=None):
+        """Instantiate a DBStorage object on the database at url,
+        HBNB_DB_URL or else built from the HBNB_MYSQL_* variables by
+        default, reading from the
+        databases at the replicas URLs, HBNB_MYSQL_REPLICAS separated by
+        commas by default"""
         HBNB_MYSQL_USER = getenv('HBNB_MYSQL_USER')
         HBNB_MYSQL_PWD = getenv('HBNB_MYSQL_PWD')
         HBNB_MYSQL_HOST = getenv('HBNB_MYSQL_HOST')
         HBNB_MYSQL_DB = getenv('HBNB_MYSQL_DB')
+        HBNB_MYSQL_REPLICAS = getenv('HBNB_MYSQL_REPLICAS', '')
         HBNB_ENV = getenv('HBNB_ENV')
-        self.__engine = create_engine('mysql+mysqldb://{}:{}@{}/{}'.
-                                      format(HBNB_MYSQL_USER,
-                                             HBNB_MYSQL_PWD,
-                                             HBNB_MYSQL_HOST,
-                                             HBNB_MYSQL_DB))
+        if url is None:
+            url = getenv('HBNB_DB_URL')
+        if url is None:
+            url = 'mysql+mysqldb://{}:{}@{}/{}'.format(HBNB_MYSQL_USER,
+                                                       HBNB_MYSQL_PWD,
+                                                       HBNB_MYSQL_HOST,
+                                                       HBNB_MYSQL_DB)
+        if replicas is None:
+            replicas = [replica.strip() for replica in
+                        HBNB_MYSQL_REPLICAS.split(',') if replica.strip()]
+        self.__engine = self.__connect(url)
+        self.__replicas = [self.__connect(replica) for replica in replicas]
+        self.__listeners = []
         if HBNB_ENV == "test":
             Base.metadata.drop_all(self.__engine)
 
-    def all(self, cls=None):
-        """Query on the current database session"""
+    @staticmethod
+    def __connect(url):
+        """Returns an engine on url with a metered pool configured by the
+        HBNB_MYSQL_POOL_* variables
+
+        SQLite connections may be used by any Flask thread, one at a
+        time through the pool, and are set up with the pragmas. An
+        in-memory database is a single connection shared by every
+        thread, without pool statistics."""
+        HBNB_MYSQL_POOL_SIZE = int(getenv('HBNB_MYSQL_POOL_SIZE', 5))
+        HBNB_MYSQL_MAX_OVERFLOW = int(getenv('HBNB_MYSQL_MAX_OVERFLOW', 10))
+        HBNB_MYSQL_POOL_RECYCLE = int(getenv('HBNB_MYSQL_POOL_RECYCLE', 3600))
+        HBNB_MYSQL_POOL_TIMEOUT = float(getenv('HBNB_MYSQL_POOL_TIMEOUT', 30))
+        HBNB_MYSQL_POOL_PRE_PING = getenv('HBNB_MYSQL_POOL_PRE_PING') != "0"
+        options = {
+            "poolclass": MeteredQueuePool,
+            "pool_size": HBNB_MYSQL_POOL_SIZE,
+            "max_overflow": HBNB_MYSQL_MAX_OVERFLOW,
+            "pool_recycle": HBNB_MYSQL_POOL_RECYCLE,
+            "pool_timeout": HBNB_MYSQL_POOL_TIMEOUT,
+            "pool_pre_ping": HBNB_MYSQL_POOL_PRE_PING
+        }
+        parsed = make_url(url)
+        sqlite = parsed.get_backend_name() == "sqlite"
+        if sqlite:
+            options["connect_args"] = {"check_same_thread": False}
+            if parsed.database in (None, "", ":memory:"):
+                options = {"poolclass": StaticPool,
+                           "connect_args": options["connect_args"]}
+        engine = create_engine(url, **options)
+        if sqlite:
+            event.listen(engine, "connect", DBStorage.__pragmas)
+        if options["poolclass"] is StaticPool:
+            return engine
+        stats = PoolStats()
+        engine.pool.stats = stats
+        stats.listen(engine)
+        return engine
+
+    @staticmethod
+    def __class(cls):
+        """Returns the model class given as a class or a class name"""
+        if isinstance(cls, str):
+            return classes.get(cls)
+        return cls if cls in classes.values() else None
+
+    @staticmethod
+    def __options(cls, load):
+        """Returns the loader options for the relationships of cls named
+        in load, a dictionary mapping a relationship, or a dotted path of
+        them, to "selectin" or "joined"
+        """
+        options = []
+        for path, strategy in (load or {}).items():
+            option = None
+            owner = cls
+            for name in path.split("."):
+                attr = getattr(owner, name)
+                if option is None:
+                    option = loaders[strategy](attr)
+                else:
+                    option = getattr(option, loaders[strategy].__name__)(attr)
+                owner = attr.property.mapper.class_
+            options.append(option)
+        return options
+
+    def all(self, cls=None, load=None):
+        """Query on the current database session, loading the
+        relationships named in load along (see __options)"""
         new_dict = {}
+        if cls is not None:
+            cls = self.__class(cls)
+            if cls is None:
+                return new_dict
         for clss in classes:
-            if cls is None or cls is classes[clss] or cls is clss:
-                objs = self.__session.query(classes[clss]).all()
+            if cls is None or cls is classes[clss]:
+                query = self.__session.query(classes[clss])
+                if load:
+                    query = query.options(*self.__options(classes[clss],
+                                                          load))
+                objs = query.all()
                 for obj in objs:
                     key = obj.__class__.__name__ + '.' + obj.id
                     new_dict[key] = obj
         return new_dict
 
+    def iter(self, cls=None, batch_size=1000, where=None, fields=None):
+        """Yields the objects of cls, or of every class, whose columns
+        have the values in where, fetching them from a server-side cursor
+        batch_size rows at a time and, when fields is given, loading only
+        the columns it names"""
+        if cls is not None:
+            cls = self.__class(cls)
+            if cls is None:
+                return
+        for clss in classes.values():
+            if cls is None or cls is clss:
+                query = select(clss).execution_options(yield_per=batch_size)
+                for field, value in (where or {}).items():
+                    query = query.where(getattr(clss, field) == value)
+                if fields is not None:
+                    query = query.options(self.__projection(clss, fields))
+                yield from self.__session.scalars(query)
+
+    @staticmethod
+    def __projection(cls, fields, *required):
+        """Returns the loader option loading only the columns of cls named
+        in fields or required, and its id"""
+        names = set(fields).union(required, ("id",))
+        return load_only(*[getattr(cls, name) for name in
+                           inspect(cls).column_attrs.keys() if name in names])
+
+    def page(self, cls, after=None, limit=100, order_by="id", where=None,
+             fields=None):
+        """Returns up to limit objects of cls whose columns have the
+        values in where, in order_by order after the object the cursor
+        after stands for, and the cursor that follows the last of them,
+        None once there are no more; with fields, only the columns it
+        names are loaded
+
+        The cursor is compared with the sort key rather than skipped to
+        with OFFSET, so that every page costs an index seek. Rows whose
+        order_by column is NULL come first."""
+        cls = self.__class(cls)
+        if cls is None:
+            return [], None
+        column = getattr(cls, order_by)
+        query = select(cls)
+        for field, value in (where or {}).items():
+            query = query.where(getattr(cls, field) == value)
+        if fields is not None:
+            query = query.options(self.__projection(cls, fields, order_by))
+        if after is not None:
+            value, id = cursors.decode(after, order_by)
+            if order_by == "id":
+                query = query.where(cls.id > id)
+            else:
+                query = query.where(self.__after(cls, column, value, id))
+        if order_by == "id":
+            query = query.order_by(cls.id)
+        else:
+            query = query.order_by(column, cls.id)
+        objs = list(self.__session.scalars(query.limit(limit + 1)))
+        if len(objs) <= limit:
+            return objs, None
+        last = objs[limit - 1]
+        return objs[:limit], cursors.encode(order_by,
+                                            getattr(last, order_by), last.id)
+
+    @staticmethod
+    def __after(cls, column, value, id):
+        """Returns the condition on the rows of cls that come after the
+        row with id whose column is value, in (column, id) order
+
+        NULL sorts before any value, as in MySQL and SQLite and in the
+        order FileStorage.page() keeps."""
+        if value is None:
+            return or_(column.is_not(None),
+                       and_(column.is_(None), cls.id > id))
+        if isinstance(column.type, DateTime):
+            value = datetime.strptime(value, time_format)
+        return or_(column > value, and_(column == value, cls.id > id))
+
+    def aggregate(self, cls, group_by=(), metrics=None, where=None):
+        """Returns a dictionary per distinct value of the group_by columns
+        of the rows of cls whose columns have the values in where, with
+        those values and each metric of metrics, a dictionary mapping a
+        name to a (function, column) pair where function is count, sum,
+        avg, min or max. count of None counts rows, and is the metric
+        named count when metrics is not given. A group_by column can be
+        read through foreign keys, as "city.state_id" for Place.
+
+        The groups are computed by the database in one GROUP BY query,
+        ordered by their values."""
+        cls = self.__class(cls)
+        if cls is None:
+            return []
+        metrics = metrics or {"count": ("count", None)}
+        joins = {}
+        groups = [self.__column(cls, path, joins).label(path)
+                  for path in group_by]
+        values = []
+        for name, (function, field) in metrics.items():
+            if function not in aggregates:
+                raise ValueError("Unknown aggregate " + function)
+            if field is None:
+                column = aggregates[function]()
+            else:
+                column = aggregates[function](
+                    self.__column(cls, field, joins))
+            values.append(column.label(name))
+        query = select(*groups, *values).select_from(cls)
+        for target, condition in joins.values():
+            query = query.outerjoin(target, condition)
+        for field, value in (where or {}).items():
+            query = query.where(self.__column(cls, field, {}) == value)
+        if groups:
+            query = query.group_by(*groups).order_by(*groups)
+        results = []
+        for row in self.__session.execute(query):
+            result = {path: cursors.sort_value(row[i])
+                      for i, path in enumerate(group_by)}
+            for name, (function, _) in metrics.items():
+                result[name] = self.__number(row._mapping[name], function)
+            results.append(result)
+        return results
+
+    @staticmethod
+    def __column(cls, path, joins):
+        """Returns the column path names on cls, adding to joins the
+        tables reached through the foreign keys of a dotted path"""
+        *hops, field = path.split(".")
+        entity = cls
+        for i, hop in enumerate(hops):
+            prefix = tuple(hops[:i + 1])
+            if prefix not in joins:
+                target = classes.get(hop.capitalize())
+                if target is None or not hasattr(entity, hop + "_id"):
+                    raise ValueError("Unknown column " + path)
+                target = aliased(target)
+                joins[prefix] = (target,
+                                 getattr(entity, hop + "_id") == target.id)
+            entity = joins[prefix][0]
+        column = getattr(entity, field, None)
+        if not isinstance(getattr(column, "property", None), ColumnProperty):
+            raise ValueError("Unknown column " + path)
+        return column
+
+    @staticmethod
+    def __number(value, function):
+        """Returns an aggregate as the plain number or text JSON carries,
+        whatever type the database driver returns it as"""
+        if value is None:
+            return None
+        if function == "avg":
+            return float(value)
+        if isinstance(value, Decimal):
+            return int(value) if value == int(value) else float(value)
+        return cursors.sort_value(value)
+
+    def search_places(self, states=(), cities=(), amenities=()):
+        """Returns the places of the cities listed and of the cities of
+        the states listed, or all places when both lists are empty,
+        that have every amenity listed
+
+        Each list becomes an IN over an indexed column, so the database
+        intersects index lookups rather than scanning places."""
+        links = Place.amenities.property.secondary
+        query = select(Place)
+        if states or cities:
+            in_states = select(City.id).where(City.state_id.in_(states))
+            query = query.where(or_(Place.city_id.in_(cities),
+                                    Place.city_id.in_(in_states)))
+        for amenity in set(amenities):
+            query = query.where(Place.id.in_(
+                select(links.c.place_id)
+                .where(links.c.amenity_id == amenity)))
+        return list(self.__session.scalars(query))
+
     def new(self, obj):
         """Add the object to the current database session"""
         self.__session.add(obj)
 
+    def bulk_new(self, objs, batch_size=1000):
+        """Inserts objs with one executemany INSERT per class and batch of
+        batch_size rows, committing once at the end
+
+        Each batch of objects joins the session as loaded from the
+        database once it is inserted, so that they are saved again
+        with an UPDATE like any other. On error the session is rolled
+        back and the objects are left unstored."""
+        columns = {}
+        batches = {}
+        attached = weakref.WeakSet()
+        try:
+            for obj in objs:
+                cls = type(obj)
+                if cls not in columns:
+                    columns[cls] = set(inspect(cls).column_attrs.keys())
+                    batches[cls] = []
+                batch = batches[cls]
+                batch.append(obj)
+                if len(batch) == batch_size:
+                    self.__insert(cls, columns[cls], batch, attached)
+                    batches[cls] = []
+            for cls, batch in batches.items():
+                if batch:
+                    self.__insert(cls, columns[cls], batch, attached)
+            self.__session.info.setdefault("changed", set()).update(
+                cls.__name__ for cls in columns)
+            self.__session.commit()
+        except Exception:
+            for obj in list(attached):
+                self.__session.expunge(obj)
+                make_transient(obj)
+            self.__session.rollback()
+            raise
+
+    def __insert(self, cls, columns, objs, attached):
+        """Inserts the objects of cls in objs with one executemany INSERT
+        and adds them to the session and attached as persistent"""
+        self.__session.execute(insert(cls), [
+            {key: value for key, value in obj.__dict__.items()
+             if key in columns and value is not None} for obj in objs])
+        for obj in objs:
+            make_transient_to_detached(obj)
+            self.__session.add(obj)
+            attached.add(obj)
+
+    def bulk_update(self, cls, rows, batch_size=1000):
+        """Updates the objects of cls by primary key from the dictionaries
+        in rows, each holding an id and the attributes to set, with one
+        executemany UPDATE per batch and a single commit
+
+        updated_at is set to now unless a row gives it, and rows whose
+        object does not exist are skipped. The objects already loaded in
+        the session get the new values. On error the session is rolled
+        back and no row is updated."""
+        cls = self.__class(cls)
+        if cls is None:
+            return
+        now = datetime.utcnow()
+        batch = []
+        try:
+            for row in rows:
+                batch.append(dict(row))
+                batch[-1].setdefault("updated_at", now)
+                if len(batch) == batch_size:
+                    self.__update(cls, batch)
+                    batch = []
+            if batch:
+                self.__update(cls, batch)
+            self.__session.info.setdefault("changed", set()).add(
+                cls.__name__)
+            self.__session.commit()
+        except Exception:
+            self.__session.rollback()
+            raise
+
+    def __update(self, cls, rows):
+        """Updates the objects of cls from rows with one executemany
+        UPDATE, leaving out the rows whose id is not in the table, and
+        sets the new values on the objects loaded in the session"""
+        ids = set(self.__session.scalars(
+            select(cls.id).where(cls.id.in_([row["id"] for row in rows]))))
+        rows = [row for row in rows if row["id"] in ids]
+        if not rows:
+            return
+        self.__session.execute(update(cls), rows)
+        mapper = inspect(cls)
+        columns = mapper.column_attrs.keys()
+        loaded = self.__session.identity_map
+        for row in rows:
+            obj = loaded.get(mapper.identity_key_from_primary_key(
+                (row["id"],)))
+            if obj is not None:
+                for key in columns & row.keys():
+                    set_committed_value(obj, key, row[key])
+
     def save(self):
-        """Commit all changes of the current database session"""
-        self.__session.commit()
+        """Commit all changes of the current database session, skipping
+        the round trip when there is nothing to write"""
+        session = self.__session
+        if session.new or session.dirty or session.deleted or \
+                session.info.get("flushed"):
+            session.commit()
 
     def delete(self, obj=None):
         """Delete from the current database session obj if not None"""
@@ -72,10 +567,81 @@ class DBStorage:
     def reload(self):
         """Reloads data from the database"""
         Base.metadata.create_all(self.__engine)
-        sess_factory = sessionmaker(bind=self.__engine, expire_on_commit=False)
+        sess_factory = sessionmaker(bind=self.__engine, expire_on_commit=False,
+                                    class_=RoutingSession,
+                                    replicas=self.__replicas)
+        event.listen(sess_factory, "after_flush", self.__flushed)
+        event.listen(sess_factory, "after_commit", self.__committed)
+        event.listen(sess_factory, "after_rollback", self.__settled)
         Session = scoped_session(sess_factory)
         self.__session = Session
 
+    def migrate(self):
+        """Creates the missing tables, and the indexes declared on the
+        models that the existing tables lack, returning the names of
+        the indexes created
+
+        On MySQL, dates of existing tables kept to the second are widened
+        to microseconds, so that validators tell apart changes made
+        within the same second."""
+        Base.metadata.create_all(self.__engine)
+        existing = inspect(self.__engine)
+        if self.__engine.dialect.name == "mysql":
+            self.__widen_dates(existing)
+        created = []
+        for table in Base.metadata.sorted_tables:
+            names = {index["name"] for index in
+                     existing.get_indexes(table.name)}
+            for index in sorted(table.indexes, key=lambda index: index.name):
+                if index.name not in names:
+                    index.create(self.__engine)
+                    created.append(index.name)
+        return created
+
+    def __widen_dates(self, existing):
+        """Alters the MySQL DATETIME columns of the models that store
+        fewer fractional digits than declared"""
+        with self.__engine.begin() as connection:
+            for table in Base.metadata.sorted_tables:
+                for column in existing.get_columns(table.name):
+                    declared = table.columns.get(column["name"])
+                    if declared is None or \
+                            not isinstance(declared.type, DateTime):
+                        continue
+                    impl = declared.type.dialect_impl(self.__engine.dialect)
+                    fsp = getattr(impl, "fsp", None) or 0
+                    if (getattr(column["type"], "fsp", None) or 0) < fsp:
+                        connection.execute(text(
+                            "ALTER TABLE `{}` MODIFY `{}` DATETIME({:d}) "
+                            "NULL".format(table.name, column["name"], fsp)))
+
+    @staticmethod
+    def __flushed(session, context):
+        """Remembers that the session sent changes it has not committed,
+        and the classes of the objects they touch"""
+        session.info["flushed"] = True
+        session.info.setdefault("changed", set()).update(
+            type(obj).__name__ for obj in
+            chain(session.new, session.dirty, session.deleted))
+
+    @staticmethod
+    def __settled(session):
+        """Forgets the flushed changes once committed or rolled back,
+        returning the names of the classes they touch"""
+        session.info.pop("flushed", None)
+        return session.info.pop("changed", ())
+
+    def __committed(self, session):
+        """Tells the listeners which classes a commit changed"""
+        for name in sorted(self.__settled(session)):
+            for callback in self.__listeners:
+                callback(name)
+
+    def listen(self, callback):
+        """Calls callback with the class name of the rows each commit
+        from now on inserts, changes or deletes"""
+        self.__listeners.append(callback)
+
     def count(self, cls=None):
         """
         Method that returns the number of
@@ -83,17 +649,86 @@ class DBStorage:
         If no class is passed, returns the count of all
         objects in storage
         """
+        if cls is None:
+            return sum(self.counts().values())
+        cls = self.__class(cls)
         if cls is not None:
-            return len(self.all(cls))
-        else:
-            return len(self.all())
+            query = select(func.count()).select_from(cls)
+            return self.__session.execute(query).scalar()
+
+    def counts(self):
+        """Returns the number of objects of each class by class name,
+        counted in a single query"""
+        query = select(*[select(func.count()).select_from(cls)
+                         .scalar_subquery().label(name)
+                         for name, cls in classes.items()])
+        return dict(self.__session.execute(query).one()._mapping)
 
-    def get(self, cls, id):
-        """Retrieve one object"""
+    def version(self, cls, where=None):
+        """Returns a token that changes whenever a row of cls whose
+        columns have the values in where is added, changed or deleted:
+        their number and latest updated_at, read from the indexes"""
+        if self.__class(cls) is None:
+            return None
+        stats = self.aggregate(cls, where=where, metrics={
+            "count": ("count", None), "last": ("max", "updated_at")})
+        return "{count}-{last}".format(**stats[0])
+
+    def get(self, cls, id, load=None, fields=None):
+        """Retrieve one object, loading the relationships named in load
+        along, and only the columns named in fields and updated_at when
+        fields is given"""
+        cls = self.__class(cls) if cls else None
         if cls and id:
-            return self.__session.query(cls).filter_by(id=id).first()
+            query = self.__session.query(cls).filter_by(id=id)
+            if fields is not None:
+                query = query.options(self.__projection(cls, fields,
+                                                        "updated_at"))
+            return query.options(*self.__options(cls, load)).first()
         return None
 
+    def pool_stats(self):
+        """Returns live statistics of the connection pool, with those of
+        the pool of each replica under "replicas" if there are some"""
+        stats = self.__engine_stats(self.__engine)
+        if self.__replicas:
+            stats["replicas"] = [self.__engine_stats(engine)
+                                 for engine in self.__replicas]
+        return stats
+
+    @staticmethod
+    def __pragmas(connection, record):
+        """Applies the HBNB_SQLITE_* pragmas to a new SQLite connection"""
+        cursor = connection.cursor()
+        for name, variable, default in pragmas:
+            value = getenv(variable, default)
+            if not value.isalnum():
+                raise ValueError("Invalid {}: {!r}".format(variable, value))
+            cursor.execute("PRAGMA {} = {}".format(name, value))
+        cursor.close()
+
+    @staticmethod
+    def __engine_stats(engine):
+        """Returns live statistics of the connection pool of engine"""
+        pool = engine.pool
+        stats = getattr(pool, "stats", None)
+        if stats is None:
+            return {}
+        with stats.lock:
+            average = stats.wait_total / stats.waits \
+                if stats.waits else 0.0
+            return {
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "overflow": pool.overflow(),
+                "waiting": stats.waiting,
+                "checkouts": stats.checkouts,
+                "checkout_ms_avg": round(average * 1000, 3),
+                "checkout_ms_max": round(stats.wait_max * 1000, 3),
+                "created": stats.created,
+                "closed": stats.closed
+            }
+
     def close(self):
         """Call remove() method on the private session attribute"""
         self.__session.remove()
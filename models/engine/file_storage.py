@@ -4,8 +4,21 @@
     serializing and deserializing instances to JSON files
 """
 
+import atexit
+from bisect import bisect_left, bisect_right, insort
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import hashlib
+from itertools import chain
 import json
+import logging
+import os
+import threading
+import time
+import uuid
+import zlib
 from models.base_model import BaseModel
+from models.engine import cursors, serializers
 from models.amenity import Amenity
 from models.city import City
 from models.place import Place
@@ -23,79 +36,1106 @@ classes = {
     "User": User
 }
 
+relations = {
+    "Amenity": ("place_id",),
+    "City": ("state_id",),
+    "Place": ("city_id", "user_id"),
+    "Review": ("place_id", "user_id")
+}
+
+log = logging.getLogger(__name__)
+
+packer = json.JSONEncoder(separators=(",", ":"),
+                          default=serializers.JSONSerializer.encode)
+
+aggregates = {
+    "count": len,
+    "sum": sum,
+    "avg": lambda values: sum(values) / len(values),
+    "min": min,
+    "max": max
+}
+
+
+class Patch(dict):
+    """The attributes a journal entry changes on an object without
+    writing it out in full"""
+
 
 class FileStorage:
     """Serializes instances to a JSON file and
-    deserializes JSON file to instances"""
+    deserializes JSON file to instances
+
+    save() writes nothing when no object was added, changed or deleted
+    since the last save. Instances record which of their attributes
+    changed (see BaseModel.changes()) and tell the storage about it.
+
+    With HBNB_FILE_MODE=journal, save() only appends the objects that
+    changed since the last save to <file>.log, an object already saved
+    as just its changed attributes, and reload() replays that
+    log on top of the snapshot. Once the log grows past
+    HBNB_FILE_JOURNAL_LIMIT bytes it is folded back into the snapshot
+    by a background thread.
+
+    With HBNB_FILE_MODE=sharded, objects are kept in <file>.d/, one file
+    per class (or per class and hash bucket of the id with
+    HBNB_FILE_SHARDS > 1). save() only rewrites the shards holding
+    changed objects and reload() reads the shards in parallel.
+
+    Snapshots and shards are written as JSON, or in the binary format
+    of models.engine.serializers with HBNB_FILE_FORMAT=binary; either
+    format is read back whatever the setting.
+
+    Every file is written through a temporary file that is flushed to
+    disk before it replaces the old one. HBNB_FILE_DURABILITY=sync, the
+    default, writes in save() itself. With group, save() hands the
+    changes to a background flusher and waits for the write, which
+    covers every save made meanwhile. With async it does not wait, and
+    the flusher writes once HBNB_FILE_FLUSH_MS milliseconds have passed
+    or HBNB_FILE_FLUSH_CHANGES objects have changed. flush() writes the
+    waiting changes at once and is called at exit. Objects are stored,
+    changed and written under one lock, so that threads can save while
+    the flusher writes.
+
+    reload() keeps the records it reads as compact JSON bytes and only
+    turns one into an instance of its class the first time it is
+    reached through all(), get() or related(); HBNB_FILE_HYDRATE=eager
+    builds them all up front instead.
+
+    page() walks sorted lists of (value, id) per class and attribute,
+    and per class, foreign key value and attribute when it pages through
+    the children of one object, built the first time they are paged on
+    and kept in order as objects come and go.
+
+    version() is a digest per class of the keys and updated_at of its
+    objects, moved on by every object of the class stored, saved or
+    dropped. Callbacks given to listen() are
+    told the class of each object new(), delete() or an attribute
+    change touches, and None after a reload."""
 
     __file_path = "file.json"
     __objects = {}
+    __classes = {}
+    __refs = {}
+    __orders = {}
+    __groups = {}
+    __versions = {}
+    __listeners = []
+    __pending = {}
+    __mode = os.getenv("HBNB_FILE_MODE", "snapshot")
+    __journal_limit = int(os.getenv("HBNB_FILE_JOURNAL_LIMIT", 4 << 20))
+    __lazy = os.getenv("HBNB_FILE_HYDRATE", "lazy") != "eager"
+    __shards = int(os.getenv("HBNB_FILE_SHARDS", 1))
+    __format = os.getenv("HBNB_FILE_FORMAT", "json")
+    __durability = os.getenv("HBNB_FILE_DURABILITY", "sync")
+    __flush_delay = int(os.getenv("HBNB_FILE_FLUSH_MS", 50)) / 1000
+    __flush_changes = int(os.getenv("HBNB_FILE_FLUSH_CHANGES", 1000))
+    __dirty = set()
+    __queued = set()
+    __requested = 0
+    __flushed = 0
+    __failed = 0
+    __flush_error = None
+    __flusher = None
+    __lock = threading.RLock()
+    __flushing = threading.Condition(__lock)
+    __compactor = None
+    __stamp = None
+    __offset = 0
+
+    def all(self, cls=None, load=None):
+        """Returns the dictionary __objects, or only the objects of cls
 
-    def all(self, cls=None):
-        """Returns the dictionary __objects"""
+        load is accepted for DBStorage compatibility: relationships are
+        answered from the in-memory indexes, so there is nothing to load
+        ahead."""
         if cls is None:
+            for name in list(self.__pending):
+                self.__hydrate_all(name)
             return self.__objects
+        name = self.__class_name(cls)
+        if name is not None:
+            self.__hydrate_all(name)
+            return dict(self.__classes.get(name, {}))
+
+    @staticmethod
+    def __hydrate(key, record):
+        """Builds the instance of the class named in a stored record,
+        without going through __init__ and strptime"""
+        cls = classes.get(record.get("__class__") or key.partition(".")[0],
+                          BaseModel)
+        obj = cls.__new__(cls)
+        attrs = obj.__dict__
+        attrs.update(record)
+        attrs.pop("__class__", None)
+        for name in ("created_at", "updated_at"):
+            value = attrs.get(name)
+            if isinstance(value, str):
+                attrs[name] = datetime.fromisoformat(value)
+            elif value is None:
+                attrs[name] = datetime.utcnow()
+        if attrs.get("id") is None:
+            attrs["id"] = str(uuid.uuid4())
+        return obj
+
+    def __hydrate_all(self, name):
+        """Builds the objects of every pending record of class name"""
+        with self.__lock:
+            pending = self.__pending.pop(name, None)
+            if pending:
+                bucket = self.__classes.setdefault(name, {})
+                for key, record in pending.items():
+                    obj = self.__hydrate(key, json.loads(record))
+                    self.__objects[key] = obj
+                    bucket[key] = obj
+
+    def __fetch(self, key):
+        """Returns the object stored under key, building it if needed"""
+        obj = self.__objects.get(key)
+        if obj is None:
+            name = key.partition(".")[0]
+            with self.__lock:
+                record = self.__pending.get(name, {}).pop(key, None)
+                if record is None:
+                    return self.__objects.get(key)
+                obj = self.__hydrate(key, json.loads(record))
+                self.__objects[key] = obj
+                self.__classes.setdefault(name, {})[key] = obj
+        return obj
+
+    @staticmethod
+    def __class_name(cls):
+        """Returns the name of a model class given as a class or a string"""
+        if isinstance(cls, str):
+            return cls if cls in classes else None
+        if cls in classes.values():
+            return cls.__name__
+        return None
+
+    def __index(self, key, obj):
+        """Files obj under key in __objects, its class bucket and the
+        reverse indexes of its foreign keys"""
+        if self.__objects.get(key) is obj:
+            return
+        self.__remove(key)
+        self.__objects[key] = obj
+        self.__classes.setdefault(key.partition(".")[0], {})[key] = obj
+        self.__link(key, obj.__dict__)
+
+    def __put(self, key, record, text=None):
+        """Stores a record read from disk for a key not held yet, to be
+        built on first access unless hydration is eager
+
+        A pending record is held as the JSON text it was read from, or
+        is encoded to, which takes a fraction of the memory of the
+        dictionary it was read as."""
+        if self.__lazy:
+            name = key.partition(".")[0]
+            if text is None:
+                text = packer.encode(record)
+            self.__pending.setdefault(name, {})[key] = text.encode("utf-8")
+            self.__link(key, record)
+        else:
+            self.__index(key, self.__hydrate(key, record))
+
+    def __remove(self, key):
+        """Drops key from __objects, its class bucket and the indexes,
+        returning the object or the attributes of the pending record
+        that was stored"""
+        name = key.partition(".")[0]
+        stored = self.__objects.pop(key, None)
+        if stored is not None:
+            del self.__classes[name][key]
+            self.__unlink(key, stored.__dict__)
+        else:
+            stored = self.__pending.get(name, {}).pop(key, None)
+            if stored is not None:
+                stored = json.loads(stored)
+                self.__unlink(key, stored)
+        return stored
+
+    def __link(self, key, attrs):
+        """Adds key to the reverse index of each foreign key in attrs,
+        and to the sorted lists of its class"""
+        name, _, id = key.partition(".")
+        self.__versions[name] = self.__versions.get(name, 0) ^ \
+            self.__digest(key, attrs.get("updated_at"))
+        for field in relations.get(name, ()):
+            self.__ref(key, field, attrs.get(field))
+            group = self.__groups.get((name, field, attrs.get(field)), {})
+            for order, entries in group.items():
+                insort(entries, (self.__sort_key(attrs.get(order)), id))
+        for field, entries in self.__orders.get(name, {}).items():
+            insort(entries, (self.__sort_key(attrs.get(field)), id))
+
+    def __unlink(self, key, attrs):
+        """Removes key from the reverse indexes of the foreign keys in
+        attrs, and from the sorted lists of its class"""
+        name, _, id = key.partition(".")
+        self.__versions[name] = self.__versions.get(name, 0) ^ \
+            self.__digest(key, attrs.get("updated_at"))
+        for field in relations.get(name, ()):
+            self.__unref(key, field, attrs.get(field))
+            group = self.__groups.get((name, field, attrs.get(field)), {})
+            for order, entries in group.items():
+                self.__unsort(entries, attrs.get(order), id)
+        for field, entries in self.__orders.get(name, {}).items():
+            self.__unsort(entries, attrs.get(field), id)
+
+    @staticmethod
+    def __digest(key, updated_at):
+        """Returns the 64-bit hash of key at updated_at that the version of
+        its class is the exclusive or of, the same in every process"""
+        data = "{} {}".format(key, cursors.sort_value(updated_at))
+        return int.from_bytes(hashlib.blake2b(data.encode("utf-8"),
+                                              digest_size=8).digest(), "big")
+
+    @staticmethod
+    def __sort_key(value):
+        """Returns the key value is sorted by, missing values first"""
+        return (value is not None, cursors.sort_value(value))
+
+    @staticmethod
+    def __unsort(entries, value, id):
+        """Removes the entry of id with value from a sorted list"""
+        entry = (FileStorage.__sort_key(value), id)
+        i = bisect_left(entries, entry)
+        if i < len(entries) and entries[i] == entry:
+            del entries[i]
+
+    def __ref(self, key, field, value):
+        """Files key under value in the reverse index of field"""
+        if value:
+            refs = self.__refs.setdefault((key.partition(".")[0], field), {})
+            refs.setdefault(value, {})[key] = None
+
+    def __unref(self, key, field, value):
+        """Removes key from under value in the reverse index of field"""
+        refs = self.__refs.get((key.partition(".")[0], field), {})
+        keys = refs.get(value)
+        if keys is not None:
+            keys.pop(key, None)
+            if not keys:
+                del refs[value]
+
+    def track(self, obj, name, old):
+        """Marks a stored object as changed when its name attribute goes
+        from old to its current value, and keeps the reverse indexes in
+        step"""
+        cls = type(obj).__name__
+        key = "{}.{}".format(cls, obj.__dict__.get("id"))
+        with self.__lock:
+            if self.__objects.get(key) is not obj:
+                return
+            self.__dirty.add(key)
+            if name == "updated_at":
+                self.__versions[cls] = self.__versions.get(cls, 0) ^ \
+                    self.__digest(key, old) ^ \
+                    self.__digest(key, obj.updated_at)
+            self.__notify(cls)
+            if name in relations.get(cls, ()):
+                self.__unref(key, name, old)
+                self.__ref(key, name, getattr(obj, name, None))
+                self.__regroup(obj, name, old)
+            for field in relations.get(cls, ()):
+                group = self.__groups.get(
+                    (cls, field, getattr(obj, field, None)), {})
+                if field != name and name in group:
+                    self.__unsort(group[name], old, obj.id)
+                    insort(group[name], (self.__sort_key(
+                        getattr(obj, name)), obj.id))
+            entries = self.__orders.get(cls, {}).get(name)
+            if entries is not None:
+                self.__unsort(entries, old, obj.id)
+                insort(entries, (self.__sort_key(getattr(obj, name)),
+                                 obj.id))
+
+    def __regroup(self, obj, field, old):
+        """Moves obj from the sorted lists of the objects whose foreign
+        key field is old to those of its current value"""
+        cls = type(obj).__name__
+        for order, entries in self.__groups.get((cls, field, old),
+                                                {}).items():
+            value = old if order == field else getattr(obj, order, None)
+            self.__unsort(entries, value, obj.id)
+        group = self.__groups.get((cls, field, getattr(obj, field, None)),
+                                  {})
+        for order, entries in group.items():
+            insort(entries, (self.__sort_key(getattr(obj, order, None)),
+                             obj.id))
+
+    def iter(self, cls=None, batch_size=1000, where=None, fields=None):
+        """Yields the objects of cls, or of every class, whose attributes
+        have the values in where, building the pending ones batch_size at
+        a time
+
+        fields is accepted for DBStorage compatibility: the objects are
+        in memory whole, and to_dict(fields) leaves the others out."""
+        names = list(classes) if cls is None else [self.__class_name(cls)]
+        for name in filter(None, names):
+            with self.__lock:
+                if where:
+                    keys = [key for key, _ in self.__matching(name, where)]
+                else:
+                    keys = list(chain(self.__classes.get(name, ()),
+                                      self.__pending.get(name, ())))
+            for start in range(0, len(keys), batch_size):
+                with self.__lock:
+                    batch = [self.__fetch(key)
+                             for key in keys[start:start + batch_size]]
+                yield from (obj for obj in batch if obj is not None)
+
+    def page(self, cls, after=None, limit=100, order_by="id", where=None,
+             fields=None):
+        """Returns up to limit objects of cls whose attributes have the
+        values in where, in order_by order after the object the cursor
+        after stands for, and the cursor that follows the last of them,
+        None once there are no more; fields is ignored as in iter()"""
+        name = self.__class_name(cls)
+        if name is None:
+            return [], None
+        start = None
+        if after is not None:
+            value, id = cursors.decode(after, order_by)
+            start = (self.__sort_key(value), id)
+        with self.__lock:
+            if where:
+                entries = self.__grouped(name, where, order_by)
+            else:
+                entries = self.__ordered(name, order_by)
+            i = bisect_right(entries, start) if start is not None else 0
+            chosen = entries[i:i + limit]
+            objs = [self.__fetch(name + "." + id) for _, id in chosen]
+        if not chosen or i + limit >= len(entries):
+            return objs, None
+        (_, value), id = chosen[-1]
+        return objs, cursors.encode(order_by, value, id)
+
+    def __matching(self, name, where):
+        """Yields the (key, attributes) of the objects of class name
+        whose attributes have the values in where, looking them up by
+        foreign key when where holds one"""
+        fields = [field for field in where if field in
+                  relations.get(name, ())]
+        if fields:
+            keys = list(self.__refs.get((name, fields[0]), {})
+                        .get(where[fields[0]], ()))
         else:
-            dict = {}
-            if cls in classes.values():
-                for key, value in self.__objects.items():
-                    if str(cls.__name__) in key:
-                        dict[key] = value
-                return dict
+            keys = list(chain(self.__classes.get(name, ()),
+                              self.__pending.get(name, ())))
+        for key in keys:
+            obj = self.__objects.get(key)
+            attrs = obj.__dict__ if obj is not None else \
+                json.loads(self.__pending[name][key])
+            if all(attrs.get(field) == value
+                   for field, value in where.items()):
+                yield key, attrs
+
+    def __grouped(self, name, where, field):
+        """Returns the sorted list of (value, id) by their field attribute
+        of the objects of class name whose attributes have the values in
+        where, kept up to date when where is a single foreign key and
+        sorted again on each call otherwise"""
+        if len(where) == 1:
+            (key, value), = where.items()
+            if value and key in relations.get(name, ()):
+                orders = self.__groups.setdefault((name, key, value), {})
+                entries = orders.get(field)
+                if entries is None:
+                    entries = orders[field] = self.__sorted(
+                        self.__matching(name, where), field)
+                return entries
+        return self.__sorted(self.__matching(name, where), field)
+
+    def __sorted(self, matching, field):
+        """Returns the sorted list of (value, id) of the (key, attributes)
+        pairs of matching by their field attribute"""
+        return sorted((self.__sort_key(attrs.get(field)),
+                       key.partition(".")[2]) for key, attrs in matching)
+
+    def __ordered(self, name, field):
+        """Returns the sorted list of (value, id) of the objects of class
+        name by their field attribute, building it the first time"""
+        orders = self.__orders.setdefault(name, {})
+        entries = orders.get(field)
+        if entries is None:
+            entries = orders[field] = self.__sorted(
+                self.__matching(name, {}), field)
+        return entries
+
+    def aggregate(self, cls, group_by=(), metrics=None, where=None):
+        """Returns a dictionary per distinct value of the group_by
+        attributes of the objects of cls whose attributes have the values
+        in where, with those values and each metric of metrics, a
+        dictionary mapping a name to a (function, attribute) pair where
+        function is count, sum, avg, min or max. count of None counts
+        objects, and is the metric named count when metrics is not
+        given. A group_by attribute can be read through foreign keys, as
+        "city.state_id" for Place.
+
+        Objects not built yet are read as the records they were loaded
+        from, and where is looked up in the reverse indexes."""
+        name = self.__class_name(cls)
+        if name is None:
+            return []
+        metrics = metrics or {"count": ("count", None)}
+        for function, _ in metrics.values():
+            if function not in aggregates:
+                raise ValueError("Unknown aggregate " + function)
+        groups = {}
+        with self.__lock:
+            for _, attrs in self.__matching(name, where or {}):
+                group = tuple(self.__attribute(name, attrs, path)
+                              for path in group_by)
+                rows = groups.setdefault(group, {n: [] for n in metrics})
+                for metric, (_, field) in metrics.items():
+                    value = 0 if field is None else \
+                        self.__attribute(name, attrs, field)
+                    if value is not None:
+                        rows[metric].append(value)
+        results = []
+        for group in sorted(groups, key=lambda group: tuple(
+                self.__sort_key(value) for value in group)):
+            result = dict(zip(group_by, group))
+            for metric, (function, _) in metrics.items():
+                values = groups[group][metric]
+                result[metric] = aggregates[function](values) \
+                    if values or function == "count" else None
+            results.append(result)
+        return results
+
+    def __attribute(self, name, attrs, path):
+        """Returns the path attribute of the object of class name with
+        attrs, following the foreign keys of a dotted path"""
+        hop, _, rest = path.partition(".")
+        if not rest:
+            value = attrs.get(hop, getattr(classes[name], hop, None))
+            if not isinstance(value, (str, int, float, datetime)):
+                return None
+            return cursors.sort_value(value)
+        owner = hop.capitalize()
+        if owner not in classes:
+            raise ValueError("Unknown attribute " + path)
+        related = self.__record("{}.{}".format(owner,
+                                               attrs.get(hop + "_id")))
+        if related is None:
+            return None
+        return self.__attribute(owner, related, rest)
+
+    def __record(self, key):
+        """Returns the attributes of the object or pending record stored
+        under key, without building it, or None"""
+        obj = self.__objects.get(key)
+        if obj is not None:
+            return obj.__dict__
+        record = self.__pending.get(key.partition(".")[0], {}).get(key)
+        return json.loads(record) if record is not None else None
+
+    def search_places(self, states=(), cities=(), amenities=()):
+        """Returns the places of the cities listed and of the cities of
+        the states listed, or all places when both lists are empty,
+        that have every amenity listed
+
+        The places are found by intersecting the sets of keys the reverse
+        indexes file them under, without reading any other place."""
+        with self.__lock:
+            keys = None
+            if states or cities:
+                city_refs = self.__refs.get(("City", "state_id"), {})
+                ids = set(cities)
+                for state in states:
+                    ids.update(key.partition(".")[2]
+                               for key in city_refs.get(state, ()))
+                place_refs = self.__refs.get(("Place", "city_id"), {})
+                keys = set()
+                for id in ids:
+                    keys.update(place_refs.get(id, ()))
+            for amenity in amenities:
+                record = self.__record("Amenity." + amenity) or {}
+                found = {"Place.{}".format(record["place_id"])} \
+                    if record.get("place_id") else set()
+                keys = found if keys is None else keys & found
+                if not keys:
+                    return []
+            if keys is None:
+                keys = chain(self.__classes.get("Place", ()),
+                             self.__pending.get("Place", ()))
+            places = [self.__fetch(key) for key in keys]
+        return [place for place in places if place is not None]
+
+    def related(self, cls, field, value):
+        """Returns the objects of cls whose field attribute equals value"""
+        name = self.__class_name(cls)
+        with self.__lock:
+            keys = list(self.__refs.get((name, field), {}).get(value, ()))
+            return [self.__fetch(key) for key in keys]
 
     def new(self, obj):
         """Sets in __objects the obj with key <obj class name>.id"""
         key = "{}.{}".format(type(obj).__name__, obj.id)
-        self.__objects[key] = obj
+        with self.__lock:
+            self.__index(key, obj)
+            obj.mark_stored()
+            self.__dirty.add(key)
+            self.__notify(type(obj).__name__)
+
+    def bulk_new(self, objs):
+        """Stores every object of objs and saves them in one write"""
+        with self.__lock:
+            for obj in objs:
+                self.new(obj)
+            self.save()
+
+    def bulk_update(self, cls, rows):
+        """Sets the attributes of each dictionary in rows on the object of
+        cls with its id, and saves them in one write
+
+        updated_at is set to now unless a row gives it, and rows whose
+        object does not exist are skipped."""
+        name = self.__class_name(cls)
+        if name is None:
+            return
+        now = datetime.utcnow()
+        with self.__lock:
+            for row in rows:
+                obj = self.__fetch("{}.{}".format(name, row["id"]))
+                if obj is None:
+                    continue
+                for key, value in row.items():
+                    if key not in ("id", "__class__"):
+                        setattr(obj, key, value)
+                if "updated_at" not in row:
+                    obj.updated_at = now
+            self.save()
 
     def save(self):
-        """Serializes __objects to the JSON file (path: __file_path)"""
-        with open(self.__file_path, mode="w", encoding="utf-8") as f:
-            json.dump({k: v.to_dict() for k, v in self.__objects.items()}, f)
+        """Serializes __objects to the JSON file (path: __file_path),
+        or hands the changes to the flusher unless durability is sync
 
-    def reload(self):
-        """Deserializes the JSON file to __objects
-        (only if the JSON file exists;
-        otherwise, do nothing)."""
+        With group, a save waits for the write of its own changes and
+        raises its error if that write fails. With async, the error of a
+        background write that failed is raised by the next save, once
+        its changes are queued for the flusher to try again."""
+        with self.__lock:
+            if not self.__dirty:
+                return
+            if self.__durability == "sync":
+                self.__write(self.__dirty)
+                self.__dirty.clear()
+                return
+            self.__queued.update(self.__dirty)
+            self.__dirty.clear()
+            FileStorage.__requested += 1
+            generation = self.__requested
+            self.__start_flusher()
+            self.__flushing.notify_all()
+            if self.__durability == "group":
+                self.__flushing.wait_for(
+                    lambda: self.__flushed >= generation or
+                    self.__failed >= generation)
+                if self.__flushed < generation:
+                    raise self.__flush_error
+            elif self.__flush_error is not None:
+                raise self.__flush_error
+
+    def flush(self):
+        """Writes the saved changes still waiting for the flusher"""
+        with self.__lock:
+            self.__write_queued()
+
+    def __start_flusher(self):
+        """Starts the background flusher unless it is running"""
+        if self.__flusher is None:
+            atexit.register(self.flush)
+        if self.__flusher is None or not self.__flusher.is_alive():
+            thread = threading.Thread(target=self.__flush_loop, daemon=True)
+            FileStorage.__flusher = thread
+            thread.start()
+
+    def __flush_loop(self):
+        """Writes the queued changes in the background, after gathering
+        saves for __flush_delay seconds or up to __flush_changes objects
+        in async mode, and as soon as the last write is done otherwise
+
+        A failed write is logged and retried on the next save."""
+        failed = None
+        with self.__flushing:
+            while True:
+                self.__flushing.wait_for(
+                    lambda: self.__queued and self.__requested != failed)
+                if self.__durability == "async":
+                    deadline = time.monotonic() + self.__flush_delay
+                    self.__flushing.wait_for(
+                        lambda: not self.__queued or
+                        len(self.__queued) >= self.__flush_changes or
+                        time.monotonic() >= deadline,
+                        self.__flush_delay)
+                try:
+                    self.__write_queued()
+                    failed = None
+                except Exception:
+                    log.exception("Writing %d changed objects to %s failed",
+                                  len(self.__queued), self.__file_path)
+                    failed = self.__requested
+
+    def __write_queued(self):
+        """Writes the changes queued by save() and wakes up the saves
+        waiting for them
+
+        A failed write is recorded with the last generation of saves it
+        held, so that only those saves see its error."""
+        if not self.__queued:
+            return
+        try:
+            self.__write(self.__queued)
+        except Exception as error:
+            FileStorage.__failed = self.__requested
+            FileStorage.__flush_error = error
+            self.__flushing.notify_all()
+            raise
+        self.__queued.clear()
+        FileStorage.__flushed = self.__requested
+        FileStorage.__flush_error = None
+        self.__flushing.notify_all()
+
+    def __write(self, keys):
+        """Writes the objects stored under keys to the files of the
+        current mode and marks them as saved"""
+        if self.__mode == "journal":
+            self.__append(keys)
+        elif self.__mode == "sharded":
+            self.__save_shards(keys)
+        else:
+            serializer = serializers.formats[self.__format]
+            records = {k: serializer.record(v)
+                       for k, v in self.__objects.items()}
+            for pending in self.__pending.values():
+                records.update((k, json.loads(v)) for k, v in pending.items())
+            self.__replace(serializer, records, self.__file_path)
+            if os.path.exists(self.__journal_path()):
+                os.remove(self.__journal_path())
+            FileStorage.__stamp = self.__stat()
+        for key in keys:
+            obj = self.__objects.get(key)
+            if obj is not None:
+                obj.mark_saved()
+
+    @staticmethod
+    def __replace(serializer, records, path):
+        """Writes records to a temporary file, flushes it to disk and
+        puts it in place of path"""
+        tmp = path + ".tmp"
+        serializer.dump(records, tmp)
+        FileStorage.__sync(tmp)
+        os.replace(tmp, path)
+
+    @staticmethod
+    def __sync(path):
+        """Flushes the content of the file at path to disk"""
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def __append(self, keys):
+        """Appends the objects stored under keys to the journal:
+        new objects in full, saved ones as the attributes that changed,
+        deleted ones as null"""
+        lines = []
+        for key in keys:
+            obj = self.__objects.get(key)
+            if obj is None:
+                lines.append(json.dumps([key, None]) + "\n")
+                continue
+            status, changed = obj.changes()
+            record = obj.to_dict()
+            if status == "new":
+                lines.append(json.dumps([key, record]) + "\n")
+            elif changed:
+                patch = {n: record[n] for n in changed if n in record}
+                lines.append(json.dumps([key, patch, True]) + "\n")
+        if not lines:
+            return
+        fresh = self.__stat() == self.__stamp
+        with open(self.__journal_path(), mode="a+b") as f:
+            self.__trim(f)
+            f.write("".join(lines).encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+            size = f.tell()
+        if fresh:
+            FileStorage.__stamp = self.__stat()
+            FileStorage.__offset = size
+        if size > self.__journal_limit and not self.__compacting():
+            thread = threading.Thread(target=self.compact, daemon=True)
+            FileStorage.__compactor = thread
+            thread.start()
+
+    @staticmethod
+    def __trim(f):
+        """Cuts off the last line of the journal open in f when a crash
+        left it without its newline, so that the next entry starts on a
+        line of its own"""
+        end = f.seek(0, os.SEEK_END)
+        pos = end
+        while pos > 0:
+            size = min(pos, 4096)
+            f.seek(pos - size)
+            chunk = f.read(size)
+            if pos == end and chunk.endswith(b"\n"):
+                return
+            i = chunk.rfind(b"\n")
+            if i >= 0:
+                f.truncate(pos - size + i + 1)
+                return
+            pos -= size
+        f.truncate(0)
+
+    def __save_shards(self, keys):
+        """Rewrites the shard files holding the objects stored under
+        keys, each through a temporary file"""
+        contents = {self.__shard(key): {} for key in keys}
+        if not contents:
+            return
+        fresh = self.__stat() == self.__stamp
+        serializer = serializers.formats[self.__format]
+        for name in {shard.partition(".")[0] for shard in contents}:
+            for key, obj in self.__classes.get(name, {}).items():
+                content = contents.get(self.__shard(key))
+                if content is not None:
+                    content[key] = serializer.record(obj)
+            for key, record in self.__pending.get(name, {}).items():
+                content = contents.get(self.__shard(key))
+                if content is not None:
+                    content[key] = json.loads(record)
+        folder = self.__shard_dir()
+        os.makedirs(folder, exist_ok=True)
+        for shard, content in contents.items():
+            path = os.path.join(folder, shard)
+            if content:
+                self.__replace(serializer, content, path)
+            elif os.path.exists(path):
+                os.remove(path)
+        if fresh:
+            FileStorage.__stamp = self.__stat()
+
+    def __shard_dir(self):
+        """Returns the directory holding the shard files"""
+        return self.__file_path + ".d"
+
+    def __shard(self, key):
+        """Returns the name of the shard file that holds key"""
+        name, _, id = key.partition(".")
+        if self.__shards > 1:
+            bucket = zlib.crc32(id.encode("utf-8")) % self.__shards
+            return "{}.{:d}.json".format(name, bucket)
+        return name + ".json"
+
+    def __load_shards(self, shards, fresh=False):
+        """Reads the given shard files, in parallel when there are
+        several, and puts their records in place of the objects they
+        held; fresh skips that when memory was just emptied"""
+        folder = self.__shard_dir()
+        paths = [os.path.join(folder, shard) for shard in shards]
+        if len(paths) > 1:
+            with ThreadPoolExecutor() as pool:
+                contents = list(pool.map(self.__read, paths))
+        else:
+            contents = [self.__read(path) for path in paths]
+        for shard, records in zip(shards, contents):
+            if not fresh:
+                self.__notify(shard.partition(".")[0])
+                self.__drop(shard)
+            for key, record, text in records:
+                self.__put(key, record, text)
+
+    def __drop(self, shard):
+        """Removes from memory every object that belongs to shard"""
+        name = shard.partition(".")[0]
+        keys = [key for key in chain(self.__classes.get(name, ()),
+                                     self.__pending.get(name, ()))
+                if self.__shard(key) == shard]
+        for key in keys:
+            self.__remove(key)
+
+    def __journal_path(self):
+        """Returns the path of the journal kept next to the snapshot"""
+        return self.__file_path + ".log"
+
+    def __compacting(self):
+        """Tells whether a background compaction is still running"""
+        return self.__compactor is not None and self.__compactor.is_alive()
+
+    def __stat(self):
+        """Returns the generation marker of the snapshot and the journal:
+        inode, size and modification time of each, None if missing
+
+        In sharded mode it maps the name of each shard file to the
+        same triple instead."""
+        if self.__mode == "sharded":
+            try:
+                names = os.listdir(self.__shard_dir())
+            except FileNotFoundError:
+                return {}
+            marker = {}
+            for name in names:
+                if name.endswith(".json"):
+                    st = os.stat(os.path.join(self.__shard_dir(), name))
+                    marker[name] = (st.st_ino, st.st_size, st.st_mtime_ns)
+            return marker
+        marker = []
+        for path in (self.__file_path, self.__journal_path()):
+            try:
+                st = os.stat(path)
+                marker.append((st.st_ino, st.st_size, st.st_mtime_ns))
+            except FileNotFoundError:
+                marker.append(None)
+        return tuple(marker)
+
+    def compact(self):
+        """Folds the journal into a new snapshot and truncates the journal
+
+        The snapshot is rebuilt from the files on disk rather than from
+        __objects, so unsaved changes in memory are never written out.
+        Saves made while the snapshot is being written stay in the
+        journal and are carried over once it has been replaced."""
+        journal = self.__journal_path()
+        with self.__lock:
+            try:
+                offset = os.path.getsize(journal)
+            except FileNotFoundError:
+                return
+        records = dict(self.__stream(self.__file_path))
+        with open(journal, mode="rb") as f:
+            self.__replay(records, f.read(offset))
+        tmp = self.__file_path + ".compact"
+        serializers.formats[self.__format].dump(
+            {k: v for k, v in records.items()
+             if v is not None and not isinstance(v, Patch)}, tmp)
+        self.__sync(tmp)
+        with self.__lock:
+            fresh = self.__stat() == self.__stamp
+            os.replace(tmp, self.__file_path)
+            with open(journal, mode="rb") as f:
+                f.seek(offset)
+                tail = f.read()
+            with open(journal + ".tmp", mode="wb") as f:
+                f.write(tail)
+            os.replace(journal + ".tmp", journal)
+            if fresh:
+                FileStorage.__stamp = self.__stat()
+                FileStorage.__offset = len(tail)
+
+    @staticmethod
+    def __stream(path, raw=False):
+        """Yields the (key, record) pairs of a file one at a time, or the
+        (key, record, text) triples of serializers.load() with raw,
+        nothing if there is no such file"""
         try:
-            with open(self.__file_path, mode="r", encoding="utf-8") as f:
-                self.__objects = {
-                    k: BaseModel(**v) for k, v in json.load(f).items()
-                    }
+            yield from serializers.load(path, raw)
         except FileNotFoundError:
-            pass
+            return
+
+    def __read(self, path):
+        """Returns the list of (key, record, text) triples of a file"""
+        return list(self.__stream(path, True))
+
+    @staticmethod
+    def __replay(records, data):
+        """Copies the journal entries in data into the records dictionary,
+        deleted objects as None, and returns the number of bytes used
+
+        A partial entry is merged into the record it changes, or kept as
+        a Patch when that record is not in the dictionary. A last line
+        without its newline, torn by a crash or still being written, is
+        left for the next read, and a line that cannot be decoded is
+        skipped."""
+        used = 0
+        for line in data.splitlines(keepends=True):
+            if not line.endswith(b"\n"):
+                break
+            used += len(line)
+            try:
+                entry = json.loads(line)
+                key, record = entry[0], entry[1]
+            except (ValueError, TypeError, IndexError, KeyError):
+                continue
+            if len(entry) > 2:
+                base = records.get(key)
+                if base is None and key in records:
+                    record = None
+                elif base is None:
+                    record = Patch(record)
+                else:
+                    record = type(base)(base, **record)
+            records[key] = record
+        return used
+
+    def reload(self):
+        """Replaces __objects with the objects of the files, leaving it
+        empty when there are none
+
+        Changes still waiting for the flusher are written first."""
+        with self.__lock:
+            self.__write_queued()
+            self.__notify(None)
+            if self.__mode == "sharded":
+                self.__reload_shards()
+                return
+            stamp = self.__stat()
+            FileStorage.__stamp = stamp
+            FileStorage.__offset = 0
+            self.__objects.clear()
+            self.__classes.clear()
+            self.__refs.clear()
+            self.__orders.clear()
+            self.__groups.clear()
+            self.__pending.clear()
+            self.__dirty.clear()
+            self.__versions.clear()
+            if stamp == (None, None):
+                return
+            for key, record, text in self.__stream(self.__file_path, True):
+                self.__put(key, record, text)
+            records = {}
+            try:
+                with open(self.__journal_path(), mode="rb") as f:
+                    FileStorage.__offset = self.__replay(records, f.read())
+            except FileNotFoundError:
+                pass
+            self.__apply(records)
+
+    def __reload_shards(self):
+        """Replaces __objects with the content of every shard file"""
+        stamp = self.__stat()
+        FileStorage.__stamp = stamp
+        self.__objects.clear()
+        self.__classes.clear()
+        self.__refs.clear()
+        self.__orders.clear()
+        self.__groups.clear()
+        self.__pending.clear()
+        self.__dirty.clear()
+        self.__versions.clear()
+        self.__load_shards(list(stamp), fresh=True)
+
+    def __catch_up(self, stamp):
+        """Applies the entries appended to the journal since it was last
+        read, reloading everything if it was replaced instead"""
+        journal = stamp[1]
+        if journal is None or self.__stamp[1] is None or \
+                journal[0] != self.__stamp[1][0] or \
+                journal[1] < self.__offset:
+            self.reload()
+            return
+        records = {}
+        with open(self.__journal_path(), mode="rb") as f:
+            f.seek(self.__offset)
+            FileStorage.__offset += self.__replay(records, f.read())
+        FileStorage.__stamp = stamp
+        self.__apply(records)
+
+    def __apply(self, records):
+        """Puts the journal records in place of the objects they replace,
+        merges the patches into the objects they change and drops the
+        objects they delete"""
+        for name in {key.partition(".")[0] for key in records}:
+            self.__notify(name)
+        for key, record in records.items():
+            stored = self.__remove(key)
+            if isinstance(record, Patch):
+                if stored is None:
+                    continue
+                if isinstance(stored, BaseModel):
+                    stored = stored.to_dict()
+                record = dict(stored, **record)
+            if record is not None:
+                self.__put(key, record)
 
     def delete(self, obj=None):
         """Delete object"""
         if obj:
             key = "{}.{}".format(type(obj).__name__, obj.id)
-            if key in self.__objects:
-                del self.__objects[key]
-
-    def get(self, cls, id):
-        """Retrieve one object"""
-        if cls in classes.values() and id:
-            key = str(cls.__name__) + "." + id
-            if key in self.__objects.keys():
-                object = self.__objects[key]
-                return object
-            else:
-                return None
+            with self.__lock:
+                if self.__remove(key) is not None:
+                    self.__dirty.add(key)
+                    obj.mark_deleted()
+                    self.__notify(type(obj).__name__)
+
+    def get(self, cls, id, load=None, fields=None):
+        """Retrieve one object; load is ignored as in all(), and fields
+        as in iter()"""
+        name = self.__class_name(cls)
+        if name is not None and id:
+            return self.__fetch(name + "." + id)
 
     def count(self, cls=None):
         """Count number of objects in storage"""
-        if cls is None:
-            return len(self.__objects)
+        with self.__lock:
+            if cls is None:
+                return len(self.__objects) + sum(
+                    len(pending) for pending in self.__pending.values())
+            name = self.__class_name(cls)
+            if name is not None:
+                return len(self.__classes.get(name, {})) + \
+                    len(self.__pending.get(name, {}))
 
-        else:
-            if cls in classes.values():
-                total_objs = 0
-                keys = self.__objects.keys()
-                for key in keys:
-                    if str(cls.__name__) in key:
-                        total_objs += 1
-                return total_objs
+    def counts(self):
+        """Returns the number of objects of each class by class name"""
+        return {name: self.count(name) for name in classes}
+
+    def listen(self, callback):
+        """Calls callback with the class name of each object stored,
+        changed or deleted from now on, or None when every object may
+        have changed"""
+        self.__listeners.append(callback)
+
+    def __notify(self, name):
+        """Calls the listeners with the class name of changed objects"""
+        for callback in self.__listeners:
+            callback(name)
+
+    def version(self, cls, where=None):
+        """Returns a token that changes whenever an object of cls is
+        stored, saved or deleted; where is accepted for DBStorage
+        compatibility, the token covering every object of cls
+
+        The token is the number of objects of cls and the exclusive or
+        of the hashes of their keys and updated_at, which is the same in
+        every process holding the same objects."""
+        name = self.__class_name(cls)
+        if name is not None:
+            with self.__lock:
+                return "{:d}-{:016x}".format(self.count(name),
+                                             self.__versions.get(name, 0))
 
     def close(self):
-        """Call reload() method for deserializing the JSON file to objects"""
-        self.reload()
+        """Brings __objects back in line with the files, reading them
+        again only if they changed since they were last read or written
+
+        Objects left unsaved in memory are dropped by a full reload.
+        A journal that only grew is read from where the last read
+        stopped, and in sharded mode only the shards that changed on
+        disk or hold unsaved objects are read again. While saved changes
+        wait for the flusher, memory is ahead of the files and is kept
+        unless it also holds unsaved objects."""
+        with self.__lock:
+            if self.__queued:
+                if self.__dirty:
+                    self.reload()
+                return
+            stamp = self.__stat()
+            if self.__mode == "sharded":
+                old = self.__stamp or {}
+                shards = {shard for shard in set(stamp) | set(old)
+                          if stamp.get(shard) != old.get(shard)}
+                shards.update(self.__shard(key) for key in self.__dirty)
+                FileStorage.__stamp = stamp
+                self.__load_shards(sorted(shards))
+                self.__dirty.clear()
+            elif self.__dirty or self.__stamp is None or \
+                    stamp[0] != self.__stamp[0]:
+                self.reload()
+            elif stamp[1] != self.__stamp[1]:
+                self.__catch_up(stamp)
@@ -0,0 +1,268 @@
+#!/usr/bin/python3
+"""
+Contains the formats FileStorage can write its files in: the JSON
+object file.json has always held, and a compact binary snapshot.
+Reading detects the format from the file itself.
+
+Converts a file from one format to the other when run as
+    python3 -m models.engine.serializers json|binary SOURCE DEST
+"""
+
+from datetime import datetime, timedelta
+import io
+import json
+import struct
+import sys
+from models.base_model import time
+
+MAGIC = b"HBNB"
+VERSION = 2
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+header = struct.Struct("<4sB")
+frame = struct.Struct("<I")
+
+
+class RecordReader:
+    """Reads the top-level object of a JSON file one member at a time,
+    holding only about chunk characters of the text in memory
+
+    text is the JSON text of the last value read."""
+
+    decoder = json.JSONDecoder()
+
+    def __init__(self, f, chunk=1 << 20):
+        """Wraps the text file f, read chunk characters at a time"""
+        self.f = f
+        self.chunk = chunk
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.text = None
+
+    def __iter__(self):
+        """Yields the (key, value) members of the object in file order"""
+        if self.peek() is None:
+            return
+        self.expect("{")
+        if self.peek() == "}":
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key, self.value()
+            if self.peek() == "}":
+                return
+            self.expect(",")
+
+    def fill(self):
+        """Appends the next chunk to the unread text, False at the end"""
+        data = self.f.read(self.chunk)
+        if not data:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Skips whitespace and returns the next character, None at the
+        end of the file"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return None
+
+    def expect(self, char):
+        """Consumes char, which must be the next character"""
+        if self.peek() != char:
+            raise ValueError("Expecting '{}' at character {:d}".format(
+                char, self.pos))
+        self.pos += 1
+
+    def value(self):
+        """Decodes the next JSON value, reading on while it is cut off
+        by the end of the buffer"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                if end < len(self.buf) or self.eof:
+                    self.text = self.buf[self.pos:end]
+                    self.pos = end
+                    return value
+            except ValueError:
+                if self.eof:
+                    raise
+            self.fill()
+
+
+class JSONSerializer:
+    """Writes records as one JSON object mapping keys to to_dict()s"""
+
+    def record(self, obj):
+        """Returns the record saved for obj"""
+        return obj.to_dict()
+
+    def dump(self, records, path):
+        """Writes the records dictionary to path"""
+        with open(path, mode="w", encoding="utf-8") as f:
+            json.dump(records, f, default=self.encode)
+
+    @staticmethod
+    def encode(value):
+        """Writes the datetimes a binary file was read with as strings"""
+        if isinstance(value, datetime):
+            return value.strftime(time)
+        raise TypeError("{!r} is not JSON serializable".format(value))
+
+    def load(self, f, raw=False):
+        """Yields the (key, record) pairs of f, opened in binary mode,
+        or with raw the (key, record, JSON text of the record) triples"""
+        reader = RecordReader(io.TextIOWrapper(f, encoding="utf-8"))
+        for key, record in reader:
+            yield (key, record, reader.text) if raw else (key, record)
+
+
+class BinarySerializer:
+    """Writes records in frames of up to block records each
+
+    A file is the 4 bytes MAGIC and a version byte, VERSION, followed by
+    frames. A frame is its length as a little-endian unsigned 32-bit
+    integer and that many bytes of UTF-8 JSON: the array [names, rows],
+    where names are the class names the frame introduces and rows the
+    records. A record is the array [key class, id, created_at,
+    updated_at, other attributes, __class__], the classes being indexes
+    in the names read so far (-1 for no __class__) and the dates integer
+    microseconds since the epoch, so that reading them back needs no
+    string parsing. A date is left among the other attributes as a
+    string when it would not come back as the same text.
+
+    Files of any other version are refused."""
+
+    block = 1024
+    encoder = json.JSONEncoder(separators=(",", ":"),
+                               default=JSONSerializer.encode)
+
+    def record(self, obj):
+        """Returns the record saved for obj, keeping its datetimes"""
+        record = obj.__dict__.copy()
+        record.pop("_sa_instance_state", None)
+        record["__class__"] = type(obj).__name__
+        return record
+
+    def dump(self, records, path):
+        """Writes the records dictionary to path"""
+        index = {}
+        names = []
+        rows = []
+        with open(path, mode="wb") as f:
+            f.write(header.pack(MAGIC, VERSION))
+            for key, record in records.items():
+                name, _, id = key.partition(".")
+                attrs = dict(record)
+                cls = attrs.pop("__class__", None)
+                for value in (name, cls):
+                    if value is not None and value not in index:
+                        index[value] = len(index)
+                        names.append(value)
+                if attrs.get("id") == id:
+                    del attrs["id"]
+                created = self.pack(attrs, "created_at")
+                updated = self.pack(attrs, "updated_at")
+                rows.append((index[name], id, created, updated, attrs,
+                             -1 if cls is None else index[cls]))
+                if len(rows) == self.block:
+                    self.write(f, names, rows)
+                    names, rows = [], []
+            if rows or names:
+                self.write(f, names, rows)
+
+    @staticmethod
+    def pack(attrs, name):
+        """Takes the date name out of attrs as integer microseconds,
+        None when it is missing or would not round-trip"""
+        value = attrs.get(name)
+        if isinstance(value, str):
+            try:
+                parsed = datetime.fromisoformat(value)
+            except ValueError:
+                return None
+            if parsed.tzinfo is not None or parsed.strftime(time) != value:
+                return None
+            value = parsed
+        elif not isinstance(value, datetime) or value.tzinfo is not None:
+            return None
+        del attrs[name]
+        return (value - EPOCH) // MICROSECOND
+
+    def write(self, f, names, rows):
+        """Writes one frame: the class names it introduces and its rows"""
+        data = self.encoder.encode([names, rows]).encode("utf-8")
+        f.write(frame.pack(len(data)))
+        f.write(data)
+
+    def load(self, f, raw=False):
+        """Yields the (key, record) pairs of the binary file f, or with
+        raw (key, record, None) triples as there is no JSON text"""
+        magic, version = header.unpack(f.read(header.size).ljust(
+            header.size, b"\0"))
+        if magic != MAGIC:
+            raise ValueError("Not a binary storage file")
+        if version != VERSION:
+            raise ValueError("Unsupported binary storage version {:d}, "
+                             "expected {:d}".format(version, VERSION))
+        names = []
+        while True:
+            head = f.read(frame.size)
+            if not head:
+                return
+            if len(head) < frame.size:
+                raise ValueError("Truncated binary storage file")
+            size = frame.unpack(head)[0]
+            data = f.read(size)
+            if len(data) < size:
+                raise ValueError("Truncated binary storage file")
+            added, rows = json.loads(data)
+            names.extend(added)
+            for name, id, created, updated, attrs, cls in rows:
+                attrs.setdefault("id", id)
+                if created is not None:
+                    attrs["created_at"] = EPOCH + created * MICROSECOND
+                if updated is not None:
+                    attrs["updated_at"] = EPOCH + updated * MICROSECOND
+                if cls >= 0:
+                    attrs["__class__"] = names[cls]
+                key = names[name] + "." + id
+                yield (key, attrs, None) if raw else (key, attrs)
+
+
+formats = {
+    "binary": BinarySerializer(),
+    "json": JSONSerializer()
+}
+
+
+def load(path, raw=False):
+    """Yields the (key, record) pairs of a file in either format, or
+    with raw the (key, record, JSON text of the record or None) triples"""
+    with open(path, mode="rb") as f:
+        if f.peek(len(MAGIC))[:len(MAGIC)] == MAGIC:
+            yield from formats["binary"].load(f, raw)
+        else:
+            yield from formats["json"].load(f, raw)
+
+
+def convert(source, dest, format):
+    """Writes the records of the file source to dest in format"""
+    formats[format].dump(dict(load(source)), dest)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] not in formats:
+        print("Usage: {} json|binary SOURCE DEST".format(sys.argv[0]))
+        sys.exit(1)
+    convert(sys.argv[2], sys.argv[3], sys.argv[1])
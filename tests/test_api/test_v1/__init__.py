@@ -0,0 +1,59 @@
+#!/usr/bin/python3
+"""
+Contains the APITestCase class the API tests are built on
+"""
+
+import models
+from models import storage
+from models.engine import file_storage
+import os
+import tempfile
+import unittest
+
+
+class APITestCase(unittest.TestCase):
+    """Base class for tests that call the API through the Flask test
+    client, against a scratch file in file storage mode"""
+
+    @classmethod
+    def setUpClass(cls):
+        """Register the views on the app once"""
+        from api.v1.app import app
+        from api.v1.views import app_views
+        if "app_views" not in app.blueprints:
+            app.register_blueprint(app_views)
+        cls.app = app
+
+    def setUp(self):
+        """Point the storage at a scratch file and empty the caches"""
+        from api.v1.views import response_cache
+        self.client = self.app.test_client()
+        self.tmp = tempfile.TemporaryDirectory()
+        if models.storage_t != "db":
+            FileStorage = file_storage.FileStorage
+            self.path = FileStorage._FileStorage__file_path
+            FileStorage._FileStorage__file_path = os.path.join(
+                self.tmp.name, "file.json")
+            storage.reload()
+        response_cache.invalidate()
+        self.created = []
+
+    def tearDown(self):
+        """Delete the objects the test stored, the last first, and
+        restore the storage"""
+        for obj in reversed(self.created):
+            obj = storage.get(type(obj), obj.id)
+            if obj is not None:
+                storage.delete(obj)
+        storage.save()
+        storage.close()
+        if models.storage_t != "db":
+            file_storage.FileStorage._FileStorage__file_path = self.path
+            storage.reload()
+        self.tmp.cleanup()
+
+    def store(self, obj):
+        """Saves obj, to be deleted once the test is over"""
+        obj.save()
+        self.created.append(obj)
+        return obj
@@ -0,0 +1,186 @@
+#!/usr/bin/python3
+"""
+Contains the tests of api/v1/cache.py
+"""
+
+from api.v1 import cache
+from api.v1.cache import ResponseCache
+from flask import Response
+import inspect
+from models.state import State
+import pep8
+from tests.test_api.test_v1 import APITestCase
+import unittest
+from unittest import mock
+
+
+class TestResponseCacheDocs(unittest.TestCase):
+    """Tests to check the documentation and style of ResponseCache"""
+
+    def test_pep8_conformance(self):
+        """Test that cache.py and its tests conform to PEP8."""
+        pep8s = pep8.StyleGuide(quiet=True)
+        result = pep8s.check_files(['api/v1/cache.py',
+                                    'tests/test_api/test_v1/test_cache.py'])
+        self.assertEqual(result.total_errors, 0,
+                         "Found code style errors (and warnings).")
+
+    def test_docstrings(self):
+        """Test that the module and every method have a docstring"""
+        self.assertTrue(cache.__doc__)
+        self.assertTrue(ResponseCache.__doc__)
+        for name, func in inspect.getmembers(ResponseCache,
+                                             inspect.isfunction):
+            with self.subTest(name=name):
+                self.assertTrue(func.__doc__)
+
+
+class TestResponseCache(unittest.TestCase):
+    """Test the eviction, expiry and invalidation of ResponseCache"""
+
+    def keep(self, cache, key, name="State", body=b"[]"):
+        """Puts body in cache for key as a response listing name"""
+        cache.put(key, name, cache.generation(name), (200, [], body))
+
+    def test_get_returns_what_put_kept(self):
+        """Test that a kept response is returned for its key only"""
+        responses = ResponseCache()
+        self.keep(responses, "/a", body=b"[1]")
+        self.assertEqual(responses.get("/a"), (200, [], b"[1]"))
+        self.assertIsNone(responses.get("/b"))
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entry goes past size"""
+        responses = ResponseCache(size=2)
+        self.keep(responses, "/a")
+        self.keep(responses, "/b")
+        responses.get("/a")
+        self.keep(responses, "/c")
+        self.assertIsNone(responses.get("/b"))
+        self.assertIsNotNone(responses.get("/a"))
+        self.assertIsNotNone(responses.get("/c"))
+        self.assertEqual(responses.stats()["evictions"], 1)
+        self.assertEqual(responses.stats()["entries"], 2)
+
+    def test_ttl_expiry(self):
+        """Test that an entry is dropped once its ttl has passed"""
+        with mock.patch.object(cache, "time") as clock:
+            clock.monotonic.return_value = 100.0
+            responses = ResponseCache(ttl=10)
+            self.keep(responses, "/a")
+            clock.monotonic.return_value = 109.9
+            self.assertIsNotNone(responses.get("/a"))
+            clock.monotonic.return_value = 110.0
+            self.assertIsNone(responses.get("/a"))
+        self.assertEqual(responses.stats()["entries"], 0)
+
+    def test_invalidate_drops_class_entries(self):
+        """Test that invalidate drops the entries of its class only, or
+        every entry without one"""
+        responses = ResponseCache()
+        self.keep(responses, "/states", "State")
+        self.keep(responses, "/users", "User")
+        responses.invalidate("State")
+        self.assertIsNone(responses.get("/states"))
+        self.assertIsNotNone(responses.get("/users"))
+        responses.invalidate()
+        self.assertIsNone(responses.get("/users"))
+
+    def test_invalidate_while_building(self):
+        """Test that a response built while its class was invalidated is
+        not kept, and one of another class is"""
+        responses = ResponseCache()
+        states = responses.tee("/states", "State",
+                               Response([b"[", b"1", b"]"]))
+        users = responses.tee("/users", "User", Response([b"[]"]))
+        responses.invalidate("State")
+        self.assertEqual(b"".join(states.response), b"[1]")
+        self.assertEqual(b"".join(users.response), b"[]")
+        self.assertIsNone(responses.get("/states"))
+        self.assertEqual(responses.get("/users")[2], b"[]")
+        stale = responses.tee("/states", "State", Response([b"[]"]))
+        responses.invalidate()
+        b"".join(stale.response)
+        self.assertIsNone(responses.get("/states"))
+
+    def test_tee_keeps_small_bodies_only(self):
+        """Test that a body larger than max_bytes is sent but not kept"""
+        responses = ResponseCache(max_bytes=4)
+        big = responses.tee("/big", "State", Response([b"[1,", b"2]"]))
+        self.assertEqual(b"".join(big.response), b"[1,2]")
+        self.assertIsNone(responses.get("/big"))
+        small = responses.tee("/small", "State", Response([b"[1]"]))
+        b"".join(small.response)
+        self.assertEqual(responses.get("/small")[2], b"[1]")
+
+    def test_counters(self):
+        """Test that hits, misses and invalidations are counted"""
+        responses = ResponseCache()
+        responses.get("/a")
+        self.keep(responses, "/a")
+        responses.get("/a")
+        responses.get("/a")
+        responses.invalidate("State")
+        stats = responses.stats()
+        self.assertEqual((stats["hits"], stats["misses"],
+                          stats["invalidations"]), (2, 1, 1))
+
+    def test_compressed_bodies_go_with_entry(self):
+        """Test that the compressed bodies are kept with their entry and
+        dropped along with it"""
+        responses = ResponseCache()
+        self.assertIsNone(responses.compressed("/a"))
+        self.keep(responses, "/a")
+        responses.compressed("/a")["gzip"] = b"zipped"
+        self.assertEqual(responses.compressed("/a"), {"gzip": b"zipped"})
+        responses.invalidate("State")
+        self.assertIsNone(responses.compressed("/a"))
+        self.keep(responses, "/a")
+        self.assertEqual(responses.compressed("/a"), {})
+
+    def test_size_zero_keeps_nothing(self):
+        """Test that a cache of size 0 is turned off"""
+        responses = ResponseCache(size=0)
+        self.keep(responses, "/a")
+        self.assertIsNone(responses.get("/a"))
+
+
+class TestCachedViews(APITestCase):
+    """Test that the cached list views follow the changes to their
+    objects"""
+
+    def get_names(self):
+        """Returns the names listed by GET /api/v1/states"""
+        response = self.client.get("/api/v1/states")
+        self.assertEqual(response.status_code, 200)
+        return sorted(state["name"] for state in response.get_json())
+
+    def cache_stats(self):
+        """Returns the counters of GET /api/v1/stats/cache"""
+        return self.client.get("/api/v1/stats/cache").get_json()
+
+    def test_list_is_served_from_cache(self):
+        """Test that a second request is a hit counted on /stats/cache"""
+        self.store(State(name="California"))
+        before = self.cache_stats()
+        self.assertEqual(self.get_names(), ["California"])
+        self.assertEqual(self.get_names(), ["California"])
+        after = self.cache_stats()
+        self.assertEqual(after["misses"], before["misses"] + 1)
+        self.assertEqual(after["hits"], before["hits"] + 1)
+
+    def test_put_and_delete_invalidate_list(self):
+        """Test that PUT and DELETE drop the cached list"""
+        state = self.store(State(name="California"))
+        self.store(State(name="Arizona"))
+        self.assertEqual(self.get_names(), ["Arizona", "California"])
+        url = "/api/v1/states/" + state.id
+        response = self.client.put(url, json={"name": "Nevada"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_names(), ["Arizona", "Nevada"])
+        self.assertEqual(self.client.delete(url).status_code, 200)
+        self.assertEqual(self.get_names(), ["Arizona"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,279 @@
+#!/usr/bin/python3
+"""
+Contains the tests of api/v1/compression.py
+"""
+
+from api.v1 import compression
+from api.v1.compression import Compressor
+from flask import Response
+import gzip
+import inspect
+from models.state import State
+import pep8
+from tests.test_api.test_v1 import APITestCase
+import unittest
+from unittest import mock
+from werkzeug.http import parse_accept_header
+import zlib
+
+
+class TestCompressorDocs(unittest.TestCase):
+    """Tests to check the documentation and style of Compressor"""
+
+    def test_pep8_conformance(self):
+        """Test that compression.py and its tests conform to PEP8."""
+        pep8s = pep8.StyleGuide(quiet=True)
+        result = pep8s.check_files([
+            'api/v1/compression.py',
+            'tests/test_api/test_v1/test_compression.py'])
+        self.assertEqual(result.total_errors, 0,
+                         "Found code style errors (and warnings).")
+
+    def test_docstrings(self):
+        """Test that the module and every method have a docstring"""
+        self.assertTrue(compression.__doc__)
+        self.assertTrue(Compressor.__doc__)
+        for name, func in inspect.getmembers(Compressor,
+                                             inspect.isfunction):
+            with self.subTest(name=name):
+                self.assertTrue(func.__doc__)
+
+
+class TestCompressor(unittest.TestCase):
+    """Test the encoding negotiation, thresholds and ETags of
+    Compressor"""
+
+    body = b'[{"name": "California"}, {"name": "Arizona"}]' * 10
+
+    def compress(self, compressor, response, accept="gzip, deflate"):
+        """Returns response compressed for the Accept-Encoding accept"""
+        return compressor.compress(response, parse_accept_header(accept))
+
+    def assertPlain(self, response, body=None):
+        """Checks that response was sent as it is"""
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertEqual(response.get_data(), body or self.body)
+
+    def test_gzip(self):
+        """Test that a body is gzipped for a client that accepts it"""
+        response = self.compress(Compressor(min_size=0),
+                                 Response(self.body), "gzip")
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.get_data()), self.body)
+        self.assertEqual(response.content_length,
+                         len(response.get_data()))
+        self.assertIn("Accept-Encoding", response.vary)
+
+    def test_negotiation(self):
+        """Test that the encoding the client prefers is chosen, and that
+        q=0 refuses an encoding"""
+        decoders = {"gzip": gzip.decompress, "deflate": zlib.decompress}
+        for accept, encoding in (("gzip, deflate", "gzip"),
+                                 ("gzip;q=0.5, deflate", "deflate"),
+                                 ("gzip;q=0, deflate", "deflate"),
+                                 ("deflate;q=0, *", "gzip"),
+                                 ("gzip;q=0, deflate;q=0", None),
+                                 ("identity", None),
+                                 ("", None)):
+            with self.subTest(accept=accept):
+                response = self.compress(Compressor(min_size=0),
+                                         Response(self.body), accept)
+                self.assertIn("Accept-Encoding", response.vary)
+                if encoding is None:
+                    self.assertPlain(response)
+                    continue
+                self.assertEqual(response.headers["Content-Encoding"],
+                                 encoding)
+                self.assertEqual(decoders[encoding](response.get_data()),
+                                 self.body)
+
+    def test_min_size(self):
+        """Test that a body shorter than min_size is sent as it is"""
+        size = len(self.body)
+        response = self.compress(Compressor(min_size=size + 1),
+                                 Response(self.body))
+        self.assertPlain(response)
+        self.assertIn("Accept-Encoding", response.vary)
+        response = self.compress(Compressor(min_size=size),
+                                 Response(self.body))
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+
+    def test_level_zero(self):
+        """Test that level 0 turns compression off"""
+        response = self.compress(Compressor(level=0, min_size=0),
+                                 Response(self.body))
+        self.assertPlain(response)
+        self.assertNotIn("Accept-Encoding", response.vary)
+
+    def test_not_ok_or_encoded(self):
+        """Test that responses other than 200, and bodies already
+        encoded, are sent as they are"""
+        response = self.compress(Compressor(min_size=0),
+                                 Response(self.body, status=404))
+        self.assertPlain(response)
+        response = Response(self.body, headers={"Content-Encoding": "br"})
+        response = self.compress(Compressor(min_size=0), response)
+        self.assertEqual(response.headers["Content-Encoding"], "br")
+        self.assertEqual(response.get_data(), self.body)
+
+    def test_direct_passthrough(self):
+        """Test that a direct_passthrough body, as send_file makes, is
+        neither read nor compressed"""
+        chunks = iter([self.body])
+        response = Response(chunks, direct_passthrough=True)
+        response = self.compress(Compressor(min_size=0), response)
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertIs(response.response, chunks)
+        self.assertEqual(next(chunks), self.body)
+
+    def test_stream(self):
+        """Test that a streamed body is compressed as it is read once
+        min_size bytes have come"""
+        def generate():
+            """Yields the body a few bytes at a time"""
+            for i in range(0, len(self.body), 7):
+                yield self.body[i:i + 7]
+        response = self.compress(Compressor(min_size=100),
+                                 Response(generate()))
+        self.assertTrue(response.is_streamed)
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertIsNone(response.content_length)
+        self.assertEqual(gzip.decompress(b"".join(response.response)),
+                         self.body)
+
+    def test_short_stream(self):
+        """Test that a stream that ends before min_size is sent as it
+        is"""
+        response = Response(iter([b"[", b"]"]))
+        response = self.compress(Compressor(min_size=100), response)
+        self.assertPlain(response, b"[]")
+        self.assertIn("Accept-Encoding", response.vary)
+
+    def test_etag_suffix(self):
+        """Test that a compressed body has the ETag of the plain one
+        suffixed with its encoding, weak if that was"""
+        for weak in (False, True):
+            with self.subTest(weak=weak):
+                response = Response(self.body)
+                response.set_etag("abc", weak)
+                response = self.compress(Compressor(min_size=0), response,
+                                         "deflate")
+                self.assertEqual(response.get_etag(),
+                                 ("abc-deflate", weak))
+        response = Response(self.body)
+        response.set_etag("abc")
+        response = self.compress(Compressor(min_size=100), response)
+        self.assertEqual(response.get_etag(), ("abc-gzip", False))
+        response = Response(self.body)
+        response.set_etag("abc")
+        response = self.compress(Compressor(min_size=0), response,
+                                 "identity")
+        self.assertEqual(response.get_etag(), ("abc", False))
+
+    def test_compressed_bodies_are_reused(self):
+        """Test that a response carrying the compressed bodies its cache
+        entry keeps is compressed once per encoding"""
+        compressed = {}
+        first = Response(self.body)
+        first.compressed = compressed
+        first = self.compress(Compressor(min_size=0), first, "gzip")
+        self.assertEqual(compressed, {"gzip": first.get_data()})
+        second = Response(b"other")
+        second.compressed = compressed
+        second = self.compress(Compressor(min_size=0), second, "gzip")
+        self.assertEqual(gzip.decompress(second.get_data()), self.body)
+        third = Response(b"other")
+        third.compressed = compressed
+        third = self.compress(Compressor(min_size=0), third, "deflate")
+        self.assertEqual(zlib.decompress(third.get_data()), b"other")
+        self.assertEqual(set(compressed), {"gzip", "deflate"})
+
+
+class TestCompressedViews(APITestCase):
+    """Test the compression of the API responses with their validators
+    and the response cache"""
+
+    def setUp(self):
+        """Store states enough for a compressed list"""
+        from api.v1.app import compressor
+        super().setUp()
+        patch = mock.patch.object(compressor, "min_size", 100)
+        patch.start()
+        self.addCleanup(patch.stop)
+        for i in range(5):
+            self.store(State(name="State {:d}".format(i)))
+
+    def get(self, url, **headers):
+        """Returns the response and the decoded JSON body of GET url"""
+        response = self.client.get(url, headers=headers)
+        data = response.get_data()
+        if response.headers.get("Content-Encoding") == "gzip":
+            data = gzip.decompress(data)
+        return response, data
+
+    def test_list_is_compressed(self):
+        """Test that a list is gzipped with a suffixed ETag and a Vary
+        header for a client that accepts it"""
+        plain, body = self.get("/api/v1/states")
+        self.assertNotIn("Content-Encoding", plain.headers)
+        self.assertIn("Accept-Encoding", plain.vary)
+        response, data = self.get("/api/v1/states",
+                                  **{"Accept-Encoding": "gzip"})
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response.vary)
+        self.assertEqual(data, body)
+        etag, weak = plain.get_etag()
+        self.assertEqual(response.get_etag(), (etag + "-gzip", weak))
+
+    def test_not_modified(self):
+        """Test that the suffixed ETag gets an empty 304, which is not
+        compressed"""
+        for url in ("/api/v1/states", "/api/v1/states/" +
+                    self.created[0].id + "?fields=name,id,created_at"):
+            with self.subTest(url=url):
+                first = self.client.get(
+                    url, headers={"Accept-Encoding": "gzip"})
+                first.get_data()
+                etag = first.headers["ETag"]
+                again = self.client.get(url, headers={
+                    "Accept-Encoding": "gzip", "If-None-Match": etag})
+                self.assertEqual(again.status_code, 304)
+                self.assertEqual(again.data, b"")
+                self.assertNotIn("Content-Encoding", again.headers)
+                self.assertEqual(again.headers["ETag"], etag)
+
+    def test_cached_list_is_compressed(self):
+        """Test that the response cache keeps the plain body, which is
+        compressed for each client that accepts it"""
+        from api.v1.views import response_cache
+        first, body = self.get("/api/v1/states",
+                               **{"Accept-Encoding": "gzip"})
+        self.assertEqual(first.headers["Content-Encoding"], "gzip")
+        hits = response_cache.stats()["hits"]
+        again, data = self.get("/api/v1/states",
+                               **{"Accept-Encoding": "gzip"})
+        self.assertEqual(response_cache.stats()["hits"], hits + 1)
+        self.assertEqual(again.headers["Content-Encoding"], "gzip")
+        self.assertEqual(data, body)
+        plain, data = self.get("/api/v1/states")
+        self.assertEqual(response_cache.stats()["hits"], hits + 2)
+        self.assertNotIn("Content-Encoding", plain.headers)
+        self.assertEqual(data, body)
+
+    def test_repeated_list_is_compressed_once(self):
+        """Test that a list served again from the response cache is not
+        compressed again"""
+        first, body = self.get("/api/v1/states",
+                               **{"Accept-Encoding": "gzip"})
+        with mock.patch.object(compression.zlib, "compressobj",
+                               wraps=zlib.compressobj) as compressobj:
+            for _ in range(3):
+                response, data = self.get("/api/v1/states",
+                                          **{"Accept-Encoding": "gzip"})
+                self.assertEqual(response.headers["Content-Encoding"],
+                                 "gzip")
+                self.assertEqual(data, body)
+        self.assertEqual(compressobj.call_count, 1)
+
+if __name__ == "__main__":
+    unittest.main()
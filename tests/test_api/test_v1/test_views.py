@@ -0,0 +1,293 @@
+#!/usr/bin/python3
+"""
+Contains the tests of the shared helpers of api/v1/views
+"""
+
+from datetime import datetime, timedelta
+import pep8
+from models.city import City
+from models.place import Place
+from models.state import State
+from models.user import User
+from tests.test_api.test_v1 import APITestCase
+import unittest
+from unittest import mock
+from werkzeug.http import http_date
+
+
+class TestViewsDocs(unittest.TestCase):
+    """Tests to check the style of the views package"""
+
+    def test_pep8_conformance_test_views(self):
+        """Test that tests/test_api/test_v1/test_views.py conforms to
+        PEP8."""
+        pep8s = pep8.StyleGuide(quiet=True)
+        result = pep8s.check_files(['tests/test_api/test_v1/test_views.py',
+                                    'tests/test_api/test_v1/__init__.py'])
+        self.assertEqual(result.total_errors, 0,
+                         "Found code style errors (and warnings).")
+
+
+class TestConditionalRequests(APITestCase):
+    """Test the ETag and Last-Modified validators of the GET views"""
+
+    def setUp(self):
+        """Store a state to request"""
+        super().setUp()
+        self.state = self.store(State(name="California"))
+        self.url = "/api/v1/states/" + self.state.id
+
+    def rename(self, name):
+        """Renames the state through the API"""
+        response = self.client.put(self.url, json={"name": name})
+        self.assertEqual(response.status_code, 200)
+
+    def test_object_etag_matches(self):
+        """Test that the ETag of an object gets a 304 until it changes"""
+        first = self.client.get(self.url)
+        etag = first.headers["ETag"]
+        self.assertFalse(etag.startswith("W/"))
+        again = self.client.get(self.url, headers={"If-None-Match": etag})
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again.data, b"")
+        self.assertEqual(again.headers["ETag"], etag)
+
+    def test_object_etag_mismatch(self):
+        """Test that another ETag gets the object"""
+        response = self.client.get(self.url,
+                                   headers={"If-None-Match": '"other"'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["name"], "California")
+
+    def test_object_etag_stale_after_put(self):
+        """Test that an update, even within the same second, changes the
+        ETag of the object"""
+        etag = self.client.get(self.url).headers["ETag"]
+        self.rename("Nevada")
+        response = self.client.get(self.url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["name"], "Nevada")
+        self.assertNotEqual(response.headers["ETag"], etag)
+
+    def test_object_etag_depends_on_fields(self):
+        """Test that each ?fields= selection has its own ETag"""
+        full = self.client.get(self.url).headers["ETag"]
+        names = self.client.get(self.url + "?fields=name").headers["ETag"]
+        self.assertNotEqual(full, names)
+
+    def test_if_modified_since(self):
+        """Test that If-Modified-Since gets a 304 only when the object
+        was not changed since, to the second"""
+        later = http_date(datetime.utcnow() + timedelta(hours=1))
+        response = self.client.get(self.url,
+                                   headers={"If-Modified-Since": later})
+        self.assertEqual(response.status_code, 304)
+        earlier = http_date(self.state.updated_at - timedelta(seconds=1))
+        response = self.client.get(self.url,
+                                   headers={"If-Modified-Since": earlier})
+        self.assertEqual(response.status_code, 200)
+
+    def test_last_modified_echoed_back(self):
+        """Test that a client echoing Last-Modified gets a 304"""
+        last_modified = self.client.get(self.url).headers["Last-Modified"]
+        response = self.client.get(
+            self.url, headers={"If-Modified-Since": last_modified})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b"")
+
+    def test_etag_without_serializing(self):
+        """Test that a 304 for an object is answered without turning it
+        into a dictionary"""
+        etag = self.client.get(self.url).headers["ETag"]
+        with mock.patch.object(State, "to_dict") as to_dict:
+            response = self.client.get(self.url,
+                                       headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        to_dict.assert_not_called()
+
+    def test_list_etag(self):
+        """Test that a list has a weak ETag that gets a 304 until one of
+        its objects changes"""
+        first = self.client.get("/api/v1/states")
+        self.assertEqual(len(first.get_json()), 1)
+        etag = first.headers["ETag"]
+        self.assertTrue(etag.startswith("W/"))
+        again = self.client.get("/api/v1/states",
+                                headers={"If-None-Match": etag})
+        self.assertEqual(again.status_code, 304)
+        other = self.client.get("/api/v1/states",
+                                headers={"If-None-Match": 'W/"other"'})
+        self.assertEqual(other.status_code, 200)
+        self.assertEqual(other.get_json(), first.get_json())
+        self.rename("Nevada")
+        stale = self.client.get("/api/v1/states",
+                                headers={"If-None-Match": etag})
+        self.assertEqual(stale.status_code, 200)
+        self.assertIn("Nevada", [state["name"] for state in
+                                 stale.get_json()])
+        self.assertNotEqual(stale.headers["ETag"], etag)
+
+
+class PlacesTestCase(APITestCase):
+    """Base class for the tests of the place views, storing two states
+    with a city each, two users and three places between them"""
+
+    def setUp(self):
+        """Store the states, cities, users and places"""
+        super().setUp()
+        self.states = [self.store(State(name=name))
+                       for name in ("California", "Nevada")]
+        self.cities = [self.store(City(name="City", state_id=state.id))
+                       for state in self.states]
+        self.users = [self.store(User(email="{}@hbnb.io".format(name),
+                                      password="pwd"))
+                      for name in ("betty", "bob")]
+        self.places = [
+            self.store(Place(name="Loft", city_id=self.cities[0].id,
+                             user_id=self.users[0].id, price_by_night=100,
+                             max_guest=2, number_rooms=1)),
+            self.store(Place(name="House", city_id=self.cities[0].id,
+                             user_id=self.users[1].id, price_by_night=300,
+                             max_guest=6, number_rooms=3)),
+            self.store(Place(name="Cabin", city_id=self.cities[1].id,
+                             user_id=self.users[0].id, price_by_night=50,
+                             max_guest=4, number_rooms=2))]
+
+    def names(self, response):
+        """Returns the sorted names of the places listed in response"""
+        self.assertEqual(response.status_code, 200)
+        return sorted(place["name"] for place in response.get_json())
+
+
+class TestPlacesSearch(PlacesTestCase):
+    """Test POST /api/v1/places_search"""
+
+    def search(self, body):
+        """Returns the response of a search for body"""
+        return self.client.post("/api/v1/places_search", json=body)
+
+    def test_not_a_json(self):
+        """Test that a body that is not a JSON object is refused"""
+        for kwargs in ({"data": "states"},
+                       {"data": "{", "content_type": "application/json"},
+                       {"json": ["states"]}):
+            with self.subTest(kwargs=kwargs):
+                response = self.client.post("/api/v1/places_search",
+                                            **kwargs)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(b"Not a JSON", response.data)
+
+    def test_invalid_lists(self):
+        """Test that lists of anything but ids are refused"""
+        for field, value in (("states", "California"),
+                             ("cities", [1]),
+                             ("amenities", {"id": "x"})):
+            with self.subTest(field=field):
+                response = self.search({field: value})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("Invalid {}".format(field).encode(),
+                              response.data)
+
+    def test_no_lists_returns_all(self):
+        """Test that a body without ids lists every place"""
+        for body in ({}, {"states": [], "cities": [], "amenities": []}):
+            with self.subTest(body=body):
+                self.assertEqual(self.names(self.search(body)),
+                                 ["Cabin", "House", "Loft"])
+
+    def test_states_and_cities(self):
+        """Test that the places of the states and cities listed are
+        returned once each"""
+        self.assertEqual(
+            self.names(self.search({"states": [self.states[0].id]})),
+            ["House", "Loft"])
+        self.assertEqual(
+            self.names(self.search({"cities": [self.cities[1].id]})),
+            ["Cabin"])
+        self.assertEqual(self.names(self.search({
+            "states": [self.states[0].id],
+            "cities": [self.cities[0].id, self.cities[1].id]})),
+            ["Cabin", "House", "Loft"])
+        self.assertEqual(self.names(self.search({"states": ["missing"]})),
+                         [])
+
+    def test_fields(self):
+        """Test that ?fields= selects the attributes of the places"""
+        response = self.client.post("/api/v1/places_search?fields=name,id",
+                                    json={"cities": [self.cities[1].id]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), [
+            {"id": self.places[2].id, "name": "Cabin"}])
+
+
+class TestPlacesStats(PlacesTestCase):
+    """Test GET /api/v1/places/stats"""
+
+    def stats(self, query=""):
+        """Returns the groups of GET /api/v1/places/stats?query, sorted by
+        their number of places"""
+        response = self.client.get("/api/v1/places/stats" + query)
+        self.assertEqual(response.status_code, 200)
+        return sorted(response.get_json(), key=lambda group:
+                      (group["places"], sorted(group.items())))
+
+    def test_by_city_is_the_default(self):
+        """Test that the places are counted and priced per city"""
+        self.assertEqual(self.stats(), self.stats("?by=city"))
+        self.assertEqual(self.stats(), [
+            {"city_id": self.cities[1].id, "places": 1, "avg_price": 50,
+             "min_price": 50, "max_price": 50, "guests": 4, "rooms": 2},
+            {"city_id": self.cities[0].id, "places": 2, "avg_price": 200,
+             "min_price": 100, "max_price": 300, "guests": 8,
+             "rooms": 4}])
+
+    def test_by_state_renames_field(self):
+        """Test that city.state_id comes out as state_id"""
+        groups = self.stats("?by=state")
+        self.assertEqual([(group["state_id"], group["places"])
+                          for group in groups],
+                         [(self.states[1].id, 1), (self.states[0].id, 2)])
+        self.assertNotIn("city.state_id", groups[0])
+
+    def test_by_several(self):
+        """Test grouping by user and state at once"""
+        groups = self.stats("?by=user,state")
+        self.assertEqual({(group["user_id"], group["state_id"],
+                           group["places"]) for group in groups},
+                         {(self.users[0].id, self.states[0].id, 1),
+                          (self.users[1].id, self.states[0].id, 1),
+                          (self.users[0].id, self.states[1].id, 1)})
+
+    def test_filters(self):
+        """Test that ?city_id= and ?user_id= keep only their places"""
+        groups = self.stats("?by=user&city_id=" + self.cities[0].id)
+        self.assertEqual({group["user_id"] for group in groups},
+                         {self.users[0].id, self.users[1].id})
+        groups = self.stats("?by=city&user_id=" + self.users[0].id)
+        self.assertEqual({(group["city_id"], group["places"])
+                          for group in groups},
+                         {(self.cities[0].id, 1), (self.cities[1].id, 1)})
+        groups = self.stats("?by=city&city_id={}&user_id={}".format(
+            self.cities[0].id, self.users[1].id))
+        self.assertEqual([group["max_price"] for group in groups], [300])
+        self.assertEqual(self.stats("?user_id=missing"), [])
+
+    def test_invalid_by(self):
+        """Test that ?by= other than city, state and user is refused"""
+        for by in ("country", "city,name", ""):
+            with self.subTest(by=by):
+                response = self.client.get("/api/v1/places/stats?by=" + by)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(b"Invalid by", response.data)
+
+    def test_route_before_place_id(self):
+        """Test that /places/stats is not read as the place of id stats,
+        while the places keep their own route"""
+        response = self.client.get("/api/v1/places/stats")
+        self.assertIsInstance(response.get_json(), list)
+        response = self.client.get("/api/v1/places/" + self.places[0].id)
+        self.assertEqual(response.get_json()["name"], "Loft")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -138,12 +138,38 @@ class TestBaseModel(unittest.TestCase):
         self.assertEqual(new_d["created_at"], bm.created_at.strftime(t_format))
         self.assertEqual(new_d["updated_at"], bm.updated_at.strftime(t_format))
 
+    def test_to_dict_fields(self):
+        """test that to_dict(fields) keeps only the attributes named"""
+        bm = BaseModel()
+        bm.name = "Holberton"
+        self.assertEqual(bm.to_dict(["name", "updated_at", "missing"]),
+                         {"name": "Holberton",
+                          "updated_at": bm.to_dict()["updated_at"]})
+        self.assertEqual(bm.to_dict(["__class__"]),
+                         {"__class__": "BaseModel"})
+
     def test_str(self):
         """test that the str method has the correct output"""
         inst = BaseModel()
         string = "[BaseModel] ({}) {}".format(inst.id, inst.__dict__)
         self.assertEqual(string, str(inst))
 
+    @unittest.skipIf(models.storage_t == 'db', "not testing file storage")
+    @mock.patch('models.storage')
+    def test_changes(self, mock_storage):
+        """Test that changes reports the status and changed attributes
+        without adding them to __dict__"""
+        inst = BaseModel()
+        self.assertEqual(inst.changes()[0], "new")
+        inst.mark_saved()
+        self.assertEqual(inst.changes(), (None, set()))
+        inst.name = "Holberton"
+        inst.name = "Holberton"
+        self.assertEqual(inst.changes(), ("modified", {"name"}))
+        self.assertNotIn("_BaseModel__changed", inst.__dict__)
+        inst.mark_deleted()
+        self.assertEqual(inst.changes()[0], "deleted")
+
     @mock.patch('models.storage')
     def test_save(self, mock_storage):
         """Test that save method updates `updated_at` and calls
@@ -5,10 +5,11 @@ Contains the TestDBStorageDocs and TestDBStorage classes
 
 from datetime import datetime
 import inspect
+import models
 from models import storage
 from models.engine import db_storage
 from models.amenity import Amenity
-from models.base_model import BaseModel
+from models.base_model import Base, BaseModel
 from models.city import City
 from models.place import Place
 from models.review import Review
@@ -17,6 +18,12 @@ from models.user import User
 import json
 import os
 import pep8
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+import tempfile
+import threading
+import time
 import unittest
 DBStorage = db_storage.DBStorage
 classes = {"Amenity": Amenity, "City": City, "Place": Place,
@@ -83,6 +90,7 @@ class TestDBStorage(unittest.TestCase):
     def test_get_count(self):
         """Test if get and count methods are correctly implemented"""
         storage = DBStorage()
+        storage.reload()
         obj = State(name="California")
         storage.new(obj)
         storage.save()
@@ -90,5 +98,548 @@ class TestDBStorage(unittest.TestCase):
         self.assertEqual(storage.count(State), 1)
 
 
+@unittest.skipIf(models.storage_t != 'db', "not testing db storage")
+class TestDBStorageCount(unittest.TestCase):
+    """Test the SQL counting of DBStorage"""
+
+    def test_count_accepts_class_names(self):
+        """Test that count takes a class or its name"""
+        before = storage.count(State)
+        obj = State(name="Nevada")
+        storage.new(obj)
+        storage.save()
+        self.assertEqual(storage.count(State), before + 1)
+        self.assertEqual(storage.count("State"), before + 1)
+        self.assertIsNone(storage.count("Nope"))
+        storage.delete(obj)
+        storage.save()
+
+    def test_counts_matches_count(self):
+        """Test that counts gives the count of every class"""
+        counts = storage.counts()
+        self.assertEqual(set(counts), set(classes))
+        for name, cls in classes.items():
+            self.assertEqual(counts[name], storage.count(cls))
+        self.assertEqual(sum(counts.values()), storage.count())
+
+    def test_iter_streams_objects(self):
+        """Test that iter yields the same objects as all"""
+        obj = State(name="Oregon")
+        storage.new(obj)
+        storage.save()
+        ids = {state.id for state in storage.iter("State", batch_size=1)}
+        self.assertEqual(ids, {state.id for state in
+                               storage.all(State).values()})
+        self.assertIn(obj.id, ids)
+        storage.delete(obj)
+        storage.save()
+
+
+@unittest.skipIf(models.storage_t != 'db', "not testing db storage")
+class TestDBStoragePool(unittest.TestCase):
+    """Test the connection pool statistics of DBStorage"""
+
+    def test_pool_stats_follow_checkouts(self):
+        """Test that a query checks out and returns a connection"""
+        storage.close()
+        before = storage.pool_stats()
+        storage.count(State)
+        during = storage.pool_stats()
+        storage.close()
+        after = storage.pool_stats()
+        self.assertEqual(during["checkouts"], before["checkouts"] + 1)
+        self.assertEqual(during["checked_out"], before["checked_out"] + 1)
+        self.assertEqual(after["checked_out"], before["checked_out"])
+        self.assertEqual(after["waiting"], 0)
+        self.assertGreaterEqual(after["created"], 1)
+        self.assertGreaterEqual(after["checkout_ms_max"],
+                                after["checkout_ms_avg"])
+
+    def test_pool_stats_count_waiters(self):
+        """Test that a checkout waiting for a free connection is counted
+        and timed"""
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_engine(
+                "sqlite:///" + os.path.join(tmp, "pool.db"),
+                poolclass=db_storage.MeteredQueuePool, pool_size=1,
+                max_overflow=0)
+            stats = db_storage.PoolStats()
+            engine.pool.stats = stats
+            stats.listen(engine)
+            held = engine.connect()
+            waiter = threading.Thread(target=lambda: engine.connect().close())
+            waiter.start()
+            deadline = time.monotonic() + 5
+            while stats.waiting == 0 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(stats.waiting, 1)
+            time.sleep(0.05)
+            held.close()
+            waiter.join()
+            engine.dispose()
+        self.assertEqual((stats.waiting, stats.checkouts, stats.created),
+                         (0, 2, 1))
+        self.assertGreaterEqual(stats.wait_max, 0.05)
+
+
+@unittest.skipIf(models.storage_t != 'db', "not testing db storage")
+class TestDBStorageLoad(unittest.TestCase):
+    """Test the relationship loading options of DBStorage"""
+
+    def setUp(self):
+        """Store a state with cities, one of them with places"""
+        self.user = User(email="a@b.c", password="pwd")
+        self.state = State(name="Texas")
+        self.cities = [City(name=str(i), state_id=self.state.id)
+                       for i in range(3)]
+        self.places = [Place(name=str(i), city_id=self.cities[0].id,
+                             user_id=self.user.id) for i in range(3)]
+        for obj in [self.user, self.state] + self.cities + self.places:
+            storage.new(obj)
+        storage.save()
+        storage.close()
+
+    def tearDown(self):
+        """Remove the stored objects"""
+        storage.close()
+        for obj in self.places + self.cities + [self.state, self.user]:
+            storage.delete(storage.get(type(obj), obj.id))
+            storage.save()
+        storage.close()
+
+    def count_queries(self, action):
+        """Returns the number of statements run by action"""
+        statements = []
+        engine = storage._DBStorage__engine
+
+        def count(*args):
+            """Counts one statement"""
+            statements.append(args[2])
+        event.listen(engine, "before_cursor_execute", count)
+        try:
+            action()
+        finally:
+            event.remove(engine, "before_cursor_execute", count)
+        return len(statements)
+
+    def test_all_selectin_loads_children_in_one_query(self):
+        """Test that the cities of every state take one more query"""
+        def action():
+            for state in storage.all(State, load={"cities": "selectin"}
+                                     ).values():
+                [city.name for city in state.cities]
+        self.assertEqual(self.count_queries(action), 2)
+
+    def test_get_loads_nested_relationships(self):
+        """Test that a dotted path loads grandchildren up front"""
+        def action():
+            state = storage.get(State, self.state.id,
+                                load={"cities.places": "selectin"})
+            names = [place.name for city in state.cities
+                     for place in city.places]
+            self.assertEqual(len(names), 3)
+        self.assertEqual(self.count_queries(action), 3)
+
+    def test_get_joined_loads_in_the_same_query(self):
+        """Test that a joined load needs no second query"""
+        def action():
+            city = storage.get(City, self.cities[0].id,
+                               load={"places": "joined"})
+            self.assertEqual(len(city.places), 3)
+        self.assertEqual(self.count_queries(action), 1)
+
+
+@unittest.skipIf(models.storage_t != 'db', "not testing db storage")
+class TestDBStorageBulk(unittest.TestCase):
+    """Test the bulk insert and update of DBStorage"""
+
+    def test_bulk_new_and_update(self):
+        """Test that bulk_new inserts and bulk_update sets by id"""
+        before = storage.count(State)
+        states = [State(name="bulk {:d}".format(i)) for i in range(5)]
+        storage.bulk_new(iter(states), batch_size=2)
+        self.assertEqual(storage.count(State), before + 5)
+        updated_at = states[0].updated_at
+        storage.bulk_update(State, [{"id": state.id, "name": "renamed"}
+                                    for state in states[:3]], batch_size=2)
+        self.assertEqual(states[0].name, "renamed")
+        storage.close()
+        names = [storage.get(State, state.id).name for state in states]
+        self.assertEqual(names, ["renamed"] * 3 + ["bulk 3", "bulk 4"])
+        self.assertGreater(storage.get(State, states[0].id).updated_at,
+                           updated_at)
+        for state in states:
+            storage.delete(storage.get(State, state.id))
+        storage.save()
+
+    def test_bulk_new_objects_save_again(self):
+        """Test that objects stored by bulk_new are saved again with an
+        update, as on FileStorage"""
+        states = [State(name="bulk {:d}".format(i)) for i in range(3)]
+        storage.bulk_new(states, batch_size=2)
+        states[0].name = "renamed"
+        states[0].save()
+        storage.close()
+        self.assertEqual(storage.get(State, states[0].id).name, "renamed")
+        for state in states:
+            storage.delete(storage.get(State, state.id))
+        storage.save()
+
+    def test_bulk_new_error_stores_nothing(self):
+        """Test that a failed bulk_new leaves its objects unstored, to be
+        saved on their own"""
+        first = State(name="first")
+        twin = State(name="twin")
+        twin.id = first.id
+        with self.assertRaises(IntegrityError):
+            storage.bulk_new([first, twin])
+        self.assertIsNone(storage.get(State, first.id))
+        first.save()
+        storage.close()
+        self.assertEqual(storage.get(State, first.id).name, "first")
+        storage.delete(storage.get(State, first.id))
+        storage.save()
+
+    def test_bulk_update_skips_missing_rows(self):
+        """Test that rows without an object are skipped and the others
+        updated, as on FileStorage, leaving nothing for the next save"""
+        state = State(name="kept")
+        storage.bulk_new([state])
+        storage.bulk_update(State, [{"id": state.id, "name": "CHANGED"},
+                                    {"id": "missing", "name": "lost"}])
+        self.assertIsNone(storage.get(State, "missing"))
+        storage.close()
+        self.assertEqual(storage.get(State, state.id).name, "CHANGED")
+        storage.delete(storage.get(State, state.id))
+        storage.save()
+
+    def test_bulk_update_error_rolls_back(self):
+        """Test that a failed bulk_update updates no row, even once the
+        session is saved again"""
+        state = State(name="kept")
+        storage.bulk_new([state])
+        id = state.id
+        with self.assertRaises(IntegrityError):
+            storage.bulk_update(State, [{"id": id, "name": "CHANGED"},
+                                        {"id": id, "name": None}])
+        other = State(name="other")
+        other.save()
+        storage.close()
+        self.assertEqual(storage.get(State, id).name, "kept")
+        storage.delete(storage.get(State, id))
+        storage.delete(storage.get(State, other.id))
+        storage.save()
+
+
+@unittest.skipIf(models.storage_t != 'db', "not testing db storage")
+class TestDBStoragePage(unittest.TestCase):
+    """Test the keyset pagination of DBStorage"""
+
+    def test_page_follows_cursor(self):
+        """Test that the pages cover the states once, in order"""
+        states = [State(name="page {:d}".format(i % 3)) for i in range(5)]
+        storage.bulk_new(states)
+        ids = {state.id for state in states}
+        for order_by in ("id", "name"):
+            seen = []
+            after = None
+            while True:
+                objs, after = storage.page(State, after=after, limit=2,
+                                           order_by=order_by)
+                self.assertLessEqual(len(objs), 2)
+                seen += [(getattr(obj, order_by), obj.id) for obj in objs]
+                if after is None:
+                    break
+            self.assertEqual(seen, sorted(seen))
+            self.assertEqual({id for _, id in seen} & ids, ids)
+        with self.assertRaises(ValueError):
+            storage.page(State, after="garbage")
+        for state in states:
+            storage.delete(storage.get(State, state.id))
+        storage.save()
+
+    def test_page_nullable_column(self):
+        """Test that rows with a NULL sort value are paged first"""
+        users = [User(email="{:d}@page.io".format(i), password="pwd",
+                      first_name=None if i % 2 else "name {:d}".format(i),
+                      last_name="page-null") for i in range(7)]
+        storage.bulk_new(users)
+        expected = sorted(((user.first_name is not None,
+                            user.first_name or ""), user.id)
+                          for user in users)
+        seen = []
+        after = None
+        while True:
+            objs, after = storage.page(User, after=after, limit=2,
+                                       order_by="first_name",
+                                       where={"last_name": "page-null"})
+            seen += [((obj.first_name is not None, obj.first_name or ""),
+                      obj.id) for obj in objs]
+            if after is None:
+                break
+        self.assertEqual(seen, expected)
+        for user in users:
+            storage.delete(storage.get(User, user.id))
+        storage.save()
+
+
+@unittest.skipIf(models.storage_t != 'db', "not testing db storage")
+class TestDBStorageAggregate(unittest.TestCase):
+    """Test the group-by aggregates of DBStorage"""
+
+    def test_aggregate_through_foreign_key(self):
+        """Test grouping places by the state of their city in SQL"""
+        state = State(name="aggregated")
+        city = City(name="aggregated", state_id=state.id)
+        user = User(email="aggregate@hbnb.io", password="pwd")
+        places = [Place(name="place", city_id=city.id, user_id=user.id,
+                        price_by_night=price, max_guest=2)
+                  for price in (10, 25)]
+        storage.bulk_new([state, user, city] + places)
+        stats = storage.aggregate(
+            Place, ["city.state_id"], where={"city_id": city.id},
+            metrics={"places": ("count", None),
+                     "avg_price": ("avg", "price_by_night"),
+                     "guests": ("sum", "max_guest")})
+        self.assertEqual(stats, [{"city.state_id": state.id, "places": 2,
+                                  "avg_price": 17.5, "guests": 4}])
+        with self.assertRaises(ValueError):
+            storage.aggregate(Place, ["reviews"])
+        version = storage.version(Place, where={"city_id": city.id})
+        self.assertEqual(storage.version(Place, {"city_id": city.id}),
+                         version)
+        place = places.pop()
+        storage.delete(storage.get(Place, place.id))
+        storage.save()
+        self.assertNotEqual(storage.version(Place, {"city_id": city.id}),
+                            version)
+        for obj in places + [city, user, state]:
+            storage.delete(storage.get(type(obj), obj.id))
+        storage.save()
+
+
+@unittest.skipIf(models.storage_t != 'db', "not testing db storage")
+class TestDBStorageSearch(unittest.TestCase):
+    """Test the place search of DBStorage"""
+
+    def test_search_places(self):
+        """Test searching by state, city and amenity"""
+        state = State(name="searched")
+        cities = [City(name="searched", state_id=state.id)
+                  for _ in range(2)]
+        user = User(email="search@hbnb.io", password="pwd")
+        places = [Place(name="place", city_id=city.id, user_id=user.id)
+                  for city in cities]
+        wifi = Amenity(name="wifi")
+        places[0].amenities.append(wifi)
+        for obj in [state, user, wifi] + cities + places:
+            storage.new(obj)
+        storage.save()
+        found = storage.search_places(states=[state.id])
+        self.assertEqual({p.id for p in found}, {p.id for p in places})
+        found = storage.search_places(cities=[cities[1].id, "missing"])
+        self.assertEqual([p.id for p in found], [places[1].id])
+        found = storage.search_places(states=[state.id],
+                                      amenities=[wifi.id])
+        self.assertEqual([p.id for p in found], [places[0].id])
+        for obj in places + cities + [wifi, user, state]:
+            storage.delete(obj)
+        storage.save()
+
+
+@unittest.skipIf(models.storage_t != 'db', "not testing db storage")
+class TestDBStorageListen(unittest.TestCase):
+    """Test the change listeners of DBStorage on a SQLite file"""
+
+    def test_listen_reports_committed_classes(self):
+        """Test that listeners hear the classes each commit changed"""
+        with tempfile.TemporaryDirectory() as tmp:
+            storage = DBStorage(url="sqlite:///" + os.path.join(tmp, "l.db"),
+                                replicas=[])
+            storage.reload()
+            heard = []
+            storage.listen(heard.append)
+            state = State(name="listened")
+            storage.new(state)
+            storage.new(City(name="listened", state_id=state.id))
+            self.assertEqual(heard, [])
+            storage.save()
+            self.assertEqual(heard, ["City", "State"])
+            storage.bulk_update(State, [{"id": state.id, "name": "new"}])
+            storage.delete(state)
+            storage.close()
+            self.assertEqual(heard, ["City", "State", "State"])
+            storage._DBStorage__engine.dispose()
+
+
+@unittest.skipIf(models.storage_t != 'db', "not testing db storage")
+class TestDBStorageFields(unittest.TestCase):
+    """Test the column projection of DBStorage"""
+
+    def test_fields_load_only_named_columns(self):
+        """Test that iter, page and get select only the fields asked"""
+        state = State(name="projected")
+        storage.bulk_new([state])
+        storage.close()
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            """Keeps the column list of each SELECT"""
+            statements.append(statement.partition("FROM")[0])
+        engine = storage._DBStorage__engine
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            found = list(storage.iter(State, where={"name": "projected"},
+                                      fields=["name"]))
+            storage.close()
+            storage.page(State, limit=1, order_by="created_at",
+                         fields=["name"])
+            storage.close()
+            got = storage.get(State, state.id, fields=["name"])
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+        self.assertEqual([s.id for s in found], [state.id])
+        self.assertEqual(got.to_dict(["name"]), {"name": "projected"})
+        self.assertEqual(len(statements), 3)
+        for statement, columns in zip(statements, (
+                {"id", "name"}, {"id", "name", "created_at"},
+                {"id", "name", "updated_at"})):
+            self.assertEqual({column.strip().split(".")[1].split(" ")[0]
+                              for column in statement[len("SELECT "):]
+                              .split(",")}, columns)
+        storage.delete(got)
+        storage.save()
+
+
+@unittest.skipIf(models.storage_t != 'db', "not testing db storage")
+class TestDBStorageReplicas(unittest.TestCase):
+    """Test the read replica routing of DBStorage on SQLite files"""
+
+    def setUp(self):
+        """Create a primary and two replicas, each with its own state"""
+        self.tmp = tempfile.TemporaryDirectory()
+        urls = ["sqlite:///" + os.path.join(self.tmp.name, name + ".db")
+                for name in ("primary", "replica1", "replica2")]
+        self.storage = DBStorage(url=urls[0], replicas=urls[1:])
+        self.storage.reload()
+        for url in urls[1:]:
+            engine = create_engine(url)
+            Base.metadata.create_all(engine)
+            with Session(engine) as session:
+                session.add(State(name="replica"))
+                session.commit()
+            engine.dispose()
+
+    def tearDown(self):
+        """Remove the databases"""
+        self.storage.close()
+        self.tmp.cleanup()
+
+    def names(self):
+        """Returns the names of the states read by the storage"""
+        return {state.name for state in self.storage.all(State).values()}
+
+    def test_reads_go_to_replicas(self):
+        """Test that all, get and count read from a replica"""
+        before = self.storage.pool_stats()["checkouts"]
+        self.assertEqual(self.names(), {"replica"})
+        self.assertEqual(self.storage.count(State), 1)
+        self.assertEqual(self.storage.pool_stats()["checkouts"], before)
+        self.assertEqual(len(self.storage.pool_stats()["replicas"]), 2)
+
+    def test_reads_stick_to_primary_after_write(self):
+        """Test that a write sends the later reads to the primary until
+        the session is closed"""
+        self.storage.new(State(name="primary"))
+        self.storage.save()
+        self.assertEqual(self.names(), {"primary"})
+        self.storage.close()
+        self.assertEqual(self.names(), {"replica"})
+
+
+@unittest.skipIf(models.storage_t != 'db', "not testing db storage")
+class TestDBStorageSQLite(unittest.TestCase):
+    """Test the SQLite set up of DBStorage"""
+
+    def test_pragmas_are_applied(self):
+        """Test that SQLite connections get the configured pragmas"""
+        with tempfile.TemporaryDirectory() as tmp:
+            url = "sqlite:///" + os.path.join(tmp, "hbnb.db")
+            storage = DBStorage(url=url, replicas=[])
+            engine = storage._DBStorage__engine
+            with engine.connect() as connection:
+                def pragma(name):
+                    """Returns the value of a pragma"""
+                    return connection.exec_driver_sql(
+                        "PRAGMA " + name).scalar()
+                self.assertEqual(pragma("journal_mode"), "wal")
+                self.assertEqual(pragma("synchronous"), 1)
+                self.assertEqual(pragma("busy_timeout"), 5000)
+                self.assertEqual(pragma("foreign_keys"), 1)
+            engine.dispose()
+
+
+@unittest.skipIf(models.storage_t != 'db', "not testing db storage")
+class TestDBStorageIndexes(unittest.TestCase):
+    """Test the indexes of the models on a SQLite file"""
+
+    def setUp(self):
+        """Create a database with a state, city, place and review"""
+        self.tmp = tempfile.TemporaryDirectory()
+        url = "sqlite:///" + os.path.join(self.tmp.name, "hbnb.db")
+        self.storage = DBStorage(url=url, replicas=[])
+        self.storage.reload()
+        self.engine = self.storage._DBStorage__engine
+        user = User(email="a@b.c", password="pwd")
+        self.state = State(name="Ohio")
+        self.city = City(name="Akron", state_id=self.state.id)
+        self.place = Place(name="Loft", city_id=self.city.id,
+                           user_id=user.id)
+        review = Review(text="Nice", place_id=self.place.id,
+                        user_id=user.id)
+        self.storage.bulk_new([user, self.state, self.city, self.place,
+                               review])
+
+    def tearDown(self):
+        """Remove the database"""
+        self.storage.close()
+        self.engine.dispose()
+        self.tmp.cleanup()
+
+    def test_migrate_creates_missing_indexes(self):
+        """Test that migrate adds the indexes an old database lacks"""
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql("DROP INDEX ix_cities_state_id")
+            connection.exec_driver_sql("DROP INDEX ix_places_price_by_night")
+        self.assertEqual(self.storage.migrate(),
+                         ["ix_cities_state_id", "ix_places_price_by_night"])
+        self.assertEqual(self.storage.migrate(), [])
+
+    def test_child_collections_use_indexes(self):
+        """Test that loading the children of a state, city and place
+        searches an index instead of scanning a table"""
+        statements = []
+
+        def record(conn, cursor, statement, parameters, *args):
+            """Keeps each statement run with its parameters"""
+            statements.append((statement, parameters))
+        event.listen(self.engine, "before_cursor_execute", record)
+        try:
+            self.storage.get(State, self.state.id, load={"cities": "selectin"})
+            self.storage.get(City, self.city.id, load={"places": "selectin"})
+            self.storage.get(Place, self.place.id,
+                             load={"reviews": "selectin"})
+        finally:
+            event.remove(self.engine, "before_cursor_execute", record)
+        self.assertEqual(len(statements), 6)
+        with self.engine.connect() as connection:
+            for statement, parameters in statements:
+                plan = connection.exec_driver_sql(
+                    "EXPLAIN QUERY PLAN " + statement, parameters).all()
+                for row in plan:
+                    self.assertTrue(row[-1].startswith("SEARCH"), row[-1])
+                    self.assertIn("INDEX", row[-1])
+
+
 if __name__ == "__main__":
     unittest.main()
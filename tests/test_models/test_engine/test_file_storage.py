@@ -6,9 +6,14 @@ Contains TestFileStorageDocs classes for docs and style checks.
 from datetime import datetime
 import inspect
 import json
+import models
 import os
 import pep8
+import tempfile
+import threading
+import time
 import unittest
+from unittest import mock
 
 from models.amenity import Amenity
 from models.base_model import BaseModel
@@ -17,7 +22,7 @@ from models.place import Place
 from models.review import Review
 from models.state import State
 from models.user import User
-from models.engine import file_storage
+from models.engine import file_storage, serializers
 
 FileStorage = file_storage.FileStorage
 classes = {"Amenity": Amenity, "BaseModel": BaseModel, "City": City,
@@ -80,6 +85,7 @@ class TestFileStorage(unittest.TestCase):
         super().__init__(methodName)
         self.storage = FileStorage()
         self.storage._FileStorage__objects = {}
+        self.storage._FileStorage__pending = {}
         self.storage.save()
 
     @unittest.skipIf(models.storage_t == 'db', "not testing file storage")
@@ -90,6 +96,7 @@ class TestFileStorage(unittest.TestCase):
         self.assertIs(new_dict, self.storage._FileStorage__objects)
         self.assertEqual({}, self.storage.all())
 
+    @unittest.skipIf(models.storage_t == 'db', "not testing file storage")
     def test_get_existing_object(self):
         """Test get method with FileStorage and an existing object"""
         # Create an instance of FileStorage
@@ -107,5 +114,966 @@ class TestFileStorage(unittest.TestCase):
         self.assertIs(retrieved_obj, obj)
 
 
+class ScratchFileStorageCase(unittest.TestCase):
+    """Base class for tests that run FileStorage against a scratch file"""
+    mode = "snapshot"
+
+    def setUp(self):
+        """Point the storage at an empty scratch file"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "file.json")
+        self.saved = (FileStorage._FileStorage__file_path,
+                      FileStorage._FileStorage__mode,
+                      dict(FileStorage._FileStorage__objects),
+                      FileStorage._FileStorage__shards,
+                      FileStorage._FileStorage__durability,
+                      FileStorage._FileStorage__flush_delay,
+                      FileStorage._FileStorage__flush_changes)
+        FileStorage._FileStorage__file_path = self.path
+        FileStorage._FileStorage__mode = self.mode
+        self.storage = FileStorage()
+        self.clear()
+        self.storage.reload()
+
+    def tearDown(self):
+        """Restore the storage configuration and objects"""
+        FileStorage._FileStorage__file_path = self.saved[0]
+        FileStorage._FileStorage__mode = self.saved[1]
+        FileStorage._FileStorage__shards = self.saved[3]
+        FileStorage._FileStorage__durability = self.saved[4]
+        FileStorage._FileStorage__flush_delay = self.saved[5]
+        FileStorage._FileStorage__flush_changes = self.saved[6]
+        self.clear()
+        for obj in self.saved[2].values():
+            self.storage.new(obj)
+        FileStorage._FileStorage__dirty.clear()
+        self.tmp.cleanup()
+
+    def clear(self):
+        """Empty the in-memory state of the storage"""
+        FileStorage._FileStorage__objects.clear()
+        FileStorage._FileStorage__classes.clear()
+        FileStorage._FileStorage__refs.clear()
+        FileStorage._FileStorage__orders.clear()
+        FileStorage._FileStorage__groups.clear()
+        FileStorage._FileStorage__pending.clear()
+        FileStorage._FileStorage__dirty.clear()
+        FileStorage._FileStorage__queued.clear()
+
+
+@unittest.skipIf(models.storage_t == 'db', "not testing file storage")
+class TestFileStorageIndex(ScratchFileStorageCase):
+    """Test the per-class buckets behind all, get and count"""
+
+    def test_all_cls_only_returns_that_class(self):
+        """Test that all(cls) returns the objects of cls only"""
+        state = State()
+        city = City()
+        self.storage.new(state)
+        self.storage.new(city)
+        self.assertEqual(self.storage.all(State),
+                         {"State." + state.id: state})
+        self.assertEqual(self.storage.all("City"), {"City." + city.id: city})
+        self.assertEqual(len(self.storage.all()), 2)
+
+    def test_class_name_inside_id_does_not_match(self):
+        """Test that a class name inside another key is not counted"""
+        place = Place()
+        place.id = "User-" + place.id
+        self.storage.new(place)
+        self.assertEqual(self.storage.count(User), 0)
+        self.assertEqual(self.storage.all(User), {})
+        self.assertEqual(self.storage.count(Place), 1)
+
+    def test_iter_yields_objects_in_batches(self):
+        """Test that iter yields every object of a class, pending or not"""
+        states = [State() for _ in range(5)]
+        for state in states:
+            self.storage.new(state)
+        self.storage.new(City())
+        self.storage.save()
+        self.clear()
+        self.storage.reload()
+        ids = [obj.id for obj in self.storage.iter(State, batch_size=2)]
+        self.assertEqual(sorted(ids), sorted(state.id for state in states))
+        self.assertEqual(len(list(self.storage.iter())), 6)
+        self.assertEqual(list(self.storage.iter("Nope")), [])
+
+    def test_iter_where(self):
+        """Test that iter only yields the objects matching where"""
+        state = State()
+        cities = [City(state_id=state.id), City(state_id=state.id)]
+        self.storage.bulk_new([state, City(state_id="other")] + cities)
+        found = self.storage.iter(City, where={"state_id": state.id},
+                                  fields=["name"])
+        self.assertEqual({city.id for city in found},
+                         {city.id for city in cities})
+
+    def test_counts_by_class_name(self):
+        """Test that counts gives the count of every class"""
+        self.storage.new(State())
+        self.storage.new(City())
+        self.storage.new(City())
+        counts = self.storage.counts()
+        self.assertEqual(counts["State"], 1)
+        self.assertEqual(counts["City"], 2)
+        self.assertEqual(counts["User"], 0)
+        self.assertEqual(sum(counts.values()), self.storage.count())
+
+    def test_count_and_get_follow_delete(self):
+        """Test that count and get reflect deletions"""
+        state = State()
+        self.storage.new(state)
+        self.assertEqual(self.storage.count("State"), 1)
+        self.assertIs(self.storage.get(State, state.id), state)
+        self.storage.delete(state)
+        self.assertEqual(self.storage.count(State), 0)
+        self.assertIsNone(self.storage.get(State, state.id))
+
+    def test_reload_rebuilds_buckets(self):
+        """Test that reloading the file fills the class buckets"""
+        state = State()
+        self.storage.new(state)
+        self.storage.new(User())
+        self.storage.save()
+        self.clear()
+        self.storage.reload()
+        self.assertEqual(list(self.storage.all(State)), ["State." + state.id])
+        self.assertEqual(self.storage.count(User), 1)
+        self.assertEqual(self.storage.count(), 2)
+
+
+@unittest.skipIf(models.storage_t == 'db', "not testing file storage")
+class TestFileStorageHydration(ScratchFileStorageCase):
+    """Test that reload builds objects of the stored class on demand"""
+
+    def setUp(self):
+        """Save a State and a City, then reload them"""
+        super().setUp()
+        self.state = State(name="California")
+        self.city = City(state_id=self.state.id)
+        self.storage.new(self.state)
+        self.storage.new(self.city)
+        self.storage.save()
+        self.clear()
+
+    def tearDown(self):
+        """Restore lazy hydration"""
+        FileStorage._FileStorage__lazy = True
+        super().tearDown()
+
+    def test_reload_keeps_records(self):
+        """Test that reload builds no object until one is accessed"""
+        self.storage.reload()
+        self.assertEqual(self.storage.count(), 2)
+        self.assertEqual(self.storage.count(State), 1)
+        self.assertEqual(len(FileStorage._FileStorage__objects), 0)
+
+    def test_records_are_held_as_text(self):
+        """Test that pending records are kept as JSON bytes and are still
+        found by their attributes"""
+        self.storage.reload()
+        pending = FileStorage._FileStorage__pending
+        record = pending["City"]["City." + self.city.id]
+        self.assertIsInstance(record, bytes)
+        self.assertEqual(json.loads(record)["state_id"], self.state.id)
+        self.assertEqual(self.storage.aggregate(City, ["state.name"]),
+                         [{"state.name": "California", "count": 1}])
+        found = list(self.storage.iter(City, where={"id": self.city.id}))
+        self.assertEqual([city.id for city in found], [self.city.id])
+
+    def test_get_builds_typed_object(self):
+        """Test that get returns an instance of the stored class"""
+        self.storage.reload()
+        state = self.storage.get(State, self.state.id)
+        self.assertIs(type(state), State)
+        self.assertEqual(state.name, "California")
+        self.assertEqual(state.created_at, self.state.created_at)
+        self.assertIs(self.storage.get(State, self.state.id), state)
+        self.assertEqual(len(FileStorage._FileStorage__objects), 1)
+
+    def test_related_builds_children(self):
+        """Test that relationship getters work on reloaded records"""
+        self.storage.reload()
+        cities = self.storage.get(State, self.state.id).cities
+        self.assertEqual([type(city) for city in cities], [City])
+        self.assertEqual(cities[0].id, self.city.id)
+
+    def test_save_keeps_unbuilt_records(self):
+        """Test that saving writes records that were never accessed"""
+        self.storage.reload()
+        self.storage.save()
+        self.clear()
+        self.storage.reload()
+        self.assertEqual(self.storage.count(), 2)
+
+    def test_eager_builds_everything(self):
+        """Test that eager hydration builds every object on reload"""
+        FileStorage._FileStorage__lazy = False
+        self.storage.reload()
+        self.assertEqual(len(FileStorage._FileStorage__objects), 2)
+        for obj in self.storage.all().values():
+            self.assertIn(type(obj), (State, City))
+
+
+@unittest.skipIf(models.storage_t == 'db', "not testing file storage")
+class TestFileStorageFormat(ScratchFileStorageCase):
+    """Test saving and reloading in the binary format"""
+
+    def tearDown(self):
+        """Restore the JSON format"""
+        FileStorage._FileStorage__format = "json"
+        super().tearDown()
+
+    def test_binary_save_and_reload(self):
+        """Test that a binary snapshot reloads to equal objects"""
+        FileStorage._FileStorage__format = "binary"
+        state = State(name="Texas")
+        self.storage.new(state)
+        self.storage.save()
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(len(serializers.MAGIC)),
+                             serializers.MAGIC)
+        self.clear()
+        self.storage.reload()
+        loaded = self.storage.get(State, state.id)
+        self.assertEqual(loaded.to_dict(), state.to_dict())
+
+    def test_switching_format_reads_old_file(self):
+        """Test that a binary file is read back after going to JSON"""
+        FileStorage._FileStorage__format = "binary"
+        self.storage.new(State())
+        self.storage.save()
+        FileStorage._FileStorage__format = "json"
+        self.clear()
+        self.storage.reload()
+        self.storage.new(State())
+        self.storage.save()
+        with open(self.path) as f:
+            self.assertEqual(len(json.load(f)), 2)
+
+
+@unittest.skipIf(models.storage_t == 'db', "not testing file storage")
+class TestFileStorageRelations(ScratchFileStorageCase):
+    """Test the foreign key reverse indexes of FileStorage"""
+
+    def test_state_cities(self):
+        """Test that State.cities returns only the cities of the state"""
+        state = State()
+        other = State()
+        city = City(state_id=state.id)
+        self.storage.new(state)
+        self.storage.new(other)
+        self.storage.new(city)
+        self.storage.new(City(state_id=other.id))
+        self.assertEqual(state.cities, [city])
+
+    def test_attribute_update_moves_object(self):
+        """Test that changing a foreign key updates the index"""
+        first = Place()
+        second = Place()
+        review = Review(place_id=first.id)
+        self.storage.new(review)
+        review.place_id = second.id
+        self.assertEqual(first.reviews, [])
+        self.assertEqual(second.reviews, [review])
+
+    def test_delete_unlinks_object(self):
+        """Test that deleted objects leave the index"""
+        user = User()
+        place = Place(user_id=user.id)
+        self.storage.new(place)
+        self.assertEqual(user.places, [place])
+        self.storage.delete(place)
+        self.assertEqual(user.places, [])
+
+    def test_reload_rebuilds_indexes(self):
+        """Test that reloading the file fills the reverse indexes"""
+        place = Place()
+        self.storage.new(Amenity(place_id=place.id))
+        self.storage.new(Review(place_id=place.id))
+        self.storage.save()
+        self.clear()
+        self.storage.reload()
+        self.assertEqual(len(self.storage.related(Amenity, "place_id",
+                                                  place.id)), 1)
+        self.assertEqual(len(place.reviews), 1)
+
+
+@unittest.skipIf(models.storage_t == 'db', "not testing file storage")
+class TestFileStorageChanges(ScratchFileStorageCase):
+    """Test that FileStorage only writes what changed"""
+
+    def test_save_without_changes_writes_nothing(self):
+        """Test that save leaves the file alone when nothing changed"""
+        self.storage.save()
+        self.assertFalse(os.path.exists(self.path))
+        self.storage.new(State())
+        self.storage.save()
+        mtime = os.stat(self.path).st_mtime_ns
+        os.utime(self.path, ns=(0, 0))
+        self.storage.save()
+        self.assertEqual(os.stat(self.path).st_mtime_ns, 0)
+        self.assertNotEqual(mtime, 0)
+
+    def test_changed_object_is_saved_without_new(self):
+        """Test that setting an attribute of a stored object marks it"""
+        state = State()
+        self.storage.new(state)
+        self.storage.save()
+        self.assertEqual(state.changes(), (None, set()))
+        state.name = "California"
+        self.storage.save()
+        self.clear()
+        self.storage.reload()
+        self.assertEqual(self.storage.get(State, state.id).name,
+                         "California")
+
+    def test_journal_writes_changed_attributes(self):
+        """Test that a saved object is journaled as its changes only"""
+        FileStorage._FileStorage__mode = "journal"
+        state = State(name="Nevada")
+        self.storage.new(state)
+        self.storage.save()
+        state.name = "Arizona"
+        self.storage.save()
+        with open(self.path + ".log") as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual(lines[-1], ["State." + state.id,
+                                     {"name": "Arizona"}, True])
+        self.clear()
+        self.storage.reload()
+        loaded = self.storage.get(State, state.id)
+        self.assertEqual(loaded.name, "Arizona")
+        self.assertEqual(loaded.created_at, state.created_at)
+        self.storage.compact()
+        self.clear()
+        self.storage.reload()
+        self.assertEqual(self.storage.get(State, state.id).name, "Arizona")
+
+    def test_journal_patch_of_snapshot_object(self):
+        """Test that a patch applies to an object read from the snapshot"""
+        state = State(name="Nevada")
+        self.storage.new(state)
+        self.storage.save()
+        self.clear()
+        self.storage.reload()
+        FileStorage._FileStorage__mode = "journal"
+        self.storage.get(State, state.id).name = "Utah"
+        self.storage.save()
+        self.clear()
+        self.storage.reload()
+        self.assertEqual(self.storage.get(State, state.id).name, "Utah")
+
+    def test_version_follows_changes(self):
+        """Test that the version of a class moves on with each change to
+        one of its objects, and only then"""
+        state = State()
+        before = self.storage.version(State)
+        self.storage.new(state)
+        stored = self.storage.version(State)
+        self.assertNotEqual(stored, before)
+        self.storage.get(State, state.id)
+        self.storage.new(City())
+        self.assertEqual(self.storage.version("State"), stored)
+        state.name = "renamed"
+        state.save()
+        renamed = self.storage.version(State)
+        self.assertNotEqual(renamed, stored)
+        self.storage.delete(state)
+        self.assertNotEqual(self.storage.version(State), renamed)
+        self.storage.new(state)
+        self.assertEqual(self.storage.version(State), renamed)
+
+    def test_version_is_the_same_after_reload(self):
+        """Test that the version only depends on the objects held, so
+        that another process reading the same file agrees on it"""
+        for _ in range(3):
+            self.storage.new(State())
+        self.storage.save()
+        saved = self.storage.version(State)
+        self.clear()
+        self.storage.reload()
+        self.assertEqual(self.storage.version(State), saved)
+        self.storage.all(State)
+        self.assertEqual(self.storage.version(State), saved)
+
+    def test_listen_reports_changed_classes(self):
+        """Test that listeners hear the class of each change"""
+        heard = []
+        listeners = FileStorage._FileStorage__listeners
+        self.storage.listen(heard.append)
+        try:
+            state = State()
+            self.storage.new(state)
+            state.name = "renamed"
+            self.storage.delete(City())
+            self.storage.delete(state)
+            self.storage.reload()
+        finally:
+            listeners.remove(heard.append)
+        self.assertEqual(heard, ["State", "State", "State", None])
+
+
+@unittest.skipIf(models.storage_t == 'db', "not testing file storage")
+class TestFileStorageBulk(ScratchFileStorageCase):
+    """Test the bulk insert and update of FileStorage"""
+
+    def test_bulk_new_saves_every_object(self):
+        """Test that bulk_new stores and writes all the objects"""
+        states = [State() for _ in range(5)]
+        self.storage.bulk_new(iter(states))
+        with open(self.path) as f:
+            self.assertEqual(set(json.load(f)),
+                             {"State." + state.id for state in states})
+
+    def test_bulk_update_sets_attributes(self):
+        """Test that bulk_update changes the rows' objects only"""
+        states = [State(name="old") for _ in range(3)]
+        self.storage.bulk_new(states)
+        updated_at = states[0].updated_at
+        self.storage.bulk_update("State", [
+            {"id": states[0].id, "name": "new"},
+            {"id": "missing", "name": "new"}])
+        self.clear()
+        self.storage.reload()
+        first = self.storage.get(State, states[0].id)
+        self.assertEqual(first.name, "new")
+        self.assertGreater(first.updated_at, updated_at)
+        self.assertEqual(self.storage.get(State, states[1].id).name, "old")
+        self.assertEqual(self.storage.count(State), 3)
+
+
+@unittest.skipIf(models.storage_t == 'db', "not testing file storage")
+class TestFileStoragePage(ScratchFileStorageCase):
+    """Test the keyset pagination of FileStorage"""
+
+    def pages(self, cls, **kwargs):
+        """Returns the ids of every page of cls, following the cursors"""
+        pages = []
+        after = None
+        while True:
+            objs, after = self.storage.page(cls, after=after, **kwargs)
+            pages.append([obj.id for obj in objs])
+            if after is None:
+                return pages
+
+    def test_page_follows_cursor_in_id_order(self):
+        """Test that the pages cover every object once, ordered by id"""
+        states = [State() for _ in range(5)]
+        self.storage.bulk_new(states)
+        pages = self.pages(State, limit=2)
+        self.assertEqual([len(ids) for ids in pages], [2, 2, 1])
+        self.assertEqual(sum(pages, []), sorted(s.id for s in states))
+
+    def test_page_order_by_keeps_up_with_changes(self):
+        """Test that ordering by an attribute follows its updates"""
+        states = [State(name=name) for name in ("b", "c", "a")]
+        self.storage.bulk_new(states)
+        states[2].name = "d"
+        ids = sum(self.pages(State, limit=2, order_by="name"), [])
+        self.assertEqual(ids, [states[0].id, states[1].id, states[2].id])
+
+    def test_page_where_and_invalid_cursor(self):
+        """Test the where filter and that foreign cursors are refused"""
+        state = State()
+        cities = [City(state_id=state.id) for _ in range(3)]
+        self.storage.bulk_new([state, City(state_id="other")] + cities)
+        objs, after = self.storage.page(City, limit=3,
+                                        where={"state_id": state.id})
+        self.assertEqual({c.id for c in objs}, {c.id for c in cities})
+        self.assertIsNone(after)
+        objs, after = self.storage.page(City, limit=1)
+        with self.assertRaises(ValueError):
+            self.storage.page(City, after=after, order_by="name")
+        with self.assertRaises(ValueError):
+            self.storage.page(City, after="garbage")
+
+    def test_page_children_keeps_up_with_changes(self):
+        """Test that paging the children of one object follows their
+        additions, renames, moves and deletions"""
+        city, other = City(), City()
+        places = [Place(city_id=city.id, name=name) for name in "bdf"]
+        self.storage.bulk_new([city, other] + places)
+        where = {"city_id": city.id}
+
+        def names():
+            """Returns the names of the places of city, by name"""
+            pages = self.pages(Place, limit=2, order_by="name", where=where)
+            return [self.storage.get(Place, id).name
+                    for id in sum(pages, [])]
+        self.assertEqual(names(), ["b", "d", "f"])
+        added = Place(city_id=city.id, name="a")
+        self.storage.new(added)
+        places[0].name = "e"
+        moved = Place(city_id=other.id, name="c")
+        self.storage.new(moved)
+        moved.city_id = city.id
+        places[1].city_id = other.id
+        self.storage.delete(places[2])
+        self.assertEqual(names(), ["a", "c", "e"])
+
+    def test_page_children_reads_only_the_page(self):
+        """Test that a page of children decodes only the records it
+        returns, once their sorted list is built"""
+        city = City()
+        places = [Place(city_id=city.id) for _ in range(10)]
+        self.storage.bulk_new([city] + places)
+        self.clear()
+        self.storage.reload()
+        where = {"city_id": city.id}
+        objs, after = self.storage.page(Place, limit=3, where=where)
+        loads = json.loads
+        with mock.patch.object(file_storage.json, "loads",
+                               side_effect=loads) as decode:
+            objs, after = self.storage.page(Place, after=after, limit=3,
+                                            where=where)
+        self.assertEqual(len(objs), 3)
+        self.assertEqual(decode.call_count, 1 + 3, "the cursor, the page")
+
+
+@unittest.skipIf(models.storage_t == 'db', "not testing file storage")
+class TestFileStorageAggregate(ScratchFileStorageCase):
+    """Test the group-by aggregates of FileStorage"""
+
+    def setUp(self):
+        """Store two states with three places between them"""
+        super().setUp()
+        self.states = [State(), State()]
+        cities = [City(state_id=state.id) for state in self.states]
+        self.places = [Place(city_id=cities[i].id, price_by_night=price,
+                             max_guest=guests)
+                       for i, price, guests in ((0, 10, 2), (0, 20, 3),
+                                                (1, 40, 1))]
+        self.storage.bulk_new(self.states + cities + self.places)
+
+    def test_aggregate_through_foreign_key(self):
+        """Test grouping places by the state of their city"""
+        metrics = {"places": ("count", None),
+                   "avg_price": ("avg", "price_by_night"),
+                   "guests": ("sum", "max_guest"),
+                   "top": ("max", "price_by_night")}
+        stats = self.storage.aggregate(Place, ["city.state_id"], metrics)
+        expected = sorted([
+            {"city.state_id": self.states[0].id, "places": 2,
+             "avg_price": 15.0, "guests": 5, "top": 20},
+            {"city.state_id": self.states[1].id, "places": 1,
+             "avg_price": 40.0, "guests": 1, "top": 40}],
+            key=lambda group: group["city.state_id"])
+        self.assertEqual(stats, expected)
+
+    def test_aggregate_reads_pending_records(self):
+        """Test that aggregating after reload builds no object"""
+        self.clear()
+        self.storage.reload()
+        stats = self.storage.aggregate(
+            "Place", where={"city_id": self.places[0].city_id},
+            metrics={"low": ("min", "price_by_night")})
+        self.assertEqual(stats, [{"low": 10}])
+        self.assertEqual(self.storage._FileStorage__objects, {})
+        with self.assertRaises(ValueError):
+            self.storage.aggregate(Place, metrics={"x": ("median", "id")})
+
+
+@unittest.skipIf(models.storage_t == 'db', "not testing file storage")
+class TestFileStorageSearch(ScratchFileStorageCase):
+    """Test the place search of FileStorage"""
+
+    def test_search_places_intersects_indexes(self):
+        """Test searching by state, city and amenity"""
+        states = [State(), State()]
+        cities = [City(state_id=states[0].id), City(state_id=states[0].id),
+                  City(state_id=states[1].id)]
+        places = [Place(city_id=city.id) for city in cities]
+        wifi = Amenity(place_id=places[0].id)
+        self.storage.bulk_new(states + cities + places + [wifi])
+
+        def search(*args, **kwargs):
+            """Returns the ids of the places found"""
+            found = self.storage.search_places(*args, **kwargs)
+            return {place.id for place in found}
+        self.assertEqual(search([states[0].id]),
+                         {places[0].id, places[1].id})
+        self.assertEqual(search([states[0].id], [cities[2].id]),
+                         {place.id for place in places})
+        self.assertEqual(search(amenities=[wifi.id]), {places[0].id})
+        self.assertEqual(search(cities=[cities[1].id],
+                                amenities=[wifi.id]), set())
+        self.assertEqual(search(), {place.id for place in places})
+
+
+@unittest.skipIf(models.storage_t == 'db', "not testing file storage")
+class TestFileStorageDurability(ScratchFileStorageCase):
+    """Test the write-behind durability levels of FileStorage"""
+
+    def load(self):
+        """Returns the keys saved in the scratch file"""
+        with open(self.path) as f:
+            return set(json.load(f))
+
+    def test_group_save_returns_after_write(self):
+        """Test that a group commit save has written the file"""
+        FileStorage._FileStorage__durability = "group"
+        state = State()
+        self.storage.new(state)
+        self.storage.save()
+        self.assertEqual(self.load(), {"State." + state.id})
+
+    def test_async_save_is_written_by_flush(self):
+        """Test that async saves wait for flush and survive close"""
+        FileStorage._FileStorage__durability = "async"
+        FileStorage._FileStorage__flush_delay = 60
+        first = State()
+        second = State()
+        self.storage.new(first)
+        self.storage.save()
+        self.storage.new(second)
+        self.storage.save()
+        self.assertFalse(os.path.exists(self.path))
+        self.storage.close()
+        self.assertEqual(self.storage.count(State), 2)
+        self.storage.flush()
+        self.assertEqual(self.load(), {"State." + first.id,
+                                       "State." + second.id})
+
+    def test_async_flushes_after_enough_changes(self):
+        """Test that the flusher writes once enough objects changed"""
+        FileStorage._FileStorage__durability = "async"
+        FileStorage._FileStorage__flush_delay = 60
+        FileStorage._FileStorage__flush_changes = 2
+        for _ in range(2):
+            self.storage.new(State())
+        self.storage.save()
+        deadline = time.monotonic() + 5
+        while not os.path.exists(self.path) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(len(self.load()), 2)
+
+    def save_from_threads(self, threads=4, saves=20):
+        """Stores and saves new states from several threads at once and
+        returns them, failing on any error raised by save()"""
+        states = []
+        errors = []
+
+        def work():
+            """Stores and saves states one at a time"""
+            for _ in range(saves):
+                state = State()
+                states.append(state)
+                try:
+                    self.storage.new(state)
+                    self.storage.save()
+                except Exception as error:
+                    errors.append(error)
+        workers = [threading.Thread(target=work) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(errors, [])
+        return states
+
+    def test_group_saves_from_threads(self):
+        """Test that concurrent group commit saves all succeed"""
+        FileStorage._FileStorage__durability = "group"
+        for _ in range(2000):
+            self.storage.new(State())
+        states = self.save_from_threads()
+        self.assertLessEqual({"State." + state.id for state in states},
+                             self.load())
+
+    def test_async_saves_from_threads(self):
+        """Test that the flusher writes while other threads store,
+        without waiting for flush()"""
+        FileStorage._FileStorage__durability = "async"
+        FileStorage._FileStorage__flush_delay = 0
+        for _ in range(2000):
+            self.storage.new(State())
+        states = self.save_from_threads(saves=200)
+        deadline = time.monotonic() + 5
+        while FileStorage._FileStorage__queued and \
+                time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertIsNone(FileStorage._FileStorage__flush_error)
+        self.assertLessEqual({"State." + state.id for state in states},
+                             self.load())
+
+    def test_async_write_error_is_raised_by_next_save(self):
+        """Test that a failed background write is raised by save()"""
+        FileStorage._FileStorage__durability = "async"
+        FileStorage._FileStorage__flush_delay = 0
+        folder = os.path.join(self.tmp.name, "missing")
+        FileStorage._FileStorage__file_path = os.path.join(folder,
+                                                           "file.json")
+        with self.assertLogs("models.engine.file_storage", "ERROR"):
+            self.storage.new(State())
+            self.storage.save()
+            deadline = time.monotonic() + 5
+            while FileStorage._FileStorage__flush_error is None and \
+                    time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.storage.new(State())
+            with self.assertRaises(FileNotFoundError):
+                self.storage.save()
+        os.mkdir(folder)
+        self.storage.flush()
+        self.assertIsNone(FileStorage._FileStorage__flush_error)
+        self.storage.save()
+
+    def test_group_save_after_failed_write(self):
+        """Test that a group save waits for its own write rather than
+        raising the error of an earlier one"""
+        FileStorage._FileStorage__durability = "group"
+        folder = os.path.join(self.tmp.name, "missing")
+        self.path = os.path.join(folder, "file.json")
+        FileStorage._FileStorage__file_path = self.path
+        first = State()
+        with self.assertLogs("models.engine.file_storage", "ERROR"):
+            self.storage.new(first)
+            with self.assertRaises(FileNotFoundError):
+                self.storage.save()
+        os.mkdir(folder)
+        second = State()
+        self.storage.new(second)
+        self.storage.save()
+        self.assertEqual(self.load(), {"State." + first.id,
+                                       "State." + second.id})
+
+    def test_reload_writes_queued_changes_first(self):
+        """Test that reload does not lose saves waiting for the flusher"""
+        FileStorage._FileStorage__durability = "async"
+        FileStorage._FileStorage__flush_delay = 60
+        state = State()
+        self.storage.new(state)
+        self.storage.save()
+        self.storage.reload()
+        self.assertEqual(self.load(), {"State." + state.id})
+        self.assertIsNotNone(self.storage.get(State, state.id))
+
+
+@unittest.skipIf(models.storage_t == 'db', "not testing file storage")
+class TestFileStorageJournal(ScratchFileStorageCase):
+    """Test the journaled save mode of FileStorage"""
+    mode = "journal"
+
+    def test_save_appends_only_changes(self):
+        """Test that each save appends only the changed objects"""
+        first = BaseModel()
+        second = BaseModel()
+        self.storage.new(first)
+        self.storage.new(second)
+        self.storage.save()
+        second.name = "Holberton"
+        self.storage.new(second)
+        self.storage.save()
+        with open(self.path + ".log") as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(lines[-1][0], "BaseModel." + second.id)
+        self.assertEqual(lines[-1][1]["name"], "Holberton")
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_reload_replays_journal(self):
+        """Test that reload applies puts and deletes from the journal"""
+        kept = BaseModel()
+        gone = BaseModel()
+        self.storage.new(kept)
+        self.storage.new(gone)
+        self.storage.save()
+        self.storage.delete(gone)
+        self.storage.save()
+        self.clear()
+        self.storage.reload()
+        self.assertEqual(list(self.storage.all()), ["BaseModel." + kept.id])
+
+    def test_deleted_object_stored_again(self):
+        """Test that an object deleted then stored again is journaled in
+        full and survives reload"""
+        obj = BaseModel()
+        obj.name = "Holberton"
+        self.storage.new(obj)
+        self.storage.save()
+        self.storage.delete(obj)
+        self.storage.save()
+        self.storage.new(obj)
+        self.storage.save()
+        with open(self.path + ".log") as f:
+            last = json.loads(f.readlines()[-1])
+        self.assertEqual(len(last), 2)
+        self.clear()
+        self.storage.reload()
+        self.assertEqual(self.storage.get(BaseModel, obj.id).name,
+                         "Holberton")
+
+    def test_compact_folds_journal_into_snapshot(self):
+        """Test that compaction writes a snapshot and empties the journal"""
+        obj = BaseModel()
+        self.storage.new(obj)
+        self.storage.save()
+        self.storage.compact()
+        self.assertEqual(os.path.getsize(self.path + ".log"), 0)
+        with open(self.path) as f:
+            self.assertIn("BaseModel." + obj.id, json.load(f))
+        self.clear()
+        self.storage.reload()
+        self.assertIn("BaseModel." + obj.id, self.storage.all())
+
+    def test_torn_last_line_is_ignored(self):
+        """Test that a partially written journal entry is skipped"""
+        obj = BaseModel()
+        self.storage.new(obj)
+        self.storage.save()
+        with open(self.path + ".log", "a") as f:
+            f.write('["BaseModel.x", {"id"')
+        self.clear()
+        self.storage.reload()
+        self.assertEqual(list(self.storage.all()), ["BaseModel." + obj.id])
+
+    def test_save_after_torn_line(self):
+        """Test that a save cuts off a torn entry before appending"""
+        first = BaseModel()
+        self.storage.new(first)
+        self.storage.save()
+        with open(self.path + ".log", "a") as f:
+            f.write('["BaseModel.x", {"id"')
+        second = BaseModel()
+        self.storage.new(second)
+        self.storage.save()
+        with open(self.path + ".log") as f:
+            self.assertEqual(len([json.loads(line) for line in f]), 2)
+        self.clear()
+        self.storage.reload()
+        self.assertEqual(set(self.storage.all()),
+                         {"BaseModel." + first.id, "BaseModel." + second.id})
+
+    def test_undecodable_line_is_skipped(self):
+        """Test that reload skips a broken entry and reads the rest"""
+        first = BaseModel()
+        self.storage.new(first)
+        self.storage.save()
+        with open(self.path + ".log", "a") as f:
+            f.write('["BaseModel.x", {"id"\n')
+        second = BaseModel()
+        self.storage.new(second)
+        self.storage.save()
+        self.clear()
+        self.storage.reload()
+        self.assertEqual(set(self.storage.all()),
+                         {"BaseModel." + first.id, "BaseModel." + second.id})
+
+
+@unittest.skipIf(models.storage_t == 'db', "not testing file storage")
+class TestFileStorageClose(ScratchFileStorageCase):
+    """Test that close only reads the file again when it changed"""
+
+    def write(self, records, suffix="", mode="w"):
+        """Write records to the scratch file as another process would"""
+        with open(self.path + suffix, mode) as f:
+            if suffix:
+                for key, record in records.items():
+                    f.write(json.dumps([key, record]) + "\n")
+            else:
+                json.dump(records, f)
+
+    def test_close_keeps_objects_when_unchanged(self):
+        """Test that close does not rebuild objects of an unchanged file"""
+        state = State()
+        self.storage.new(state)
+        self.storage.save()
+        self.storage.close()
+        self.assertIs(self.storage.get(State, state.id), state)
+
+    def test_close_reloads_changed_file(self):
+        """Test that close picks up a file rewritten behind its back"""
+        self.storage.save()
+        state = State()
+        self.write({"State." + state.id: state.to_dict()})
+        self.storage.close()
+        self.assertEqual(self.storage.count(State), 1)
+
+    def test_close_drops_unsaved_objects(self):
+        """Test that close still discards objects that were never saved"""
+        self.storage.save()
+        self.storage.new(State())
+        self.storage.close()
+        self.assertEqual(self.storage.count(), 0)
+
+    def test_close_reads_journal_tail(self):
+        """Test that close applies only the new journal entries"""
+        FileStorage._FileStorage__mode = "journal"
+        kept = State()
+        gone = State()
+        self.storage.new(kept)
+        self.storage.new(gone)
+        self.storage.save()
+        added = State()
+        self.write({"State." + added.id: added.to_dict(),
+                    "State." + gone.id: None}, ".log", "a")
+        self.storage.close()
+        self.assertIs(self.storage.get(State, kept.id), kept)
+        self.assertIsNone(self.storage.get(State, gone.id))
+        self.assertIsNotNone(self.storage.get(State, added.id))
+
+
+@unittest.skipIf(models.storage_t == 'db', "not testing file storage")
+class TestFileStorageSharded(ScratchFileStorageCase):
+    """Test the sharded on-disk layout of FileStorage"""
+    mode = "sharded"
+
+    def stat(self, shard):
+        """Return the inode and modification time of a shard file"""
+        st = os.stat(os.path.join(self.path + ".d", shard))
+        return st.st_ino, st.st_mtime_ns
+
+    def test_save_writes_one_file_per_class(self):
+        """Test that each class gets its own shard file"""
+        self.storage.new(State())
+        self.storage.new(User())
+        self.storage.save()
+        self.assertEqual(sorted(os.listdir(self.path + ".d")),
+                         ["State.json", "User.json"])
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_save_rewrites_dirty_shards_only(self):
+        """Test that a save leaves shards without changes untouched"""
+        state = State()
+        self.storage.new(state)
+        self.storage.new(User())
+        self.storage.save()
+        before = self.stat("User.json"), self.stat("State.json")
+        state.name = "Nevada"
+        self.storage.new(state)
+        self.storage.save()
+        self.assertEqual(self.stat("User.json"), before[0])
+        self.assertNotEqual(self.stat("State.json"), before[1])
+
+    def test_hash_buckets(self):
+        """Test that ids are spread over the configured buckets"""
+        FileStorage._FileStorage__shards = 4
+        for i in range(32):
+            self.storage.new(State())
+        self.storage.save()
+        names = os.listdir(self.path + ".d")
+        self.assertTrue(len(names) > 1)
+        for name in names:
+            self.assertRegex(name, r"^State\.[0-3]\.json$")
+        self.clear()
+        self.storage.reload()
+        self.assertEqual(self.storage.count(State), 32)
+
+    def test_close_reads_changed_shards_only(self):
+        """Test that close keeps the objects of unchanged shards"""
+        state = State()
+        user = User()
+        self.storage.new(state)
+        self.storage.new(user)
+        self.storage.save()
+        with open(os.path.join(self.path + ".d", "State.json"), "w") as f:
+            json.dump({}, f)
+        self.storage.close()
+        self.assertIsNone(self.storage.get(State, state.id))
+        self.assertIs(self.storage.get(User, user.id), user)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,173 @@
+#!/usr/bin/python3
+"""
+Contains the tests for the FileStorage file formats
+"""
+
+from datetime import datetime
+import io
+import json
+import models
+from models.city import City
+from models.engine import serializers
+from models.place import Place
+from models.state import State
+import os
+import pep8
+import tempfile
+import unittest
+RecordReader = serializers.RecordReader
+
+
+class TestSerializersDocs(unittest.TestCase):
+    """Tests to check the documentation and style of serializers.py"""
+
+    def test_pep8_conformance(self):
+        """Test that serializers.py and its tests conform to PEP8."""
+        pep8s = pep8.StyleGuide(quiet=True)
+        result = pep8s.check_files([
+            'models/engine/serializers.py',
+            'tests/test_models/test_engine/test_serializers.py'])
+        self.assertEqual(result.total_errors, 0,
+                         "Found code style errors (and warnings).")
+
+    def test_module_docstring(self):
+        """Test for the serializers.py module docstring"""
+        self.assertTrue(len(serializers.__doc__) >= 1,
+                        "serializers.py needs a docstring")
+
+
+class TestRecordReader(unittest.TestCase):
+    """Test the streaming reader of the JSON format"""
+
+    def read(self, text, chunk=1 << 20):
+        """Return the members read from text, chunk characters at a time"""
+        return list(RecordReader(io.StringIO(text), chunk))
+
+    def test_matches_json_load(self):
+        """Test that members come out as json.load reads them"""
+        records = {"State.{:d}".format(i): State(name="é {:d}".format(i))
+                   .to_dict() for i in range(50)}
+        records["BaseModel.x"] = {"n": [1, 2.5, None, True], "s": "}{,:"}
+        text = json.dumps(records)
+        for chunk in (1, 7, 64, 1 << 20):
+            with self.subTest(chunk=chunk):
+                self.assertEqual(self.read(text, chunk),
+                                 list(records.items()))
+
+    def test_empty(self):
+        """Test that empty files and objects yield nothing"""
+        self.assertEqual(self.read(""), [])
+        self.assertEqual(self.read(" { } "), [])
+
+    def test_number_cut_by_chunk(self):
+        """Test that a number split across chunks is read whole"""
+        self.assertEqual(self.read('{"a": 12345}', 8), [("a", 12345)])
+
+    def test_malformed(self):
+        """Test that malformed files raise ValueError"""
+        for text in ('["a"]', '{"a": 1 "b": 2}', '{"a": {"b": 1}'):
+            with self.subTest(text=text):
+                with self.assertRaises(ValueError):
+                    self.read(text, 4)
+
+
+class TestSerializers(unittest.TestCase):
+    """Test the JSON and binary formats and the conversion between them"""
+
+    def setUp(self):
+        """Create a scratch directory and a JSON file to convert"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.json = os.path.join(self.tmp.name, "file.json")
+        state = State(name="California")
+        place = Place(name="Loft", latitude=37.77, amenity_ids=["a", "b"])
+        self.records = {"State." + state.id: state.to_dict(),
+                        "Place." + place.id: place.to_dict(),
+                        "City.odd": {"id": "odd", "__class__": "BaseModel",
+                                     "created_at": "2017-09-28T21:03:54",
+                                     "nested": {"k": [1, None, True]}}}
+        with open(self.json, "w") as f:
+            json.dump(self.records, f)
+
+    def tearDown(self):
+        """Remove the scratch directory"""
+        self.tmp.cleanup()
+
+    def path(self, name):
+        """Return the path of a file in the scratch directory"""
+        return os.path.join(self.tmp.name, name)
+
+    def test_round_trip_is_lossless(self):
+        """Test that JSON -> binary -> JSON gives back the same records"""
+        serializers.convert(self.json, self.path("file.bin"), "binary")
+        serializers.convert(self.path("file.bin"), self.path("back.json"),
+                            "json")
+        with open(self.path("back.json")) as f:
+            self.assertEqual(json.load(f), self.records)
+
+    def test_binary_dates_are_datetimes(self):
+        """Test that dates come out of a binary file already parsed"""
+        serializers.convert(self.json, self.path("file.bin"), "binary")
+        records = dict(serializers.load(self.path("file.bin")))
+        for key, record in records.items():
+            with self.subTest(key=key):
+                if key == "City.odd":
+                    self.assertEqual(record["created_at"],
+                                     "2017-09-28T21:03:54")
+                else:
+                    self.assertIs(type(record["created_at"]), datetime)
+                    self.assertEqual(record["created_at"].strftime(
+                        models.base_model.time),
+                        self.records[key]["created_at"])
+
+    def test_binary_is_smaller(self):
+        """Test that the binary file is smaller than the JSON one"""
+        records = {"City.{:d}".format(i): City(name="c", state_id="s")
+                   .to_dict() for i in range(200)}
+        serializers.formats["json"].dump(records, self.path("a.json"))
+        serializers.formats["binary"].dump(records, self.path("a.bin"))
+        self.assertLess(os.path.getsize(self.path("a.bin")),
+                        os.path.getsize(self.path("a.json")))
+        self.assertEqual(dict(serializers.load(self.path("a.bin"))).keys(),
+                         records.keys())
+
+    def test_blocks(self):
+        """Test that records spanning several frames are all read"""
+        binary = serializers.BinarySerializer()
+        binary.block = 3
+        records = {"State.{:d}".format(i): {"id": str(i)} for i in range(10)}
+        binary.dump(records, self.path("a.bin"))
+        self.assertEqual(dict(serializers.load(self.path("a.bin"))),
+                         records)
+
+    def test_frames_are_json(self):
+        """Test that a binary file is the versioned header and
+        length-prefixed JSON frames"""
+        serializers.convert(self.json, self.path("file.bin"), "binary")
+        with open(self.path("file.bin"), "rb") as f:
+            self.assertEqual(f.read(5), b"HBNB\x02")
+            size = serializers.frame.unpack(f.read(4))[0]
+            names, rows = json.loads(f.read(size).decode("utf-8"))
+            self.assertEqual(f.read(), b"")
+        self.assertEqual(len(rows), len(self.records))
+        self.assertTrue(set(names) >= {"City", "State"})
+
+    def test_unknown_version_is_refused(self):
+        """Test that a file of another version raises ValueError"""
+        serializers.convert(self.json, self.path("file.bin"), "binary")
+        with open(self.path("file.bin"), "r+b") as f:
+            f.seek(4)
+            f.write(b"\x01")
+        with self.assertRaisesRegex(ValueError, "version 1"):
+            list(serializers.load(self.path("file.bin")))
+
+    def test_truncated_file_is_refused(self):
+        """Test that a frame cut short raises ValueError"""
+        serializers.convert(self.json, self.path("file.bin"), "binary")
+        with open(self.path("file.bin"), "r+b") as f:
+            f.truncate(os.path.getsize(self.path("file.bin")) - 1)
+        with self.assertRaisesRegex(ValueError, "Truncated"):
+            list(serializers.load(self.path("file.bin")))
+
+
+if __name__ == "__main__":
+    unittest.main()